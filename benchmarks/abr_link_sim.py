@@ -0,0 +1,95 @@
+# benchmarks/abr_link_sim.py
+"""自适应码率控制器的链路仿真
+
+用虚拟时钟驱动AdaptiveBitrateController：每级码率阶梯的帧大小取自合成画面的真实JPEG编码，
+链路模型为固定带宽 + 有限缓冲队列，发送速率超过带宽时排队时延上升，缓冲溢出即丢包。
+带宽按 高→低→高 变化，观察控制器的快速回退与缓慢上探：
+    python benchmarks/abr_link_sim.py --high 20 --low 4
+"""
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from benchmarks.synthetic import SyntheticCapture, make_config
+from servers.rate_controller import AdaptiveBitrateController
+
+
+class LinkModel:
+    """固定带宽链路：缓冲队列以capacity排空，超过buffer_ms的部分被丢弃"""
+
+    def __init__(self, capacity_bps, base_delay_ms=20.0, buffer_ms=200.0):
+        self.capacity_bps = capacity_bps
+        self.base_delay_ms = base_delay_ms
+        self.buffer_ms = buffer_ms
+        self.queue_bits = 0.0
+        self._last_delay = base_delay_ms
+
+    def transmit(self, bits, seconds):
+        """在seconds内送入bits，返回该时段的接收报告"""
+        self.queue_bits += bits
+        self.queue_bits = max(0.0, self.queue_bits - self.capacity_bps * seconds)
+        limit = self.capacity_bps * self.buffer_ms / 1000
+        dropped = max(0.0, self.queue_bits - limit)
+        self.queue_bits -= dropped
+        delay = self.base_delay_ms + self.queue_bits / self.capacity_bps * 1000
+        jitter = abs(delay - self._last_delay)
+        self._last_delay = delay
+        return {'type': 'report', 'loss': round(dropped / bits, 4) if bits else 0.0,
+                'jitter_ms': round(jitter, 2), 'delay_ms': round(delay, 2)}
+
+
+def measure_rung_sizes(controller, capture):
+    """每级阶梯编码一帧合成画面，得到帧大小"""
+    frame, _ = capture.capture_window_content()
+    sizes = {}
+    for rung in controller.rungs():
+        scaled = frame if rung.scale == 1.0 else cv2.resize(
+            frame, None, fx=rung.scale, fy=rung.scale, interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', scaled, [cv2.IMWRITE_JPEG_QUALITY, rung.quality])
+        sizes[id(rung)] = len(buffer)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应码率链路仿真")
+    parser.add_argument('--high', type=float, default=20.0, help="高带宽(Mbit/s)")
+    parser.add_argument('--low', type=float, default=4.0, help="低带宽(Mbit/s)")
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--target', type=float, default=30.0, help="目标码率上限(Mbit/s)")
+    args = parser.parse_args()
+
+    config = make_config(0, fps=args.fps, quality=args.quality, target_bitrate=args.target * 1e6)
+    now = [0.0]
+    controller = AdaptiveBitrateController(config, clock=lambda: now[0])
+    sizes = measure_rung_sizes(controller, SyntheticCapture())
+    link = LinkModel(args.high * 1e6)
+    schedule = [(20, args.high), (30, args.low), (40, args.high)]  # (持续秒数, 带宽)
+
+    print(f"{'时间':>5} {'带宽':>7} {'发送':>7} {'质量':>4} {'缩放':>5} {'帧率':>4} {'丢包':>6} {'时延ms':>7}")
+    decision = controller.decision('sim')
+    total_sent = total_capacity = total_lost = 0.0
+    for duration, capacity in schedule:
+        link.capacity_bps = capacity * 1e6
+        for _ in range(duration):
+            bits = sizes[id(decision)] * 8 * decision.fps
+            for _ in range(decision.fps):
+                controller.observe_frame(sizes[id(decision)], decision)
+            report = link.transmit(bits, 1.0)
+            now[0] += 1.0
+            total_sent += bits
+            total_capacity += link.capacity_bps
+            total_lost += bits * report['loss']
+            print(f"{now[0]:5.0f} {capacity:6.1f}M {bits / 1e6:6.1f}M {decision.quality:4d} "
+                  f"{decision.scale:5.2f} {decision.fps:4d} {report['loss']:6.1%} {report['delay_ms']:7.1f}")
+            decision = controller.on_report('sim', report)
+
+    print(f"\n带宽利用率 {(total_sent - total_lost) / total_capacity:.1%} | 总丢包率 {total_lost / total_sent:.2%}")
+    print(f"控制器统计: 回退 {controller.backoffs} 次, 上探 {controller.probes} 次")
+
+
+if __name__ == "__main__":
+    main()
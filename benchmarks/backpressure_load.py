@@ -0,0 +1,272 @@
+# benchmarks/backpressure_load.py
+"""慢速客户端背压测试
+
+stream: 线程版流媒体服务器，若干正常客户端 + 1个完全不读TCP控制通道的客户端(模拟卡住的手机)，
+        统计正常客户端每秒收到的UDP帧数；不限制时发送线程阻塞在卡住客户端的sendall上，所有人一起停顿
+mjpeg:  网页MJPEG，若干正常观看者 + 1个限速读取的慢速观看者，统计各自帧率与慢速观看者的画面延迟
+        (帧发布到被完整读到的时间)；不限制时旧帧堆在内核发送缓冲里，延迟随时间增长
+    python benchmarks/backpressure_load.py --scenario stream
+    python benchmarks/backpressure_load.py --scenario mjpeg --backend asyncio --slow-rate 150
+"""
+import sys
+import os
+import time
+import socket
+import hashlib
+import selectors
+import threading
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SyntheticCapture, make_config
+from benchmarks.stream_server_load import LoadClient
+from benchmarks.http_mjpeg_load import MJPEGReader
+from utils.frame_bus import FrameBus
+from servers.stream_server import DualprotocolStreamServer
+from servers.tcp_server import TCPServer
+from servers.async_http_server import AsyncHTTPServer
+from servers.web_page import MJPEG_BOUNDARY
+from servers.control_protocol import encode_message, udp_register_message
+
+MARKER = b'--' + MJPEG_BOUNDARY.encode() + b'\r\n'
+POLICIES = [None, 'latest-only', 'skip', 'downgrade']
+
+
+def policy_name(policy):
+    return policy or '不限制'
+
+
+class StalledClient:
+    """完成握手后再也不读TCP的客户端，只发UDP心跳保持会话"""
+
+    def __init__(self, port):
+        self.port = port
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 16)
+        self.udp.bind(('127.0.0.1', 0))
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.tcp.connect(('127.0.0.1', port))
+        self.tcp.recv(1024)  # STREAM_OK
+        self.tcp.sendall(b"READY" + encode_message({'type': 'hello', 'udp_port': self.udp.getsockname()[1]}))
+        self.heartbeat()
+
+    def heartbeat(self):
+        self.udp.sendto(udp_register_message(), ('127.0.0.1', self.port + 1))
+
+    def close(self):
+        self.udp.close()
+        self.tcp.close()
+
+
+def run_stream(policy, clients, port, seconds, fps):
+    config = make_config(port, fps=fps, change_detection=False, udp_pacing=False, abr_enabled=False,
+                         backpressure_policy=policy)
+    server = DualprotocolStreamServer(config, SyntheticCapture(640, 360))
+    threading.Thread(target=server.start_servers, daemon=True).start()
+    time.sleep(0.5)
+
+    load = [LoadClient(port) for _ in range(clients)]
+    stalled = StalledClient(port)
+    time.sleep(0.3)
+    # 模拟接收窗口很小的手机：服务端到它的发送缓冲只有几KB，几秒内就会写满
+    for session in config.sessions.connections():
+        if session.address == stalled.tcp.getsockname():
+            session.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+    selector = selectors.DefaultSelector()
+    for client in load:
+        selector.register(client.udp, selectors.EVENT_READ, client.on_udp)
+        selector.register(client.tcp, selectors.EVENT_READ, client.on_tcp)
+
+    per_second = []
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        frames_before = sum(client.frames for client in load)
+        second_end = time.monotonic() + 1.0
+        while time.monotonic() < second_end:
+            for key, _ in selector.select(timeout=0.1):
+                key.data()
+        per_second.append((sum(client.frames for client in load) - frames_before) / clients)
+        for client in load + [stalled]:
+            client.heartbeat()
+
+    flows = config.sessions.flow_stats()
+    dropped = max((stats['dropped'] for stats in flows.values()), default=0)
+    config.is_running = False
+    server.stop()
+    selector.close()
+    for client in load + [stalled]:
+        client.close()
+    time.sleep(0.5)
+
+    print(f"{policy_name(policy):<12} 正常客户端每秒帧数 最低 {min(per_second):5.1f} 平均 {statistics.mean(per_second):5.1f}   "
+          f"停顿秒数 {sum(1 for rate in per_second if rate < fps / 2):>3}   卡住客户端丢帧 {dropped}")
+
+
+class SlowMJPEGReader(threading.Thread):
+    """限速读取的MJPEG观看者：每个完整分段按内容查出其发布时间，计算画面延迟"""
+
+    def __init__(self, port, rate, published):
+        super().__init__(daemon=True)
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 16)
+        self.sock.sendall(b"GET /video_feed HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+        self.sock.settimeout(0.5)
+        self.rate = rate  # 字节/秒
+        self.published = published
+        self.frames = 0
+        self.latencies = []
+        self.running = True
+        self._chunked = None  # 响应是否分块编码(Flask开发服务器)，读到响应头后确定
+        self._raw = b''
+
+    def run(self):
+        buffer = b''
+        last = time.monotonic()
+        while self.running:
+            time.sleep(0.01)
+            now = time.monotonic()
+            budget = int(self.rate * (now - last))
+            last = now
+            while budget > 0 and self.running:
+                try:
+                    data = self.sock.recv(min(budget, 65536))
+                except socket.timeout:
+                    break
+                except OSError:
+                    return
+                if not data:
+                    return
+                budget -= len(data)
+                buffer += self._decode(data)
+            buffer = self._parse(buffer)
+
+    def _decode(self, data):
+        """去掉响应头和分块编码，返回multipart正文"""
+        self._raw += data
+        if self._chunked is None:
+            end = self._raw.find(b'\r\n\r\n')
+            if end < 0:
+                return b''
+            self._chunked = b'chunked' in self._raw[:end].lower()
+            self._raw = self._raw[end + 4:]
+        if not self._chunked:
+            body, self._raw = self._raw, b''
+            return body
+        body = b''
+        while True:
+            line_end = self._raw.find(b'\r\n')
+            if line_end < 0:
+                return body
+            size = int(self._raw[:line_end], 16)
+            if len(self._raw) < line_end + 2 + size + 2:
+                return body
+            body += self._raw[line_end + 2:line_end + 2 + size]
+            self._raw = self._raw[line_end + 2 + size + 2:]
+
+    def _parse(self, buffer):
+        while True:
+            start = buffer.find(MARKER)
+            end = buffer.find(MARKER, start + 1) if start >= 0 else -1
+            if end < 0:
+                return buffer[start:] if start >= 0 else buffer
+            part = buffer[start + len(MARKER):end]
+            body = part[part.find(b'\r\n\r\n') + 4:-2]
+            self.frames += 1
+            published = self.published.get(hashlib.blake2b(body, digest_size=8).digest())
+            if published is not None:
+                self.latencies.append(time.monotonic() - published)
+            buffer = buffer[end:]
+
+    def close(self):
+        self.running = False
+        self.sock.close()
+
+
+def run_mjpeg(policy, backend, clients, port, seconds, fps, slow_rate, limit):
+    capture = SyntheticCapture(640, 360)
+    config = make_config(port + 1, fps=fps, tcp_port=port, change_detection=False,
+                         backpressure_policy=policy, backpressure_limit=limit, rendition_widths=[320, 480])
+    frame_bus = FrameBus(config, capture)
+    if backend == "asyncio":
+        server = AsyncHTTPServer(config, capture, frame_bus)
+    else:
+        server = TCPServer(config, capture, frame_bus)  # Flask开发服务器无法停止，随进程退出
+    threading.Thread(target=server.run, daemon=True).start()
+    time.sleep(1.0)
+
+    # 记录每一帧(及各降档版本)的发布时间，供慢速观看者按内容计算延迟
+    published = {}
+
+    def monitor():
+        with frame_bus.subscribe() as subscription:
+            while config.is_running:
+                encoded = subscription.get(timeout=0.5)
+                if encoded is None:
+                    continue
+                now = time.monotonic()
+                for width in (None, 320, 480):
+                    data = frame_bus.renditions.get(encoded, width)
+                    published[hashlib.blake2b(data, digest_size=8).digest()] = now
+
+    threading.Thread(target=monitor, daemon=True).start()
+    readers = [MJPEGReader(port) for _ in range(clients)]
+    selector = selectors.DefaultSelector()
+    for reader in readers:
+        selector.register(reader.sock, selectors.EVENT_READ, reader)
+    slow = SlowMJPEGReader(port, slow_rate * 1024, published)
+    slow.start()
+
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        for key, _ in selector.select(timeout=0.1):
+            key.data.on_read()
+    elapsed = time.monotonic() - start
+
+    flows = [stats for stats in config.sessions.flow_stats().values()]
+    slowest = max(flows, key=lambda stats: stats['dropped'], default=None)
+    rates = [reader.frames / elapsed for reader in readers]
+    tail = slow.latencies[len(slow.latencies) // 2:] or [0.0]  # 后半程(积压已形成)的延迟
+    config.is_running = False
+    slow.close()
+    selector.close()
+    for reader in readers:
+        reader.close()
+    if hasattr(server, 'stop'):
+        server.stop()
+    time.sleep(0.5)
+
+    dropped = f"{slowest['dropped']} 降档 {slowest['level']}" if slowest else "-"
+    print(f"{policy_name(policy):<12} 正常观看者FPS 最低 {min(rates):5.1f}   慢速观看者 FPS {slow.frames / elapsed:5.1f} "
+          f"延迟中位 {statistics.median(tail) * 1000:7.0f} ms 最大 {max(tail) * 1000:7.0f} ms   服务端丢帧 {dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="慢速客户端背压测试")
+    parser.add_argument('--scenario', choices=['stream', 'mjpeg'], default='mjpeg')
+    parser.add_argument('--backend', choices=['flask', 'asyncio'], default='asyncio', help="mjpeg场景的网页服务器")
+    parser.add_argument('--clients', type=int, default=4, help="正常客户端数")
+    parser.add_argument('--seconds', type=float, default=15.0)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--slow-rate', type=int, default=150, help="慢速观看者读取速率(KB/s)")
+    parser.add_argument('--limit', type=int, default=64, help="背压上限(KB)")
+    parser.add_argument('--port', type=int, default=5800)
+    args = parser.parse_args()
+
+    if args.scenario == 'stream':
+        print(f"线程版流媒体服务器，{args.clients}个正常客户端 + 1个不读TCP的客户端，目标 {args.fps} fps")
+        for offset, policy in enumerate([None, 'latest-only']):
+            run_stream(policy, args.clients, args.port + offset * 2, args.seconds, args.fps)
+        return
+    print(f"{args.backend} MJPEG，{args.clients}个正常观看者 + 1个 {args.slow_rate} KB/s 的慢速观看者，"
+          f"目标 {args.fps} fps，背压上限 {args.limit} KB")
+    for offset, policy in enumerate(POLICIES):
+        run_mjpeg(policy, args.backend, args.clients, args.port + offset * 2, args.seconds, args.fps,
+                  args.slow_rate, args.limit * 1024)
+
+
+if __name__ == "__main__":
+    main()
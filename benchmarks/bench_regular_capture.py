@@ -0,0 +1,78 @@
+# benchmarks/bench_regular_capture.py
+"""常规捕获基准测试：逐帧新建缓冲(旧实现) vs 持久化后端+缓冲环
+
+使用合成的BGRA数据源代替真实屏幕，可在无显示环境下运行：
+    python benchmarks/bench_regular_capture.py --width 1920 --height 1080 --frames 300
+"""
+import sys
+import os
+import time
+import argparse
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from utils.capture_backends import RegularCaptureBackend
+
+
+def make_grab_source(width, height):
+    """合成数据源：返回与mss截图相同布局的BGRA缓冲区"""
+    raw = np.random.randint(0, 256, (height, width, 4), dtype=np.uint8)
+
+    def grab(monitor):
+        return raw
+    return grab
+
+
+def legacy_capture(grab, monitor):
+    """旧实现：每帧np.array拷贝 + cvtColor新建输出"""
+    frame = np.array(grab(monitor))
+    if frame.shape[2] == 4:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+    return frame
+
+
+def run(name, capture, frames):
+    # 先单独计时，再用tracemalloc统计分配（tracemalloc本身会拖慢速度）
+    start = time.perf_counter()
+    for _ in range(frames):
+        capture()
+    elapsed = time.perf_counter() - start
+
+    # 每帧的峰值增量近似该帧新分配的内存
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        capture()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - base
+    tracemalloc.stop()
+
+    print(f"{name:<12} {frames / elapsed:>10.1f} fps   "
+          f"{elapsed / frames * 1000:>7.2f} ms/帧   "
+          f"每帧分配 {allocated / frames / 1024:>9.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常规捕获基准测试")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    monitor = {"top": 0, "left": 0, "width": args.width, "height": args.height}
+    grab = make_grab_source(args.width, args.height)
+    backend = RegularCaptureBackend(grab_source=grab)
+
+    print(f"合成画面 {args.width}x{args.height}，每组 {args.frames} 帧")
+    run("legacy", lambda: legacy_capture(grab, monitor), args.frames)
+    run("persistent", lambda: backend.capture(monitor), args.frames)
+    print(f"persistent后端缓冲区累计分配: {backend.allocations} 块")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/encoder_bench.py
+"""帧编码器基准测试
+
+对每张测试图像运行各编码器及其参数组合，输出编码耗时、体积与PSNR/SSIM：
+    python benchmarks/encoder_bench.py
+    python benchmarks/encoder_bench.py --corpus 录制的窗口截图目录 --quality 65
+内置合成图像：文字窗口、扁平界面、照片类画面、带图片的聊天窗口；--corpus 目录下的png/jpg/bmp作为录制的真实窗口。
+最后按64x64图块对比JPEG与内容自适应编码(图块增量模式下的实际用法)
+"""
+import sys
+import os
+import time
+import glob
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from benchmarks.synthetic import SyntheticCapture, psnr, ssim
+from utils.encoders import (OpenCVJpegEncoder, TurboJpegEncoder, WebPEncoder, PNGEncoder,
+                            AdaptiveEncoder, EncoderUnavailable)
+
+# (编码器类, 参数)
+CANDIDATES = [
+    (OpenCVJpegEncoder, {}),
+    (OpenCVJpegEncoder, {'subsampling': '444'}),
+    (OpenCVJpegEncoder, {'optimize': True}),
+    (OpenCVJpegEncoder, {'progressive': True}),
+    (TurboJpegEncoder, {'fast_dct': True}),
+    (TurboJpegEncoder, {'fast_dct': False}),
+    (TurboJpegEncoder, {'subsampling': '444', 'fast_dct': True}),
+    (WebPEncoder, {}),
+    (WebPEncoder, {'lossless': True}),
+    (PNGEncoder, {'compression': 1}),
+    (PNGEncoder, {'compression': 6}),
+    (AdaptiveEncoder, {}),
+    (AdaptiveEncoder, {'lossless': 'png'}),
+]
+
+
+def ui_image(width=1280, height=720):
+    """扁平界面：色块面板、按钮与少量文字"""
+    image = np.full((height, width, 3), 250, dtype=np.uint8)
+    cv2.rectangle(image, (0, 0), (width, 48), (120, 70, 20), -1)
+    cv2.rectangle(image, (0, 48), (260, height), (235, 235, 235), -1)
+    for i in range(8):
+        y = 80 + i * 56
+        cv2.rectangle(image, (16, y), (244, y + 40), (255, 200, 150) if i == 2 else (245, 245, 245), -1)
+        cv2.putText(image, f"Menu item {i}", (28, y + 27), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (40, 40, 40), 1, cv2.LINE_AA)
+    for row in range(3):
+        for col in range(3):
+            x, y = 300 + col * 320, 80 + row * 200
+            cv2.rectangle(image, (x, y), (x + 290, y + 170), (255, 255, 255), -1)
+            cv2.rectangle(image, (x, y), (x + 290, y + 170), (210, 210, 210), 1)
+            cv2.rectangle(image, (x + 16, y + 110), (x + 120, y + 150), (60, 160, 60), -1)
+            cv2.putText(image, f"Card {row * 3 + col}", (x + 16, y + 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (30, 30, 30), 2, cv2.LINE_AA)
+    return image
+
+
+def photo_image(width=1280, height=720, seed=0):
+    """照片类画面：平滑渐变、柔和的形状与传感器噪声"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = np.stack([
+        128 + 100 * np.sin(x / 170.0) * np.cos(y / 230.0),
+        128 + 90 * np.cos(x / 310.0 + y / 190.0),
+        128 + 80 * np.sin((x + y) / 260.0),
+    ], axis=-1)
+    for _ in range(12):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(float(c) for c in rng.integers(0, 255, 3))
+        cv2.circle(image, center, int(rng.integers(30, 150)), color, -1, cv2.LINE_AA)
+    image = cv2.GaussianBlur(image, (0, 0), 3)
+    image += rng.normal(0, 6, image.shape).astype(np.float32)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def chat_image(width=1280, height=720):
+    """聊天窗口中夹着一张照片"""
+    image = SyntheticCapture(width, height, seed=1).capture_window_content()[0]
+    image[200:500, 300:780] = photo_image(480, 300, seed=2)
+    return image
+
+
+def load_corpus(directory):
+    """读取录制的窗口截图（np.fromfile兼容中文路径）"""
+    images = []
+    for path in sorted(glob.glob(os.path.join(directory, '*'))):
+        if os.path.splitext(path)[1].lower() not in ('.png', '.jpg', '.jpeg', '.bmp'):
+            continue
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append((os.path.basename(path), image))
+    return images
+
+
+def bench(encoder, image, quality, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = encoder.encode(image, quality)
+        times.append(time.perf_counter() - start)
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return statistics.median(times) * 1000, len(data), psnr(decoded, image), ssim(decoded, image)
+
+
+def bench_tiles(encoder, image, quality, size=64):
+    """逐图块编码，返回 (总耗时ms, 总体积, 重建画面的PSNR)"""
+    h, w = image.shape[:2]
+    rebuilt = np.zeros_like(image)
+    total = 0
+    start = time.perf_counter()
+    for y in range(0, h, size):
+        for x in range(0, w, size):
+            data = encoder.encode(image[y:y + size, x:x + size], quality)
+            total += len(data)
+            tile = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            rebuilt[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, total, psnr(rebuilt, image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="帧编码器基准测试")
+    parser.add_argument('--corpus', help="录制的窗口截图目录(png/jpg/bmp)")
+    parser.add_argument('--quality', type=int, default=65)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    images = [
+        ('文字窗口', SyntheticCapture(1280, 720).capture_window_content()[0]),
+        ('扁平界面', ui_image()),
+        ('照片画面', photo_image()),
+        ('聊天+图片', chat_image()),
+    ]
+    if args.corpus:
+        images += load_corpus(args.corpus)
+
+    encoders = []
+    for encoder_class, options in CANDIDATES:
+        try:
+            encoders.append(encoder_class(**options))
+        except EncoderUnavailable as e:
+            print(f"跳过 {encoder_class.name}{options}: {e}")
+
+    print(f"质量 {args.quality}，每项编码 {args.repeat} 次取中位数")
+    for name, image in images:
+        h, w = image.shape[:2]
+        print(f"\n{name} ({w}x{h})")
+        print(f"  {'编码器':<52s} {'耗时ms':>8s} {'体积KB':>8s} {'PSNR':>7s} {'SSIM':>7s}")
+        for encoder in encoders:
+            ms, size, quality_db, similarity = bench(encoder, image, args.quality, args.repeat)
+            db = '∞' if quality_db == float('inf') else f"{quality_db:.2f}"
+            print(f"  {repr(encoder):<55s} {ms:8.2f} {size / 1024:8.1f} {db:>7s} {similarity:7.4f}")
+
+    print("\n按64x64图块编码(含解码时间)")
+    for name, image in images:
+        for encoder in (OpenCVJpegEncoder(), AdaptiveEncoder()):
+            ms, size, quality_db = bench_tiles(encoder, image, args.quality)
+            db = '∞' if quality_db == float('inf') else f"{quality_db:.2f}"
+            counts = getattr(encoder, 'counts', '')
+            print(f"  {name:<6s} {encoder.name:<5s} 耗时 {ms:7.1f} ms  体积 {size / 1024:7.1f} KB  PSNR {db:>6s}  {counts}")
+
+
+if __name__ == "__main__":
+    main()
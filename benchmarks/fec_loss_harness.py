@@ -0,0 +1,65 @@
+# benchmarks/fec_loss_harness.py
+"""FEC回环测试：随机丢包下不同冗余比例的帧完整到达率
+
+客户端按给定概率随机丢弃UDP包，统计每种冗余比例下
+完整到达（含FEC恢复）的帧比例与带宽开销：
+    python benchmarks/fec_loss_harness.py --loss 0.02 --ratios 0 0.05 0.1 0.2
+"""
+import sys
+import os
+import time
+import random
+import threading
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SyntheticCapture, make_config
+from servers.stream_server import DualprotocolStreamServer
+from client.reference_client import ReferenceClient
+
+
+def random_loss_filter(loss, rng):
+    def keep(packet):
+        return rng.random() >= loss
+    return keep
+
+
+def run_ratio(ratio, port, seconds, fps, loss):
+    capture = SyntheticCapture()
+    config = make_config(port, fps=fps, change_detection=False, fec_ratio=ratio)
+    server = DualprotocolStreamServer(config, capture)
+    threading.Thread(target=server.start_servers, daemon=True).start()
+    time.sleep(0.5)
+
+    client = ReferenceClient('127.0.0.1', port, packet_filter=random_loss_filter(loss, random.Random(7)))
+    client.connect()
+    time.sleep(seconds)
+    config.is_running = False
+    client.close()
+    server.stop()
+
+    sent = max(server.udp_frames_sent, 1)
+    return client.frames_received / sent, client.packets_recovered, client.bytes_received / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FEC冗余比例 vs 帧完整到达率")
+    parser.add_argument('--loss', type=float, default=0.02, help="随机丢包率")
+    parser.add_argument('--ratios', type=float, nargs='+', default=[0.0, 0.05, 0.1, 0.2, 0.3])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--port', type=int, default=15202)
+    args = parser.parse_args()
+
+    print(f"随机丢包率 {args.loss:.1%}，{args.fps} fps")
+    baseline = None
+    for i, ratio in enumerate(args.ratios):
+        delivered, recovered, rate = run_ratio(ratio, args.port + i * 10, args.seconds, args.fps, args.loss)
+        baseline = baseline or rate
+        print(f"冗余 {ratio:>5.0%}   完整到达 {delivered:>6.1%}   FEC恢复 {recovered:>5} 包   "
+              f"带宽 {rate / 1024:>8.1f} KB/s ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
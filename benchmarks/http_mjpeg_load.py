@@ -0,0 +1,126 @@
+# benchmarks/http_mjpeg_load.py
+"""网页MJPEG负载测试：Flask开发服务器与asyncio版对比
+
+在单个线程里用selectors打开大量/video_feed长连接，只统计收到的MJPEG分段数，
+比较服务器线程数与每个观看者实际收到的帧率：
+    python benchmarks/http_mjpeg_load.py --clients 200 --backend both
+"""
+import sys
+import os
+import time
+import socket
+import selectors
+import threading
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SyntheticCapture, make_config
+from utils.frame_bus import FrameBus
+from servers.tcp_server import TCPServer
+from servers.async_http_server import AsyncHTTPServer
+from servers.web_page import MJPEG_BOUNDARY
+
+MARKER = b'--' + MJPEG_BOUNDARY.encode() + b'\r\n'
+
+
+class MJPEGReader:
+    """不解码的MJPEG观看者，只统计分段边界"""
+
+    def __init__(self, port, width=None):
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        query = f"?w={width}" if width else ""
+        self.sock.sendall(f"GET /video_feed{query} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+        self.sock.setblocking(False)
+        self.frames = 0
+        self.closed = False
+        self._tail = b''
+
+    def on_read(self):
+        try:
+            data = self.sock.recv(262144)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.closed = True
+            return
+        data = self._tail + data
+        self.frames += data.count(MARKER)
+        self._tail = data[-(len(MARKER) - 1):]  # 边界可能跨两次recv
+
+    def close(self):
+        self.sock.close()
+
+
+def run(backend, clients, port, seconds, fps, width):
+    capture = SyntheticCapture(640, 360)
+    config = make_config(port + 1, fps=fps, tcp_port=port, change_detection=False)
+    frame_bus = FrameBus(config, capture)
+    threads_before = set(threading.enumerate())  # 只统计本轮新启动的线程
+    if backend == "asyncio":
+        server = AsyncHTTPServer(config, capture, frame_bus)
+    else:
+        server = TCPServer(config, capture, frame_bus)  # Flask开发服务器无法停止，随进程退出
+    threading.Thread(target=server.run, daemon=True).start()
+    time.sleep(1.0)
+
+    readers = [MJPEGReader(port, width) for _ in range(clients)]
+    selector = selectors.DefaultSelector()
+    for reader in readers:
+        selector.register(reader.sock, selectors.EVENT_READ, reader)
+
+    def pump(duration):
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            for key, _ in selector.select(timeout=0.1):
+                key.data.on_read()
+                if key.data.closed:
+                    selector.unregister(key.fileobj)
+
+    pump(1.0)  # 预热：等所有连接开始收帧
+    for reader in readers:
+        reader.frames = 0
+    start = time.monotonic()
+    peak_threads = 0
+    while time.monotonic() - start < seconds:
+        pump(0.2)
+        peak_threads = max(peak_threads, len(set(threading.enumerate()) - threads_before))
+    elapsed = time.monotonic() - start
+
+    rates = sorted(reader.frames / elapsed for reader in readers)
+    closed = sum(reader.closed for reader in readers)
+    selector.close()
+    for reader in readers:
+        reader.close()
+    config.is_running = False
+    if backend == "asyncio":
+        server.stop()
+    frame_bus.clock.stop()
+    time.sleep(0.5)
+
+    print(f"{backend:8s} 观看者 {clients}  服务器线程 {peak_threads:4d}  "
+          f"每观看者FPS 最低 {rates[0]:5.1f} 中位 {statistics.median(rates):5.1f} 最高 {rates[-1]:5.1f}  "
+          f"断开 {closed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网页MJPEG负载测试")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--backend', choices=['flask', 'asyncio', 'both'], default='both')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--width', type=int, default=None, help="观看者视口宽度(选择分辨率档位)")
+    parser.add_argument('--port', type=int, default=5800)
+    args = parser.parse_args()
+
+    backends = ['flask', 'asyncio'] if args.backend == 'both' else [args.backend]
+    print(f"目标 {args.fps} fps，640x360 合成画面，测试 {args.seconds:.0f} 秒")
+    for offset, backend in enumerate(backends):
+        run(backend, args.clients, args.port + offset * 2, args.seconds, args.fps, args.width)
+
+
+if __name__ == "__main__":
+    main()
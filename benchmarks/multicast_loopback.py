@@ -0,0 +1,108 @@
+# benchmarks/multicast_loopback.py
+"""组播回环测试：单播与组播投递的服务端发送开销对比(Linux回环组播)
+
+启动N个参考客户端，分别在单播和组播模式下统计服务端每帧发出的数据报数与发送耗时
+以及客户端帧率(客户端与服务端在同一进程，帧率受接收线程争用GIL限制)；--blocked模拟收不到组播的客户端(加入了网络不转发的组)，
+验证其超时后自动改回单播。
+回环组播由内核在发送调用内逐个复制给本机成员，发送耗时与单播相近；
+真实局域网中每个包只在网线上发送一次，上行带宽与成员数无关：
+    python benchmarks/multicast_loopback.py --clients 40 --seconds 5
+    python benchmarks/multicast_loopback.py --clients 10 --blocked 2
+"""
+import sys
+import os
+import time
+import threading
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SyntheticCapture, make_config
+from servers.stream_server import DualprotocolStreamServer
+from client.reference_client import ReferenceClient
+
+
+class BlockedMulticastClient(ReferenceClient):
+    """模拟所在网络不转发组播的客户端：加入的是一个没有流量的组播组"""
+
+    def _join_multicast(self, group, port):
+        super()._join_multicast('239.255.42.200', port + 100)
+
+
+class CountingSender:
+    """统计发送耗时的批量发送器代理，数据报数取自发送器自身的计数"""
+
+    def __init__(self, sender):
+        self._sender = sender
+        self.send_time = 0.0
+
+    @property
+    def sends(self):
+        return self._sender.messages
+
+    def send(self, *args):
+        start = time.perf_counter()
+        try:
+            return self._sender.send(*args)
+        finally:
+            self.send_time += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self._sender, name)
+
+
+def run(mode, port, clients, blocked, seconds, fps, size):
+    capture = SyntheticCapture(*size)
+    config = make_config(port, fps=fps, udp_pacing=False, change_detection=False,
+                         multicast_enabled=mode == "multicast", multicast_interface="127.0.0.1")
+    server = DualprotocolStreamServer(config, capture)
+    threading.Thread(target=server.start_servers, daemon=True).start()
+    time.sleep(0.5)
+    server.udp_sender = counter = CountingSender(server.udp_sender)
+
+    receivers = []
+    for i in range(clients):
+        client_class = BlockedMulticastClient if i < blocked else ReferenceClient
+        client = client_class('127.0.0.1', port, multicast_interface="127.0.0.1", multicast_timeout=2.0)
+        client.connect()
+        receivers.append(client)
+    time.sleep(1.0 + (2.5 if blocked else 0))  # 等待加入组播组(及被阻断客户端超时回退)
+
+    frames_before = [client.frames_received for client in receivers]
+    sends_before, time_before, sent_before = counter.sends, counter.send_time, server.udp_frames_sent
+    time.sleep(seconds)
+    fps_list = [(client.frames_received - before) / seconds for client, before in zip(receivers, frames_before)]
+    frames = max(1, server.udp_frames_sent - sent_before)
+    send_ms = (counter.send_time - time_before) / frames * 1000
+    members = len(server.multicast_members)
+
+    config.is_running = False
+    for client in receivers:
+        client.close()
+    server.stop()
+
+    print(f"{mode:<9} 客户端 {clients:>3}   组播成员 {members:>3}   每帧数据报 {(counter.sends - sends_before) / frames:>7.1f}   "
+          f"发送耗时 {send_ms:>6.2f} ms/帧   客户端帧率 最低 {min(fps_list):5.1f} 平均 {sum(fps_list) / len(fps_list):5.1f}")
+    if blocked:
+        fallback = sum(1 for client in receivers[:blocked] if client.multicast_socket is None)
+        print(f"          被阻断组播的客户端 {blocked}，已改回单播 {fallback}，"
+              f"其帧率 {[round(fps, 1) for fps in fps_list[:blocked]]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单播/组播投递对比")
+    parser.add_argument('--clients', type=int, default=40)
+    parser.add_argument('--blocked', type=int, default=0, help="模拟收不到组播的客户端数")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--port', type=int, default=15402)
+    args = parser.parse_args()
+
+    size = tuple(map(int, args.size.split('x')))
+    run("unicast", args.port, args.clients, 0, args.seconds, args.fps, size)
+    run("multicast", args.port + 10, args.clients, args.blocked, args.seconds, args.fps, size)
+
+
+if __name__ == "__main__":
+    main()
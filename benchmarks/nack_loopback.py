@@ -0,0 +1,58 @@
+# benchmarks/nack_loopback.py
+"""NACK重传回环测试：随机丢包下开启/关闭重传截止时间的帧完整到达率与时延
+
+    python benchmarks/nack_loopback.py --loss 0.02 --seconds 5
+"""
+import sys
+import os
+import time
+import random
+import threading
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from benchmarks.synthetic import SyntheticCapture, make_config
+from benchmarks.fec_loss_harness import random_loss_filter
+from servers.stream_server import DualprotocolStreamServer
+from client.reference_client import ReferenceClient
+
+
+def run_case(name, port, seconds, fps, loss, **overrides):
+    capture = SyntheticCapture()
+    config = make_config(port, fps=fps, change_detection=False, **overrides)
+    server = DualprotocolStreamServer(config, capture)
+    threading.Thread(target=server.start_servers, daemon=True).start()
+    time.sleep(0.5)
+
+    client = ReferenceClient('127.0.0.1', port, packet_filter=random_loss_filter(loss, random.Random(3)))
+    client.connect()
+    time.sleep(seconds)
+    config.is_running = False
+    client.close()
+    server.stop()
+
+    sent = max(server.udp_frames_sent, 1)
+    latencies = np.array(client.latencies) if client.latencies else np.array([np.nan])
+    print(f"{name:<14} 完整到达 {client.frames_received / sent:>6.1%}   NACK {client.packets_nacked:>4} 包   "
+          f"重传 {server.retransmit_cache.stats}   时延p95 {np.nanpercentile(latencies, 95):>6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NACK选择性重传回环测试")
+    parser.add_argument('--loss', type=float, default=0.02)
+    parser.add_argument('--seconds', type=float, default=4.0)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--port', type=int, default=15302)
+    args = parser.parse_args()
+
+    print(f"随机丢包率 {args.loss:.1%}，{args.fps} fps")
+    run_case("不重传", args.port, args.seconds, args.fps, args.loss, retransmit_deadline=0.0)
+    run_case("截止200ms", args.port + 10, args.seconds, args.fps, args.loss, retransmit_deadline=0.2)
+    run_case("截止200ms+FEC", args.port + 20, args.seconds, args.fps, args.loss,
+             retransmit_deadline=0.2, fec_ratio=0.1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/preprocess_bench.py
+"""预处理阶段基准测试：逐阶段转换/复制(旧实现) vs 一次写入缓冲池的预处理
+
+每帧模拟 捕获(BGRA) → 总线快照 → 预览 三个阶段，统计耗时与每帧新分配的内存：
+    python benchmarks/preprocess_bench.py --width 1920 --height 1080 --frames 300
+    python benchmarks/preprocess_bench.py --max-width 1280
+"""
+import sys
+import os
+import time
+import argparse
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from utils.capture_backends import FrameRing
+from utils.preprocess import FramePreprocessor
+
+
+def legacy_pipeline(raw, ring, max_width):
+    """旧实现：捕获端转换到缓冲环 → 快照复制(可选再缩小) → 预览复制、缩小、转RGB"""
+    h, w = raw.shape[:2]
+    frame = ring.next((h, w, 3))
+    cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR, dst=frame)
+    snapshot = frame.copy()
+    if max_width and w > max_width:
+        snapshot = cv2.resize(snapshot, (max_width, int(h * max_width / w)), interpolation=cv2.INTER_AREA)
+    preview = snapshot.copy()
+    ph, pw = preview.shape[:2]
+    scale = min(350 / pw, 230 / ph, 1.0)
+    preview = cv2.resize(preview, (int(pw * scale), int(ph * scale)))
+    return snapshot, cv2.cvtColor(preview, cv2.COLOR_BGR2RGB)
+
+
+def make_pooled_pipeline(max_width):
+    bus = FramePreprocessor(max_width=max_width)
+    preview = FramePreprocessor(max_width=350, max_height=230, rgb=True,
+                                interpolation=cv2.INTER_LINEAR, name='preview')
+
+    def run(raw):
+        snapshot = bus.process(raw)
+        return snapshot, preview.process(snapshot)
+    return run, bus, preview
+
+
+def run(name, pipeline, raw, frames):
+    # 保留最近两帧的结果，模拟订阅者持有快照
+    held = []
+    start = time.perf_counter()
+    for _ in range(frames):
+        held = (held + [pipeline(raw)])[-2:]
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        held = (held + [pipeline(raw)])[-2:]
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - base
+    tracemalloc.stop()
+
+    print(f"{name:<8} {elapsed / frames * 1000:>7.2f} ms/帧   每帧分配 {allocated / frames / 1024:>9.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预处理阶段基准测试")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--max-width', type=int, default=0, help="捕获后缩小到的最大宽度(0为不缩小)")
+    args = parser.parse_args()
+
+    raw = np.random.randint(0, 256, (args.height, args.width, 4), dtype=np.uint8)
+    max_width = args.max_width or None
+    print(f"合成画面 {args.width}x{args.height} BGRA，最大宽度 {max_width or '不限'}，每组 {args.frames} 帧")
+    ring = FrameRing()
+    run("legacy", lambda image: legacy_pipeline(image, ring, max_width), raw, args.frames)
+    pooled, bus, preview = make_pooled_pipeline(max_width)
+    run("pooled", pooled, raw, args.frames)
+    print(f"预处理: {bus.summary}")
+    print(f"预览:   {preview.summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/stream_server_load.py
+"""流媒体服务器负载测试：线程版与asyncio版对比
+
+在单个线程里用selectors模拟大量轻量客户端（TCP握手 + hello + UDP注册，只统计完整到达的UDP帧），
+比较服务器线程数与每个客户端实际收到的帧率：
+    python benchmarks/stream_server_load.py --clients 200 --backend both
+"""
+import sys
+import os
+import time
+import socket
+import selectors
+import threading
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SyntheticCapture, make_config
+from servers.stream_server import DualprotocolStreamServer
+from servers.async_stream_server import AsyncStreamServer
+from servers.packetizer import parse_header, PTYPE_DATA
+from servers.control_protocol import encode_message, udp_register_message
+
+
+class LoadClient:
+    """不解码的轻量客户端，只统计完整到达的帧"""
+
+    def __init__(self, port):
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.udp.bind(('127.0.0.1', 0))
+        self.udp.setblocking(False)
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.connect(('127.0.0.1', port))
+        self.tcp.recv(1024)  # STREAM_OK
+        self.tcp.sendall(b"READY" + encode_message({'type': 'hello', 'udp_port': self.udp.getsockname()[1]}))
+        self.tcp.setblocking(False)
+        self.port = port
+        self.heartbeat()
+        self.tcp_closed = False
+        self.frames = 0
+        self._pending = {}
+
+    def heartbeat(self):
+        """UDP注册/心跳(不解析会话消息，按地址刷新会话)"""
+        self.udp.sendto(udp_register_message(), ('127.0.0.1', self.port + 1))
+
+    def on_udp(self):
+        while True:
+            try:
+                packet = self.udp.recv(65535)
+            except BlockingIOError:
+                return
+            header = parse_header(packet)
+            if header is None or header[0] != PTYPE_DATA:
+                continue
+            _, _, frame_id, _, count, _ = header
+            received = self._pending.get(frame_id, 0) + 1
+            if received == count:
+                self._pending.pop(frame_id, None)
+                self.frames += 1
+            else:
+                self._pending[frame_id] = received
+            if len(self._pending) > 16:
+                self._pending.pop(next(iter(self._pending)))
+
+    def on_tcp(self):
+        try:
+            if not self.tcp.recv(65536):
+                self.tcp_closed = True
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.tcp_closed = True
+
+    def close(self):
+        self.udp.close()
+        self.tcp.close()
+
+
+def run(backend, clients, port, seconds, fps):
+    capture = SyntheticCapture(640, 360)
+    config = make_config(port, fps=fps, change_detection=False, udp_pacing=False, abr_enabled=False)
+    server_class = AsyncStreamServer if backend == "asyncio" else DualprotocolStreamServer
+    server = server_class(config, capture)
+    threads_before = threading.active_count()
+    threading.Thread(target=server.start_servers, daemon=True).start()
+    time.sleep(0.5)
+
+    load = [LoadClient(port) for _ in range(clients)]
+    selector = selectors.DefaultSelector()
+    for client in load:
+        selector.register(client.udp, selectors.EVENT_READ, client.on_udp)
+        selector.register(client.tcp, selectors.EVENT_READ, client.on_tcp)
+
+    time.sleep(0.5)
+    for client in load:
+        client.frames = 0
+    start = time.monotonic()
+    peak_threads = 0
+    last_heartbeat = start
+    while time.monotonic() - start < seconds:
+        for key, _ in selector.select(timeout=0.1):
+            key.data()
+        if time.monotonic() - last_heartbeat >= config.heartbeat_interval:
+            last_heartbeat = time.monotonic()
+            for client in load:
+                client.heartbeat()
+        peak_threads = max(peak_threads, threading.active_count() - threads_before)
+    elapsed = time.monotonic() - start
+
+    rates = sorted(client.frames / elapsed for client in load)
+    config.is_running = False
+    server.stop()
+    selector.close()
+    for client in load:
+        client.close()
+    time.sleep(0.5)
+
+    print(f"{backend:8s} 客户端 {clients}  服务器线程 {peak_threads:4d}  "
+          f"每客户端FPS 最低 {rates[0]:5.1f} 中位 {statistics.median(rates):5.1f} 最高 {rates[-1]:5.1f}  "
+          f"TCP断开 {sum(client.tcp_closed for client in load)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流媒体服务器负载测试")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--backend', choices=['thread', 'asyncio', 'both'], default='both')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--port', type=int, default=5700)
+    args = parser.parse_args()
+
+    backends = ['thread', 'asyncio'] if args.backend == 'both' else [args.backend]
+    print(f"目标 {args.fps} fps，640x360 合成画面，测试 {args.seconds:.0f} 秒")
+    for offset, backend in enumerate(backends):
+        run(backend, args.clients, args.port + offset * 2, args.seconds, args.fps)
+
+
+if __name__ == "__main__":
+    main()
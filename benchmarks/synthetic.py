@@ -0,0 +1,93 @@
+# benchmarks/synthetic.py
+"""基准测试/回环测试共用的合成数据源"""
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from config import AppConfig
+
+
+class SyntheticWindow:
+    """模拟pygetwindow的窗口对象"""
+
+    def __init__(self, width, height, title="合成窗口"):
+        self.title = title
+        self.left = 0
+        self.top = 0
+        self.width = width
+        self.height = height
+
+
+class SyntheticCapture:
+    """模拟聊天/文档窗口：大面积静态文字，每帧只有一行在“打字”和一个闪烁光标"""
+
+    win_api_available = False
+
+    def __init__(self, width=1280, height=720, seed=0):
+        self.window = SyntheticWindow(width, height)
+        rng = np.random.default_rng(seed)
+        base = np.full((height, width, 3), 245, dtype=np.uint8)
+        cv2.rectangle(base, (0, 0), (220, height), (60, 60, 60), -1)  # 侧边栏
+        for y in range(40, height - 20, 28):
+            words = int(rng.integers(20, 60))
+            text = ''.join(rng.choice(list("abcdefghijklmnopqrstuvwxyz "), size=words))
+            cv2.putText(base, text, (240, y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (30, 30, 30), 1, cv2.LINE_AA)
+        self.base = base
+        self.ticks = 0
+        self._lock = threading.Lock()
+
+    def capture_window_content(self):
+        with self._lock:
+            self.ticks += 1
+            frame = self.base.copy()
+        h, w = frame.shape[:2]
+        typed = "typing " * (self.ticks % 20)
+        cv2.putText(frame, typed, (240, h - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 30, 30), 1, cv2.LINE_AA)
+        if self.ticks % 2:
+            cv2.line(frame, (240 + 8 * (self.ticks % 60), h - 58), (240 + 8 * (self.ticks % 60), h - 36), (0, 0, 0), 2)
+        return frame, self.window
+
+
+def make_config(stream_port, fps=30, **overrides):
+    """构造一份运行状态的配置"""
+    config = AppConfig()
+    config.window_title = "合成窗口"
+    config.stream_port = stream_port
+    config.fps = fps
+    config.show_debug = False
+    config.is_running = True
+    config.start_time = time.time()
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return config
+
+
+def psnr(a, b):
+    """峰值信噪比(dB)"""
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float('inf')
+    return 10 * np.log10(255.0 ** 2 / mse)
+
+
+def ssim(a, b):
+    """结构相似度(灰度，11x11高斯窗口，σ=1.5)"""
+    x = cv2.cvtColor(a, cv2.COLOR_BGR2GRAY).astype(np.float64)
+    y = cv2.cvtColor(b, cv2.COLOR_BGR2GRAY).astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(image):
+        return cv2.GaussianBlur(image, (11, 11), 1.5)
+
+    mu_x, mu_y = blur(x), blur(y)
+    sigma_x = blur(x * x) - mu_x ** 2
+    sigma_y = blur(y * y) - mu_y ** 2
+    sigma_xy = blur(x * y) - mu_x * mu_y
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / \
+               ((mu_x ** 2 + mu_y ** 2 + c1) * (sigma_x + sigma_y + c2))
+    return float(ssim_map.mean())
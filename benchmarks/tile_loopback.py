@@ -0,0 +1,70 @@
+# benchmarks/tile_loopback.py
+"""回环测试：对比完整帧、图块增量与视频编码模式的带宽和重建质量
+
+在本机启动DualprotocolStreamServer（合成窗口作为捕获源），
+用参考客户端接收并重建画面：
+    python benchmarks/tile_loopback.py --seconds 5
+    python benchmarks/tile_loopback.py --size 1920x1080 --video-codec vp8
+视频编码模式需要PyAV，不可用时跳过
+"""
+import sys
+import os
+import time
+import threading
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import SyntheticCapture, make_config, psnr
+from servers.stream_server import DualprotocolStreamServer
+from servers.video_codec import video_available
+from client.reference_client import ReferenceClient
+
+
+def run_mode(mode, port, seconds, fps, size, **overrides):
+    capture = SyntheticCapture(*size)
+    config = make_config(port, fps=fps, stream_mode=mode, **overrides)
+    server = DualprotocolStreamServer(config, capture)
+    threading.Thread(target=server.start_servers, daemon=True).start()
+    time.sleep(0.5)
+
+    client = ReferenceClient('127.0.0.1', port)
+    client.connect()
+    time.sleep(seconds)
+
+    frames, received = client.frames_received, client.bytes_received
+    reference, _ = capture.capture_window_content()
+    quality = psnr(client.latest, reference) if client.latest is not None else float('nan')
+    config.is_running = False
+    client.close()
+    server.stop()
+
+    print(f"{mode:<6} 帧数 {frames:>5}   带宽 {received / seconds / 1024:>9.1f} KB/s   "
+          f"平均每帧 {received / max(frames, 1) / 1024:>7.1f} KB   "
+          f"关键帧请求 {client.keyframe_requests}   末帧PSNR {quality:.1f} dB")
+    if mode == "tile":
+        print(f"       图块统计: {server.tile_encoder.stats}")
+    if mode == "video" and server.video_encoder is not None:
+        print(f"       视频统计: {server.video_encoder.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="完整帧/图块增量回环对比")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--port', type=int, default=15002)
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--video-codec', default='h264', choices=['h264', 'vp8'])
+    args = parser.parse_args()
+
+    size = tuple(map(int, args.size.split('x')))
+    run_mode("full", args.port, args.seconds, args.fps, size)
+    run_mode("tile", args.port + 10, args.seconds, args.fps, size)
+    if video_available(args.video_codec):
+        run_mode("video", args.port + 20, args.seconds, args.fps, size, video_codec=args.video_codec)
+    else:
+        print(f"video  跳过：PyAV或{args.video_codec}编码器不可用")
+
+
+if __name__ == "__main__":
+    main()
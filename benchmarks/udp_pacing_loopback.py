@@ -0,0 +1,71 @@
+# benchmarks/udp_pacing_loopback.py
+"""回环丢包/时延测试：64KB大数据报 vs MTU分包+令牌桶节奏控制
+
+客户端按“IP分片丢失”模型模拟链路丢包：一个数据报被拆成
+ceil(长度/1472)个IP分片，任一分片丢失则整个数据报丢失：
+    python benchmarks/udp_pacing_loopback.py --loss 0.01 --seconds 5
+"""
+import sys
+import os
+import time
+import random
+import threading
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from benchmarks.synthetic import SyntheticCapture, make_config
+from servers.stream_server import DualprotocolStreamServer
+from client.reference_client import ReferenceClient
+
+IP_FRAGMENT_PAYLOAD = 1472  # 以太网MTU 1500 - IP头 - UDP头
+
+
+def fragment_loss_filter(loss, rng):
+    """按IP分片数放大丢包概率的过滤器"""
+    def keep(packet):
+        fragments = -(-len(packet) // IP_FRAGMENT_PAYLOAD)
+        return rng.random() >= 1 - (1 - loss) ** fragments
+    return keep
+
+
+def run_case(name, port, seconds, fps, loss, **overrides):
+    capture = SyntheticCapture(1920, 1080)
+    # 关闭变化检测，保证每个周期都发送完整帧
+    config = make_config(port, fps=fps, change_detection=False, **overrides)
+    server = DualprotocolStreamServer(config, capture)
+    threading.Thread(target=server.start_servers, daemon=True).start()
+    time.sleep(0.5)
+
+    client = ReferenceClient('127.0.0.1', port,
+                             packet_filter=fragment_loss_filter(loss, random.Random(1)))
+    client.connect()
+    time.sleep(seconds)
+    config.is_running = False
+    client.close()
+    server.stop()
+
+    sent = max(server.udp_frames_sent, 1)
+    latencies = np.array(client.latencies) if client.latencies else np.array([np.nan])
+    print(f"{name:<16} 发送 {sent:>4} 帧   完整到达 {client.frames_received / sent:>6.1%}   "
+          f"时延 均值 {np.nanmean(latencies):>6.1f} ms  p95 {np.nanpercentile(latencies, 95):>6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP分包/节奏控制回环对比")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--loss', type=float, default=0.01, help="单个IP分片的丢失概率")
+    parser.add_argument('--port', type=int, default=15102)
+    args = parser.parse_args()
+
+    print(f"分片丢失率 {args.loss:.1%}，{args.fps} fps，1920x1080合成画面")
+    run_case("64KB数据报", args.port, args.seconds, args.fps, args.loss,
+             udp_mtu=65507, udp_pacing=False)
+    run_case("MTU 1200+节奏", args.port + 10, args.seconds, args.fps, args.loss,
+             udp_mtu=1200, udp_pacing=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/udp_send_bench.py
+"""UDP发送微基准：逐包拼接+逐客户端sendto(旧实现) vs 批量发送
+
+发送到本机绑定但不读取的UDP端口(接收缓冲区满后内核直接丢弃)，
+统计每秒数据报数与每帧CPU时间(分包+发送)：
+    python benchmarks/udp_send_bench.py --frame-kb 100 --clients 1 10 40
+"""
+import sys
+import os
+import time
+import socket
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from servers.packetizer import Packetizer, PACKET_HEADER, PROTOCOL_VERSION, PTYPE_DATA, timestamp_ms
+from servers.udp_batch import BatchSender, sendmmsg_available
+
+
+def legacy_send(sock, packetizer, payload, frame_id, clients, last_seen):
+    """旧实现：每个包 包头+切片 拼接成新bytes，每个客户端一次sendto并刷新最后活动时间"""
+    size = packetizer.payload_size
+    count = max(1, -(-len(payload) // size))
+    ts = timestamp_ms()
+    view = memoryview(payload)
+    packets = [PACKET_HEADER.pack(PROTOCOL_VERSION, PTYPE_DATA, 0, frame_id, i, count, ts) + view[i * size:(i + 1) * size]
+               for i in range(count)]
+    for packet in packets:
+        for addr in clients:
+            sock.sendto(packet, addr)
+            last_seen[addr] = time.time()
+    return len(packets) * len(clients)
+
+
+def batched_send(sender, packetizer, payload, frame_id, clients, last_seen):
+    batch = packetizer.packetize_batch(payload, frame_id)
+    sender.send(batch, 0, batch.count, clients)
+    now = time.time()
+    for addr in clients:
+        last_seen[addr] = now
+    return batch.count * len(clients)
+
+
+def run(name, send, frames):
+    datagrams = 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    for frame_id in range(frames):
+        datagrams += send(frame_id)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(f"  {name:<9} {datagrams / wall:>10.0f} 包/s   CPU {cpu / frames * 1000:>7.2f} ms/帧")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP发送微基准")
+    parser.add_argument('--frame-kb', type=int, default=100)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 40])
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    payload = os.urandom(args.frame_kb * 1024)
+    packetizer = Packetizer(1200)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+    sock.settimeout(0.1)
+    modes = (['sendmmsg'] if sendmmsg_available() else []) + (['sendmsg'] if hasattr(sock, 'sendmsg') else []) + ['sendto']
+    print(f"每帧 {args.frame_kb} KB，{-(-len(payload) // packetizer.payload_size)} 个包，每组 {args.frames} 帧")
+
+    for count in args.clients:
+        receivers = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(count)]
+        for receiver in receivers:
+            receiver.bind(('127.0.0.1', 0))
+        clients = [receiver.getsockname() for receiver in receivers]
+        last_seen = {}
+        print(f"{count} 个客户端")
+        run("legacy", lambda frame_id: legacy_send(sock, packetizer, payload, frame_id, clients, last_seen), args.frames)
+        for mode in modes:
+            sender = BatchSender(sock, mode=mode)
+            run(mode, lambda frame_id: batched_send(sender, packetizer, payload, frame_id, clients, last_seen),
+                args.frames)
+        for receiver in receivers:
+            receiver.close()
+
+
+if __name__ == "__main__":
+    main()
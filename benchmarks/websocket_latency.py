@@ -0,0 +1,135 @@
+# benchmarks/websocket_latency.py
+"""浏览器传输延迟对比：MJPEG(/video_feed)与WebSocket(/ws)
+
+捕获时把单调时钟毫秒数以黑白方块写进画面左上角，客户端解码后读出，
+两种传输用同样的方法计算 捕获 → 解码完成 的端到端延迟。
+--decode-ms 模拟性能较差的手机(每帧解码绘制耗时)，观察延迟是否随时间累积：
+    python benchmarks/websocket_latency.py --fps 30 --decode-ms 0
+    python benchmarks/websocket_latency.py --fps 30 --decode-ms 80
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from benchmarks.synthetic import SyntheticCapture, make_config
+from servers.async_http_server import AsyncHTTPServer
+from servers.web_page import MJPEG_BOUNDARY
+from servers.websocket import read_message, encode_frame, FRAME_HEADER, OP_BINARY, OP_TEXT
+
+STAMP_BITS = 32
+STAMP_BLOCK = 16
+
+
+class StampedCapture(SyntheticCapture):
+    """在画面左上角写入捕获时刻(time.monotonic毫秒，32位)"""
+
+    def capture_window_content(self):
+        frame, window = super().capture_window_content()
+        stamp = int(time.monotonic() * 1000) & 0xFFFFFFFF
+        for bit in range(STAMP_BITS):
+            value = 255 if stamp >> bit & 1 else 0
+            frame[0:STAMP_BLOCK, bit * STAMP_BLOCK:(bit + 1) * STAMP_BLOCK] = value
+        return frame, window
+
+
+def read_stamp(jpeg):
+    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    stamp = 0
+    for bit in range(STAMP_BITS):
+        block = frame[4:STAMP_BLOCK - 4, bit * STAMP_BLOCK + 4:(bit + 1) * STAMP_BLOCK - 4]
+        if block.mean() > 128:
+            stamp |= 1 << bit
+    return stamp
+
+
+def latency_ms(stamp):
+    return ((int(time.monotonic() * 1000) & 0xFFFFFFFF) - stamp) % (1 << 32)
+
+
+async def mjpeg_client(port, seconds, decode_delay):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=16 * 1024 * 1024)
+    writer.write(b"GET /video_feed HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+    marker = b'--' + MJPEG_BOUNDARY.encode() + b'\r\n'
+    await reader.readuntil(marker)
+    latencies = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        part = await reader.readuntil(marker)
+        jpeg = part[part.index(b'\r\n\r\n') + 4:-(len(marker) + 2)]
+        latencies.append(latency_ms(read_stamp(jpeg)))
+        if decode_delay:
+            await asyncio.sleep(decode_delay)
+    writer.close()
+    return latencies
+
+
+async def websocket_client(port, seconds, decode_delay):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b"GET /ws HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    await reader.readuntil(b'\r\n\r\n')
+    latencies = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        opcode, payload = await read_message(reader, max_size=16 * 1024 * 1024)
+        if opcode != OP_BINARY:
+            continue
+        _, seq, timestamp = FRAME_HEADER.unpack_from(payload)
+        start = time.monotonic()
+        latencies.append(latency_ms(read_stamp(payload[FRAME_HEADER.size:])))
+        if decode_delay:
+            await asyncio.sleep(decode_delay)
+        ack = {'type': 'ack', 'seq': seq, 't': timestamp, 'decode_ms': (time.monotonic() - start) * 1000}
+        writer.write(encode_frame(OP_TEXT, json.dumps(ack).encode(), mask=True))
+    writer.close()
+    return latencies
+
+
+def summarize(name, latencies, seconds):
+    tail = latencies[len(latencies) // 2:]  # 后半段：延迟是否累积
+    print(f"{name:9s} 帧率 {len(latencies) / seconds:5.1f}  延迟(ms) 中位 {statistics.median(latencies):6.1f}  "
+          f"P95 {sorted(latencies)[int(len(latencies) * 0.95)]:6.1f}  最大 {max(latencies):6.1f}  "
+          f"后半段中位 {statistics.median(tail):6.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MJPEG与WebSocket传输延迟对比")
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--decode-ms', type=float, default=0.0, help="模拟客户端每帧解码绘制耗时")
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--port', type=int, default=5850)
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split('x'))
+    capture = StampedCapture(width, height)
+    config = make_config(args.port + 1, fps=args.fps, tcp_port=args.port, change_detection=False)
+    server = AsyncHTTPServer(config, capture)
+    threading.Thread(target=server.run, daemon=True).start()
+    time.sleep(0.5)
+
+    decode_delay = args.decode_ms / 1000
+    print(f"{args.size} @ {args.fps} fps，模拟解码耗时 {args.decode_ms:.0f} ms，测试 {args.seconds:.0f} 秒")
+    for name, client in (('MJPEG', mjpeg_client), ('WebSocket', websocket_client)):
+        latencies = asyncio.run(client(args.port, args.seconds, decode_delay))
+        summarize(name, latencies, args.seconds)
+        time.sleep(0.5)
+    stats = server.websocket_stats
+    print(f"服务端: WebSocket确认延迟 平均 {stats['latency']['avg_ms']:.1f} ms，跳过帧 {stats['skipped']}")
+
+    config.is_running = False
+    server.stop()
+    server.frame_bus.clock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+# client/reference_client.py
+"""云窗参考客户端
+
+连接双协议流媒体服务器（TCP握手 + UDP注册），重组UDP分片，
+解码完整JPEG帧或图块增量帧，用于回环测试与协议参考实现：
+    python client/reference_client.py 192.168.1.10 --port 5002 --show
+
+丢包处理：先尝试FEC恢复，仍不完整时通过TCP控制通道发送NACK请求重传；
+完整的帧按帧ID顺序交付，缺口等待reorder_wait后放弃。
+服务端启用组播时加入组播组接收，收不到组播包时通知服务端改回单播
+"""
+import sys
+import os
+import time
+import socket
+import select
+import threading
+import logging
+import argparse
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from servers.tile_codec import TileDecoder, is_tile_frame
+from servers.video_codec import VideoDecoder, is_video_frame
+from servers.packetizer import PACKET_HEADER, PTYPE_PARITY, parse_header, timestamp_ms
+from servers.fec import recover
+from servers.control_protocol import MessageReader, send_message, udp_register_message
+from servers.multicast import open_receiver
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_delta(a, b):
+    """16位回绕帧ID之差 a - b，范围[-32768, 32767]"""
+    return (a - b + 32768) % 65536 - 32768
+
+
+class ReferenceClient:
+    """参考客户端：接收并重建视频帧"""
+
+    def __init__(self, host, port, on_frame=None, max_pending=8, packet_filter=None,
+                 nack_delay=0.03, reorder_wait=0.1, report_interval=1.0, viewport=None,
+                 multicast=True, multicast_interface=None, multicast_timeout=3.0):
+        self.host = host
+        self.port = port
+        self.on_frame = on_frame  # 回调 on_frame(frame)
+        self.max_pending = max_pending  # 同时重组的最大帧数
+        self.packet_filter = packet_filter  # 可选：返回False则丢弃该包（用于模拟丢包）
+        self.nack_delay = nack_delay  # 帧最后一个包到达后多久仍不完整即发送NACK
+        self.reorder_wait = reorder_wait  # 等待缺口帧的最长时间
+        self.report_interval = report_interval  # 接收报告间隔
+        self.viewport = viewport  # 显示区域宽度(像素)，服务端据此选择分辨率档位
+        self.multicast = multicast  # 服务端启用组播时是否加入组播组
+        self.multicast_interface = multicast_interface  # 加入组播组的网卡IP，None为系统默认
+        self.multicast_timeout = multicast_timeout  # 服务端持续发帧但这么久收不到组播包则改回单播
+        self.multicast_socket = None
+        self.multicast_packets = 0
+        self.tcp_socket = None
+        self.udp_socket = None
+        self.running = False
+        self.decoder = TileDecoder()
+        self.video_decoder = None  # 收到第一帧视频编码数据时创建
+        self.latest = None
+        self._send_lock = threading.Lock()
+        self._pending = {}  # frame_id -> 重组中的帧
+        self._ready = {}  # frame_id -> (负载, 完成时间)，等待按序交付
+        self._next_deliver = None
+        self._last_frame_id = None
+        self._last_keyframe_request = 0.0
+        self.frames_received = 0
+        self.frames_incomplete = 0
+        self.bytes_received = 0
+        self.packets_received = 0
+        self.packets_recovered = 0  # 通过FEC恢复的包数
+        self.packets_nacked = 0
+        self.keyframe_requests = 0
+        self.latencies = deque(maxlen=1000)  # 最近帧的 完整到达时间 - 发送时间戳(毫秒)
+        self._last_multicast = 0.0  # 加入组播组或最近一次收到组播包的时间
+        self._last_frame_info = 0.0  # 最近一次收到服务端帧信息的时间
+        self.session_id = None  # 服务端下发的会话ID，UDP心跳携带
+        self.heartbeat_interval = None  # 服务端要求的心跳间隔(秒)
+        self._last_heartbeat = 0.0
+        # 接收报告统计
+        self._last_report = time.monotonic()
+        self._expected = 0
+        self._arrived = 0
+        self._jitter = 0.0
+        self._last_transit = None
+        self._report_latencies = []
+
+    def connect(self, timeout=5.0):
+        """完成TCP握手，声明UDP端口并注册UDP端点"""
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.bind(('', 0))
+        self.udp_socket.settimeout(0.02)
+
+        self.tcp_socket = socket.create_connection((self.host, self.port), timeout=timeout)
+        if self.tcp_socket.recv(1024) != b"STREAM_OK":
+            raise ConnectionError("服务器握手失败")
+        self.tcp_socket.send(b"READY")
+        self.send_control({'type': 'hello', 'udp_port': self.udp_socket.getsockname()[1]})
+        if self.viewport:
+            self.send_control({'type': 'viewport', 'width': self.viewport})
+
+        self.udp_socket.sendto(udp_register_message(), (self.host, self.port + 1))
+
+        self.running = True
+        threading.Thread(target=self._udp_loop, daemon=True).start()
+        threading.Thread(target=self._tcp_loop, daemon=True).start()
+        logger.info(f"已连接到 {self.host}:{self.port}")
+
+    def send_control(self, message):
+        """通过TCP控制通道发送消息"""
+        try:
+            with self._send_lock:
+                send_message(self.tcp_socket, message)
+        except OSError as e:
+            logger.error(f"控制消息发送失败: {e}")
+
+    def request_keyframe(self):
+        """请求关键帧（限频）"""
+        now = time.monotonic()
+        if now - self._last_keyframe_request < 0.5:
+            return
+        self._last_keyframe_request = now
+        self.keyframe_requests += 1
+        self.send_control({'type': 'keyframe'})
+
+    def _tcp_loop(self):
+        """读取服务器控制消息，连接断开时停止客户端"""
+        reader = MessageReader()
+        self.tcp_socket.settimeout(1.0)
+        while self.running:
+            try:
+                data = self.tcp_socket.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not data:
+                logger.info("服务器已关闭TCP连接")
+                break
+            for message in reader.feed(data):
+                self._handle_control(message)
+        self.running = False
+
+    def _handle_control(self, message):
+        msg_type = message.get('type')
+        if msg_type == 'frame_info':
+            self._last_frame_info = time.monotonic()
+        elif msg_type == 'session':
+            self.session_id = message['id']
+            self.heartbeat_interval = float(message.get('heartbeat', 2.0))
+        elif msg_type == 'multicast' and self.multicast and self.multicast_socket is None:
+            self._join_multicast(message['group'], int(message['port']))
+
+    def _join_multicast(self, group, port):
+        try:
+            sock = open_receiver(group, port, self.multicast_interface)
+        except OSError as e:
+            logger.warning(f"加入组播组 {group}:{port} 失败({e})，使用单播")
+            self.send_control({'type': 'multicast', 'joined': False})
+            return
+        sock.settimeout(0.02)
+        self._last_multicast = time.monotonic()
+        self.multicast_socket = sock
+        self.send_control({'type': 'multicast', 'joined': True})
+        logger.info(f"已加入组播组 {group}:{port}")
+
+    def _leave_multicast(self):
+        """收不到组播包(网络不转发组播)：关闭组播套接字并通知服务端改回单播"""
+        logger.warning(f"{self.multicast_timeout:.0f}秒内未收到组播包，改回单播")
+        sock, self.multicast_socket = self.multicast_socket, None
+        sock.close()
+        self.multicast = False  # 不再尝试
+        self.send_control({'type': 'multicast', 'joined': False})
+
+    def _udp_loop(self):
+        while self.running:
+            multicast_socket = self.multicast_socket
+            sockets = [self.udp_socket] if multicast_socket is None else [self.udp_socket, multicast_socket]
+            try:
+                readable, _, _ = select.select(sockets, [], [], 0.02)
+                for sock in readable:
+                    packet, _ = sock.recvfrom(65535)
+                    if sock is multicast_socket:
+                        self.multicast_packets += 1
+                        self._last_multicast = time.monotonic()
+                    self._handle_packet(packet)
+            except socket.timeout:
+                pass
+            except (OSError, ValueError):
+                break  # 套接字已关闭
+            now = time.monotonic()
+            if (multicast_socket is not None and
+                    self._last_frame_info - self._last_multicast > self.multicast_timeout):
+                self._leave_multicast()
+            self._check_loss(now)
+            self._flush(now)
+            if now - self._last_report >= self.report_interval:
+                self._send_report(now)
+            if self.heartbeat_interval and now - self._last_heartbeat >= self.heartbeat_interval:
+                self._send_heartbeat(now)
+
+    def _handle_packet(self, packet):
+        if self.packet_filter and not self.packet_filter(packet):
+            return
+        header = parse_header(packet)
+        if header is None:
+            return  # 协议版本不符
+        self.bytes_received += len(packet)
+        self.packets_received += 1
+        ptype, groups, frame_id, index, total, ts = header
+        now = time.monotonic()
+        self._update_jitter(ts)
+
+        if self._next_deliver is not None and _frame_delta(frame_id, self._next_deliver) < 0:
+            return  # 已交付或已放弃的帧
+        pending = self._pending.get(frame_id)
+        if pending is None:
+            if frame_id in self._ready:
+                return  # 已完成帧的剩余校验包/重复重传
+            pending = self._pending[frame_id] = {
+                'chunks': {}, 'parity': {}, 'total': total, 'groups': groups,
+                'last_arrival': now, 'nacked': False}
+            self._expected += total
+            self._last_frame_id = frame_id
+        pending['last_arrival'] = now
+        payload = packet[PACKET_HEADER.size:]
+        chunks = pending['chunks']
+        if ptype == PTYPE_PARITY:
+            pending['parity'][index] = payload
+        elif index not in chunks:
+            chunks[index] = payload
+            self._arrived += 1
+
+        # 缺失的包数不超过校验组数时尝试FEC恢复
+        if len(chunks) < total and total - len(chunks) <= len(pending['parity']):
+            self.packets_recovered += recover(chunks, pending['parity'], total, groups)
+        if len(chunks) == total:
+            del self._pending[frame_id]
+            latency = (timestamp_ms() - ts) & 0xFFFFFFFF
+            self.latencies.append(latency)
+            self._report_latencies.append(latency)
+            self._ready[frame_id] = (b''.join(chunks[i] for i in range(total)), now)
+        elif len(self._pending) > self.max_pending:
+            # 丢弃最旧的未完成帧
+            self._pending.pop(next(iter(self._pending)))
+            self.frames_incomplete += 1
+
+    def _check_loss(self, now):
+        """对不完整的帧发送一次NACK：已有更新的帧开始到达，或最后一个包之后已等待nack_delay"""
+        for frame_id, pending in self._pending.items():
+            if pending['nacked']:
+                continue
+            newer_started = frame_id != self._last_frame_id
+            if not newer_started and now - pending['last_arrival'] < self.nack_delay:
+                continue
+            missing = [i for i in range(pending['total']) if i not in pending['chunks']]
+            pending['nacked'] = True
+            self.packets_nacked += len(missing)
+            self.send_control({'type': 'nack', 'frame_id': frame_id, 'packets': missing})
+
+    def _flush(self, now):
+        """按帧ID顺序交付已完成的帧，缺口等待超时后跳过"""
+        while self._ready:
+            if self._next_deliver is None:
+                self._next_deliver = min(self._ready, key=lambda f: _frame_delta(f, self._last_frame_id))
+            entry = self._ready.pop(self._next_deliver, None)
+            if entry is None:
+                oldest = min(self._ready, key=lambda f: _frame_delta(f, self._next_deliver))
+                if now - self._ready[oldest][1] < self.reorder_wait:
+                    return
+                # 放弃缺口中的帧
+                for frame_id in list(self._pending):
+                    if _frame_delta(frame_id, oldest) < 0:
+                        del self._pending[frame_id]
+                        self.frames_incomplete += 1
+                self._next_deliver = oldest
+                continue
+            self._next_deliver = (self._next_deliver + 1) % 65536
+            self._handle_payload(entry[0])
+
+    def _update_jitter(self, ts):
+        """RFC 3550式到达间隔抖动估计（毫秒）"""
+        transit = (timestamp_ms() - ts) & 0xFFFFFFFF
+        if self._last_transit is not None:
+            self._jitter += (abs(transit - self._last_transit) - self._jitter) / 16
+        self._last_transit = transit
+
+    def _send_heartbeat(self, now):
+        """UDP心跳：保持会话存活，并让服务端按会话ID绑定实际的UDP源地址(经过NAT时端口可能改变)"""
+        self._last_heartbeat = now
+        try:
+            self.udp_socket.sendto(udp_register_message(self.session_id), (self.host, self.port + 1))
+        except OSError as e:
+            logger.warning(f"UDP心跳发送失败: {e}")
+
+    def _send_report(self, now):
+        loss = 1 - self._arrived / self._expected if self._expected else 0.0
+        delay = sum(self._report_latencies) / len(self._report_latencies) if self._report_latencies else 0.0
+        self.send_control({
+            'type': 'report',
+            'loss': round(max(0.0, loss), 4),
+            'jitter_ms': round(self._jitter, 2),
+            'delay_ms': round(delay, 2),
+            'fps': round(len(self._report_latencies) / (now - self._last_report), 2),
+        })
+        self._last_report = now
+        self._expected = self._arrived = 0
+        self._report_latencies = []
+
+    def _handle_payload(self, payload):
+        if is_tile_frame(payload):
+            frame, need_keyframe = self.decoder.apply(payload)
+            if need_keyframe:
+                self.request_keyframe()
+            if frame is None:
+                return
+        elif is_video_frame(payload):
+            if self.video_decoder is None:
+                self.video_decoder = VideoDecoder()  # 未安装PyAV时抛出EncoderUnavailable
+            frame, need_keyframe = self.video_decoder.apply(payload)
+            if need_keyframe:
+                self.request_keyframe()
+            if frame is None:
+                return
+        else:
+            frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return
+        self.latest = frame
+        self.frames_received += 1
+        if self.on_frame:
+            self.on_frame(frame)
+
+    def close(self):
+        self.running = False
+        for sock in (self.tcp_socket, self.udp_socket, self.multicast_socket):
+            if sock:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="云窗参考客户端")
+    parser.add_argument('host')
+    parser.add_argument('--port', type=int, default=5002, help="流端口(TCP)，UDP为该端口+1")
+    parser.add_argument('--show', action='store_true', help="用OpenCV窗口显示画面")
+    parser.add_argument('--width', type=int, default=None, help="显示宽度(像素)，服务端按此选择分辨率档位")
+    parser.add_argument('--no-multicast', action='store_true', help="服务端启用组播时也只接收单播")
+    parser.add_argument('--multicast-interface', default=None, help="加入组播组的网卡IP")
+    args = parser.parse_args()
+
+    client = ReferenceClient(args.host, args.port, viewport=args.width, multicast=not args.no_multicast,
+                             multicast_interface=args.multicast_interface)
+    client.connect()
+    last_report = time.time()
+    last_frames = 0
+    try:
+        while client.running:
+            if args.show and client.latest is not None:
+                cv2.imshow("云窗", client.latest)
+                if cv2.waitKey(15) == 27:
+                    break
+            else:
+                time.sleep(0.1)
+            now = time.time()
+            if now - last_report >= 1.0:
+                fps = (client.frames_received - last_frames) / (now - last_report)
+                logger.info(f"FPS: {fps:.1f} | 接收 {client.bytes_received / 1024:.0f} KB | "
+                            f"不完整帧 {client.frames_incomplete} | FEC恢复 {client.packets_recovered} | "
+                            f"NACK {client.packets_nacked} | 关键帧请求 {client.keyframe_requests} | "
+                            f"组播包 {client.multicast_packets}")
+                last_report, last_frames = now, client.frames_received
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import socket
 import time
 import threading
 import logging
+from utils.sessions import SessionRegistry
+from utils.metrics import MetricsRegistry
 
 # 配置日志
 logging.basicConfig(
@@ -28,17 +30,87 @@ class AppConfig:
         self.last_frame = None
         self.frame_count = 0
         self.start_time = time.time()
-        self.connected_clients = 0
         self.local_ip = self.get_local_ip()
         
         # 流相关配置
         self.stream_socket = None
-        self.stream_clients = {}  # 存储客户端连接 {socket: address}
         self.stream_server_running = False
         
+        # 客户端会话(流媒体客户端与网页观看者共用)：客户端每heartbeat_interval秒发送UDP心跳，
+        # 超过session_timeout秒未收到任何消息的会话被移除
+        self.heartbeat_interval = 2.0
+        self.session_timeout = 10.0
+        self.sessions = SessionRegistry(timeout=self.session_timeout)
+        
+        # 运行指标(计数器/直方图)，网页服务器以Prometheus文本格式在/metrics提供，负载测试时抓取
+        self.metrics = MetricsRegistry()
+        self.sessions.register_metrics(self.metrics)
+        
         # 屏幕适配选项
         self.mobile_adapt_mode = "fit"  # fit=适应屏幕, stretch=拉伸填充, aspect=保持宽高比
         self.use_win_api = True  # 是否使用Windows API模式
+        self.capture_max_width = 0  # 捕获后缩小到的最大宽度(0为不缩小)，颜色转换与缩小在预处理阶段一次完成
+        self.capture_max_height = 0  # 捕获后缩小到的最大高度(0为不缩小)
+        self.window_recheck_interval = 2.0  # 窗口缓存强制重新枚举的间隔(秒)
+        
+        # 画面变化检测
+        self.change_detection = True  # 画面未变化时跳过编码
+        self.change_threshold = 8  # 分块像素差阈值(0-255)
+        self.keepalive_interval = 1.0  # 静态画面重发上一帧的间隔(秒)
+        
+        # UDP流模式
+        self.stream_mode = "full"  # full=完整JPEG帧, tile=图块增量, video=H.264/VP8帧间编码(需PyAV，不可用时回退full)
+        self.tile_size = 64  # 图块边长(像素)
+        self.keyframe_interval = 5.0  # 图块模式强制关键帧间隔(秒)
+        
+        # 视频编码模式(stream_mode == "video")
+        self.video_codec = "h264"  # h264(libx264) / vp8(libvpx)
+        self.video_gop = 60  # 关键帧间隔(帧)，客户端加入/请求/丢包时另外按需插入
+        self.video_bitrate = 4_000_000  # 视频码率(bit/s)，自适应码率按质量档位等比例降低
+        self.video_idr_loss = 0.05  # 接收报告丢包率超过该值时插入关键帧
+        
+        # UDP组播(同一局域网大量观看者)，加入失败的客户端仍单播
+        self.multicast_enabled = False
+        self.multicast_group = "239.255.42.99"  # 组播地址(239.0.0.0/8为本地管理范围)
+        self.multicast_port = 0  # 组播端口，0为stream_port + 2
+        self.multicast_ttl = 1  # 1为不跨路由器
+        self.multicast_loopback = True  # 本机也能收到(同机客户端/回环测试)
+        self.multicast_interface = ""  # 发送组播的网卡IP，空为系统默认路由(回环测试用127.0.0.1)
+        
+        # UDP分包与节奏控制
+        self.udp_mtu = 1200  # 单个UDP包大小(含包头)，建议1200-1400
+        self.udp_pacing = True  # 令牌桶平滑发送
+        self.pacing_ratio = 0.8  # 一帧的包在 帧间隔×该比例 内发完
+        self.fec_ratio = 0.0  # FEC冗余比例(校验包数/数据包数)，0为关闭
+        self.retransmit_deadline = 0.2  # NACK重传截止时间(秒)，超时的包不再重发
+        self.retransmit_cache_size = 4096  # 重传缓存的最大包数
+        
+        # 自适应码率(根据客户端接收报告调整)
+        self.abr_enabled = True  # 关闭时UDP固定使用quality/fps
+        self.target_bitrate = 8_000_000  # UDP目标码率上限(bit/s)
+        self.min_quality = 30  # 自适应调整的最低JPEG质量
+        
+        # 多分辨率版本：客户端上报视口宽度，服务端按不小于视口的最小档位缩放编码
+        self.rendition_widths = [480, 960, 1280]  # 宽度档位(像素)，空列表为始终发送原始分辨率
+        
+        # 流媒体服务器实现
+        self.stream_backend = "thread"  # thread=每个TCP客户端一个线程, asyncio=单事件循环(适合大量客户端)
+        self.client_queue_size = 4  # asyncio模式下每个客户端的发送队列长度，满了丢弃最旧的消息
+        self.slow_client_timeout = 5.0  # 写缓冲超过该时间仍排不空的客户端被断开(秒)
+        # 客户端发送背压：发送缓冲中未确认的数据超过上限时按策略丢帧，慢速客户端不拖慢其他客户端
+        self.backpressure_policy = "latest-only"  # latest-only / skip / downgrade(降低该客户端的分辨率档位)，None为不限制
+        self.backpressure_limit = 256 * 1024  # 发送缓冲占用(字节)超过该值视为拥塞
+        self.backpressure_skip = 2  # skip策略下拥塞时每发送一帧跳过的帧数
+        self.http_backend = "flask"  # flask=Flask开发服务器(每个观看者一个线程), asyncio=单事件循环(另提供/ws WebSocket传输)
+        self.ws_max_inflight = 2  # WebSocket观看者最多未确认的帧数，浏览器跟不上时跳过中间帧
+        
+        # 帧编码器: cv2 / turbojpeg(需PyTurboJPEG) / webp / png / auto，不可用时回退到cv2
+        # auto按内容选择：文字/界面用WebP无损(体积约为JPEG的1/3，但编码CPU约为cv2的十几倍，且客户端需支持WebP)，照片用JPEG
+        self.encoder = "cv2"
+        self.encoder_options = {}  # 编码器参数，如 {"lossless": "png"} 或 {"subsampling": "444", "progressive": True}
+        
+        # 捕获/编码流水线
+        self.encode_workers = 2  # 帧总线编码线程数(cv2编码释放GIL，可并行)
         
         # 线程控制
         self.tcp_server_thread = None
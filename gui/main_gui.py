@@ -9,6 +9,10 @@ from PIL import Image, ImageTk
 import qrcode
 import psutil
 import os
+from utils.pipeline import bottleneck
+from utils.preprocess import FramePreprocessor
+from utils.sessions import SessionRegistry
+from utils.metrics import MetricsRegistry
 
 class ScreenShareGUI:
     def __init__(self, root, config, capture_instance, tcp_server, stream_server):
@@ -17,6 +21,10 @@ class ScreenShareGUI:
         self.capture_instance = capture_instance
         self.tcp_server = tcp_server
         self.stream_server = stream_server
+        # 预览：缩小与BGR→RGB转换一次写入复用的缓冲区
+        self.preview_preprocessor = FramePreprocessor(max_width=350, max_height=230, rgb=True,
+                                                      interpolation=cv2.INTER_LINEAR, name='preview')
+        self._preview_source = None  # 上次预览的快照，画面未更新时不重新生成预览图
         
         self.root.title("云窗---Web服务启动器")
         self.root.iconbitmap('E:\\py项目库与工程文件\\TSW增强工具API版1.0\\正式工具代码部分\\移动端访问\分布架构\\app.ico')
@@ -151,7 +159,7 @@ class ScreenShareGUI:
         ttk.Label(port_frame, text="(TCP用于网页访问，Stream用于实时传输)").pack(side="left", padx=(5,0))
         
         # 高级参数
-        ttk.Label(control_frame, text="3. 高级参数(若调整需要重启服务)").grid(row=4, column=0, sticky="w", pady=(5,5))
+        ttk.Label(control_frame, text="3. 高级参数(质量需重启服务，FPS实时生效)").grid(row=4, column=0, sticky="w", pady=(5,5))
         param_frame = ttk.Frame(control_frame)
         param_frame.grid(row=5, column=0, sticky="ew", pady=(0,20))
         
@@ -169,7 +177,7 @@ class ScreenShareGUI:
                  orient="horizontal", length=150).grid(row=1, column=1, padx=(5,0), pady=(8,0))
         self.fps_label = ttk.Label(param_frame, text=str(self.config.fps))
         self.fps_label.grid(row=1, column=2, padx=(5,0), pady=(8,0))
-        self.fps_var.trace("w", lambda *args: self.fps_label.config(text=str(self.fps_var.get())))
+        self.fps_var.trace("w", lambda *args: self.on_fps_change())
         
         # 后台捕获选项
         ttk.Label(control_frame, text="4. 捕获模式:").grid(row=6, column=0, sticky="w", pady=(10,5))
@@ -351,6 +359,13 @@ class ScreenShareGUI:
         elif current in windows:
             self.window_var.set(current)
     
+    def on_fps_change(self):
+        """FPS滑块变化：运行中直接修改配置，帧时钟在下一个节拍生效"""
+        fps = self.fps_var.get()
+        self.fps_label.config(text=str(fps))
+        if self.config.is_running:
+            self.config.fps = fps
+    
     def update_status(self):
         # 获取系统资源使用情况
         cpu_percent = psutil.cpu_percent(interval=None)
@@ -362,9 +377,23 @@ class ScreenShareGUI:
         self.system_resource_label.config(text=resource_text)
         
         if self.config.is_running:
-            # 安全计算FPS
-            elapsed_time = time.time() - self.config.start_time + 0.001
-            fps = self.config.frame_count / elapsed_time
+            # 最近1秒的实际帧率；没有帧总线时退回启动以来的平均帧率
+            frame_bus = getattr(self.stream_server, 'frame_bus', None)
+            if frame_bus is not None:
+                fps = frame_bus.fps_meter.rate
+            else:
+                fps = self.config.frame_count / (time.time() - self.config.start_time + 0.001)
+            
+            # 静态画面跳过编码的比例
+            skip_str = f"{frame_bus.stats['skip_ratio']:.0%}" if frame_bus else "N/A"
+            
+            # 流水线中平均耗时最长的阶段
+            pipeline_stats = getattr(self.stream_server, 'pipeline_stats', None)
+            stage, stage_ms = bottleneck(pipeline_stats)
+            stage_str = f"{stage} {stage_ms:.1f}ms" if stage else "N/A"
+            
+            # 在线客户端会话数(心跳超时的已移除)
+            sessions = self.config.sessions.stats
             
             # 安全获取分辨率
             resolution_str = "N/A"
@@ -377,9 +406,9 @@ class ScreenShareGUI:
             status = (
                 f"● 服务运行中 | TCP端口: {self.config.tcp_port} | Stream端口: {self.config.stream_port} | 目标窗口: '{self.config.window_title}'\n"
                 f"● 本地访问: http://localhost:{self.config.tcp_port} | 手机访问: http://{self.config.local_ip}:{self.config.tcp_port}\n"
-                f"● 流传输: http://{self.config.local_ip}:{self.config.stream_port} | 已连接设备: {len(self.stream_server.clients_tcp) + len(self.stream_server.clients_udp)}\n"
+                f"● 流传输: http://{self.config.local_ip}:{self.config.stream_port} | 已连接设备: {sessions['total']} (客户端 {sessions['stream']} / 网页 {sessions['web']}) | 背压丢帧: {sessions['dropped']}\n"
                 f"● 状态: 分辨率 {resolution_str} "
-                f"| 实时FPS: {fps:.1f} | 捕获模式: {'Windows API' if self.config.use_win_api and self.capture_instance.win_api_available else '常规屏幕'}\n"
+                f"| 实时FPS: {fps:.1f} | 静态跳过: {skip_str} | 瓶颈: {stage_str} | 捕获模式: {'Windows API' if self.config.use_win_api and self.capture_instance.win_api_available else '常规屏幕'}\n"
             )
             self.bottom_status.config(text=f"🟢 服务运行中 | TCP: http://{self.config.local_ip}:{self.config.tcp_port} | Stream: {self.config.stream_port} | 资源: CPU {cpu_percent}% 内存 {memory_percent}%", 
                                     foreground="#a6e3a1")
@@ -401,20 +430,18 @@ class ScreenShareGUI:
         self.root.after(500, self.update_status)
     
     def update_preview(self):
-        if self.config.is_running and self.config.last_frame is not None:
-            frame = self.config.last_frame.copy()
-            h, w = frame.shape[:2]
-            scale = min(350/w, 230/h, 1.0)
-            if scale < 1.0:
-                frame = cv2.resize(frame, (int(w*scale), int(h*scale)))
-            
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(rgb)
-            img_tk = ImageTk.PhotoImage(img)
-            
-            self.preview_label.config(image=img_tk, text="")
-            self.preview_label.image = img_tk
+        frame = self.config.last_frame
+        if self.config.is_running and frame is not None:
+            # 快照只读且不会被复用，直接读取，无需先复制
+            if frame is not self._preview_source:
+                rgb = self.preview_preprocessor.process(frame)
+                img_tk = ImageTk.PhotoImage(Image.fromarray(rgb))
+                self._preview_source = frame
+                
+                self.preview_label.config(image=img_tk, text="")
+                self.preview_label.image = img_tk
         elif not self.config.is_running:
+            self._preview_source = None
             self.preview_label.config(image="", text="服务开启后将显示实时预览\n(当前无活动窗口)", 
                                     background="#181825")
         
@@ -442,9 +469,6 @@ class ScreenShareGUI:
         self.config.fps = self.fps_var.get()
         self.config.use_win_api = self.win_api_var.get() and self.capture_instance.win_api_available
         self.config.is_running = True
-        self.config.connected_clients = 0
-        # 初始化stream_clients字典（兼容旧代码）
-        self.config.stream_clients = {}
         
         # 启动TCP和Stream服务器
         self.config.tcp_server_thread = threading.Thread(target=self.tcp_server.run, daemon=True)
@@ -495,14 +519,17 @@ class ScreenShareGUI:
                 except:
                     pass
         
+        # asyncio版网页服务器需要显式停止
+        if hasattr(self.tcp_server, 'stop'):
+            self.tcp_server.stop()
+        
         # 清理客户端连接
-        if hasattr(self.stream_server, 'clients_tcp'):
-            for client_socket in list(self.stream_server.clients_tcp.keys()):
-                try:
-                    client_socket.close()
-                except:
-                    pass
-            self.stream_server.clients_tcp.clear()
+        for session in self.config.sessions.connections():
+            self.config.sessions.close(session)
+            try:
+                session.connection.close()
+            except:
+                pass
         
         # 等待线程结束
         if hasattr(self.config, 'tcp_server_thread') and self.config.tcp_server_thread and self.config.tcp_server_thread.is_alive():
@@ -571,13 +598,12 @@ class ScreenShareGUI:
                     delattr(self, 'qr_win')
                 
                 # 关闭所有客户端连接
-                if hasattr(self.stream_server, 'clients_tcp'):
-                    for client_socket in list(self.stream_server.clients_tcp.keys()):
-                        try:
-                            client_socket.close()
-                        except:
-                            pass
-                    self.stream_server.clients_tcp.clear()
+                for session in self.config.sessions.connections():
+                    self.config.sessions.close(session)
+                    try:
+                        session.connection.close()
+                    except:
+                        pass
                 
                 # 关闭Stream套接字
                 if hasattr(self.stream_server, 'tcp_socket') and self.stream_server.tcp_socket:
@@ -638,13 +664,12 @@ class ScreenShareGUI:
                 delattr(self, 'qr_win')
             
             # 关闭所有客户端连接
-            if hasattr(self.stream_server, 'clients_tcp'):
-                for client_socket in list(self.stream_server.clients_tcp.keys()):
-                    try:
-                        client_socket.close()
-                    except:
-                        pass
-                self.stream_server.clients_tcp.clear()
+            for session in self.config.sessions.connections():
+                self.config.sessions.close(session)
+                try:
+                    session.connection.close()
+                except:
+                    pass
             
             # 关闭Stream套接字
             if hasattr(self.stream_server, 'tcp_socket') and self.stream_server.tcp_socket:
@@ -686,8 +711,8 @@ class Config:
         self.fps = 15
         self.use_win_api = True
         self.is_running = False
-        self.connected_clients = 0
-        self.stream_clients = {}
+        self.sessions = SessionRegistry()
+        self.metrics = MetricsRegistry()
         self.local_ip = "127.0.0.1"
         self.frame_count = 0
         self.start_time = time.time()
@@ -713,8 +738,6 @@ class DualprotocolStreamServer:
         self.capture_instance = capture_instance
         self.tcp_socket = None
         self.udp_socket = None
-        self.clients_tcp = {}  # TCP客户端
-        self.clients_udp = {}  # UDP客户端
         self.running = True
     
     def start_servers(self):
@@ -10,8 +10,11 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config import AppConfig
 from utils.screen_capture import ScreenCapture
 from utils.window_manager import WindowManager
+from utils.frame_bus import FrameBus
 from servers.tcp_server import TCPServer
+from servers.async_http_server import AsyncHTTPServer
 from servers.stream_server import DualprotocolStreamServer   #双协议流(传输)服务器
+from servers.async_stream_server import AsyncStreamServer   #asyncio版双协议流服务器
 from gui.main_gui import ScreenShareGUI
 import tkinter as tk
 
@@ -60,8 +63,16 @@ if __name__ == "__main__":
     
     # 创建各个模块实例
     capture_instance = ScreenCapture(config)
-    tcp_server = TCPServer(config, capture_instance)
-    stream_server = DualprotocolStreamServer(config, capture_instance)
+    # 共享帧总线：网页MJPEG与UDP流共用一次捕获+编码
+    frame_bus = FrameBus(config, capture_instance)
+    if config.http_backend == "asyncio":
+        tcp_server = AsyncHTTPServer(config, capture_instance, frame_bus)
+    else:
+        tcp_server = TCPServer(config, capture_instance, frame_bus)
+    if config.stream_backend == "asyncio":
+        stream_server = AsyncStreamServer(config, capture_instance, frame_bus)
+    else:
+        stream_server = DualprotocolStreamServer(config, capture_instance, frame_bus)
     
     # 启动GUI
     root = tk.Tk()
@@ -0,0 +1,406 @@
+# servers/async_http_server.py
+"""asyncio版网页服务器
+
+与TCPServer(Flask开发服务器)提供相同的路由和页面(/、/video_feed、/check_connection、/metrics)，
+但每个MJPEG观看者只占一个协程，而不是一个线程：
+一个泵协程从帧总线取最新帧，为当前有人在看的每个分辨率档位各编码一次；
+观看者协程写完一帧、等写缓冲排空(drain)后再取最新的一帧，
+接收慢的客户端只会跳帧，不会积压延迟，也不会拖慢其他客户端。
+
+另提供/ws WebSocket端点：浏览器用createImageBitmap解码到canvas，并逐帧回传确认，
+服务端最多保留ws_max_inflight帧未确认，浏览器跟不上时跳过中间帧，延迟不随时间累积
+"""
+import json
+import time
+import asyncio
+import logging
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from utils.frame_bus import FrameBus
+from utils.pipeline import StageStats
+from utils.encoders import image_mime_type
+from utils.sessions import KIND_WEB
+from utils.backpressure import flow_control_from_config, send_backlog
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .web_page import render_index, mjpeg_part, MJPEG_CONTENT_TYPE
+from .websocket import (handshake_response, encode_frame, encode_video_frame, read_message,
+                        OP_TEXT, OP_CLOSE, OP_PING, OP_PONG)
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class _WebSocketViewer:
+    """一个WebSocket观看者的档位与未确认帧"""
+
+    def __init__(self, width):
+        self.width = width
+        self.inflight = deque()  # 已发送未确认的帧序号
+        self.acked = asyncio.Event()
+        self.closed = False
+
+
+class AsyncHTTPServer:
+    """单事件循环的HTTP/MJPEG服务器，接口与TCPServer相同(run)，另提供stop()"""
+
+    def __init__(self, config, capture_instance, frame_bus=None):
+        self.config = config
+        self.capture_instance = capture_instance
+        self.frame_bus = frame_bus or FrameBus(config, capture_instance)
+        self.slow_client_timeout = getattr(config, 'slow_client_timeout', 5.0)
+        self.write_buffer_limit = 256 * 1024  # 写缓冲超过该值时drain()开始等待
+        self.header_timeout = 10.0  # 读取请求头的超时(秒)
+        self.running = False
+        self.viewers = 0       # 当前MJPEG观看者数
+        self.slow_clients = 0  # 因接收过慢被断开的观看者数
+        self.ws_max_inflight = getattr(config, 'ws_max_inflight', 2)
+        self.ws_latency = StageStats('websocket')  # 捕获 → 浏览器显示完成(按确认计算)
+        self.ws_decode = StageStats('browser_decode')  # 浏览器上报的解码绘制耗时
+        self.ws_skipped = 0  # 因浏览器未确认而跳过的帧数
+        self.loop = None
+        self._stopped = None
+        self._frame_ready = None
+        self._frame_seq = 0
+        self._parts = {}            # 最新一帧各档位的发送数据 {档位宽度: (MJPEG分段, WebSocket消息, 帧序号)}
+        self._widths = Counter()    # 在看的观看者按档位计数
+        self._executor = None
+
+    def run(self):
+        """运行HTTP服务器，阻塞到stop()"""
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            logger.error(f"HTTP服务器(asyncio)启动失败: {e}")
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._frame_ready = asyncio.Condition()
+        self._frame_seq = 0
+        self._parts = {}
+        # 取帧与缩放编码是阻塞操作，放到固定大小的线程池
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="async-http")
+        self.running = True
+
+        server = await asyncio.start_server(self._handle_connection, host='0.0.0.0',
+                                            port=self.config.tcp_port, reuse_address=True)
+        logger.info(f"HTTP服务器(asyncio)启动在端口: {self.config.tcp_port}")
+        pump = asyncio.create_task(self._frame_pump())
+        try:
+            await self._stopped.wait()
+        finally:
+            self.running = False
+            server.close()
+            async with self._frame_ready:
+                self._frame_ready.notify_all()  # 唤醒等待新帧的观看者
+            pump.cancel()
+            await asyncio.gather(pump, return_exceptions=True)
+            self._executor.shutdown(wait=False)
+            logger.info("HTTP服务器(asyncio)已停止")
+
+    async def _frame_pump(self):
+        """有观看者时订阅帧总线，每帧为在看的档位各编码一次并通知观看者"""
+        subscription = None
+        try:
+            while self.running:
+                if not self._widths:
+                    if subscription is not None:
+                        subscription.close()  # 没有观看者时不占用帧总线
+                        subscription = None
+                    async with self._frame_ready:
+                        await self._frame_ready.wait_for(lambda: self._widths or not self.running)
+                    continue
+                if subscription is None:
+                    subscription = self.frame_bus.subscribe()
+
+                encoded = await self.loop.run_in_executor(self._executor, subscription.get, 0.5)
+                if encoded is None:
+                    continue
+                parts = await self.loop.run_in_executor(
+                    self._executor, self._render_parts, encoded, list(self._widths))
+                async with self._frame_ready:
+                    self._parts = parts
+                    self._frame_seq += 1
+                    self._frame_ready.notify_all()
+        finally:
+            if subscription is not None:
+                subscription.close()
+
+    def _render_parts(self, encoded, widths):
+        renditions = self.frame_bus.renditions
+        parts = {}
+        for width in widths:
+            data = renditions.get(encoded, width)
+            parts[width] = (mjpeg_part(data, image_mime_type(data)), encode_video_frame(encoded.seq, encoded.timestamp, data), encoded.seq)
+        return parts
+
+    async def _add_viewer(self, width):
+        async with self._frame_ready:
+            self._widths[width] += 1
+            self._frame_ready.notify_all()  # 唤醒等待观看者的泵协程
+
+    def _remove_viewer(self, width):
+        self._widths[width] -= 1
+        if self._widths[width] <= 0:
+            del self._widths[width]
+
+    async def _move_viewer(self, old, new):
+        """观看者改用另一个分辨率档位(背压降档/恢复)"""
+        self._remove_viewer(old)
+        await self._add_viewer(new)
+
+    async def _handle_connection(self, reader, writer):
+        """解析一个HTTP请求并分发到对应路由，响应后关闭连接"""
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=self.header_timeout)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+            parts = request_line.split(' ')
+            if len(parts) != 3:
+                await self._respond(writer, 400)
+                return
+            method, target, _ = parts
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length') or 0)
+            if length:
+                await reader.readexactly(min(length, 65536))  # 丢弃请求体，路由都不需要
+            url = urlsplit(target)
+            await self._route(reader, writer, method, url.path, parse_qs(url.query), headers)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            if self.running:
+                logger.error(f"HTTP请求处理失败: {e}")
+        finally:
+            writer.close()
+
+    async def _route(self, reader, writer, method, path, query, headers):
+        if path == '/':
+            if method != 'GET':
+                await self._respond(writer, 405)
+                return
+            html = render_index(self.config, self.capture_instance, '/video_feed', 'asyncio',
+                                websocket_enabled=True)
+            await self._respond(writer, 200, 'text/html; charset=utf-8', html.encode('utf-8'))
+        elif path == '/video_feed':
+            if method != 'GET':
+                await self._respond(writer, 405)
+                return
+            await self._stream(writer, self._rung(query))
+        elif path == '/ws':
+            if method != 'GET':
+                await self._respond(writer, 405)
+                return
+            await self._websocket(reader, writer, headers, query)
+        elif path == '/check_connection':
+            if method != 'POST':
+                await self._respond(writer, 405)
+                return
+            body = json.dumps({"status": "connected", "clients": len(self.config.sessions)})
+            await self._respond(writer, 200, 'application/json', body.encode('utf-8'))
+        elif path == '/metrics':
+            if method != 'GET':
+                await self._respond(writer, 405)
+                return
+            await self._respond(writer, 200, METRICS_CONTENT_TYPE, self.config.metrics.render().encode('utf-8'))
+        else:
+            await self._respond(writer, 404)
+
+    def _rung(self, query):
+        """请求参数w(视口物理像素宽度)对应的分辨率档位"""
+        try:
+            viewport = int(query.get('w', [''])[0])
+        except ValueError:
+            viewport = None
+        return self.frame_bus.renditions.rung_for_viewport(viewport)
+
+    async def _respond(self, writer, status, content_type='text/plain; charset=utf-8', body=None):
+        if body is None:
+            body = _REASONS[status].encode()
+        writer.write(self._status_line(status) + (
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    @staticmethod
+    def _status_line(status):
+        return f"HTTP/1.1 {status} {_REASONS[status]}\r\n".encode('latin-1')
+
+    async def _stream(self, writer, width):
+        """向一个观看者持续发送最新帧；写缓冲超时排不空即判定为慢速客户端并断开
+
+        每帧写入前按背压策略检查写缓冲与内核发送缓冲的积压：积压时丢帧(或降低档位)，
+        drain()只保证用户态缓冲不超限，内核缓冲中排队的旧帧同样会增加延迟
+        """
+        viewport = width
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_limit)
+        writer.write(self._status_line(200) + (
+            f"Content-Type: {MJPEG_CONTENT_TYPE}\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n").encode('latin-1'))
+        await self._add_viewer(width)
+        self.viewers += 1
+        session = self.config.sessions.open(KIND_WEB, writer.get_extra_info('peername'), expires=False)
+        flow = session.flow = flow_control_from_config(self.config)
+        sock = writer.get_extra_info('socket')
+        seq = 0
+        try:
+            while self.running and self.config.is_running:
+                seq, parts = await self._next_part(width, seq)
+                if parts is None:
+                    continue
+                if flow is not None:
+                    backlog = writer.transport.get_write_buffer_size() + (send_backlog(sock) or 0)
+                    admitted = flow.admit(backlog)
+                    rung = self.frame_bus.renditions.lower_rung(viewport, flow.level)
+                    if rung != width:
+                        await self._move_viewer(width, rung)  # 下一帧起按新档位编码
+                        width = rung
+                    if not admitted:
+                        continue
+                writer.write(parts[0])
+                try:
+                    await asyncio.wait_for(writer.drain(), timeout=self.slow_client_timeout)
+                except asyncio.TimeoutError:
+                    self.slow_clients += 1
+                    logger.warning(f"MJPEG观看者 {writer.get_extra_info('peername')} 接收过慢，已断开")
+                    break
+                session.frames.mark()
+        finally:
+            self.config.sessions.close(session)
+            self.viewers -= 1
+            self._remove_viewer(width)
+
+    async def _websocket(self, reader, writer, headers, query):
+        """WebSocket观看者：逐帧推送二进制消息，未确认的帧达到上限时跳过新帧"""
+        key = headers.get('sec-websocket-key')
+        if headers.get('upgrade', '').lower() != 'websocket' or not key:
+            await self._respond(writer, 400)
+            return
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_limit)
+        writer.write(handshake_response(key))
+        viewer = _WebSocketViewer(self._rung(query))
+        await self._add_viewer(viewer.width)
+        self.viewers += 1
+        session = self.config.sessions.open(KIND_WEB, writer.get_extra_info('peername'), expires=False)
+        receiver = asyncio.create_task(self._websocket_receive(reader, writer, viewer))
+        seq = 0
+        try:
+            while self.running and self.config.is_running and not viewer.closed:
+                if len(viewer.inflight) >= self.ws_max_inflight:
+                    # 浏览器还没显示完已发送的帧：等待确认，期间发布的帧直接跳过
+                    viewer.acked.clear()
+                    try:
+                        await asyncio.wait_for(viewer.acked.wait(), timeout=self.slow_client_timeout)
+                    except asyncio.TimeoutError:
+                        self.slow_clients += 1
+                        logger.warning(f"WebSocket观看者 {writer.get_extra_info('peername')} 长时间未确认，已断开")
+                        break
+                    continue
+                last_seq = seq
+                seq, parts = await self._next_part(viewer.width, seq)
+                if parts is None or viewer.closed:
+                    continue
+                if last_seq:
+                    self.ws_skipped += seq - last_seq - 1
+                writer.write(parts[1])
+                viewer.inflight.append(parts[2])
+                try:
+                    await asyncio.wait_for(writer.drain(), timeout=self.slow_client_timeout)
+                except asyncio.TimeoutError:
+                    self.slow_clients += 1
+                    logger.warning(f"WebSocket观看者 {writer.get_extra_info('peername')} 接收过慢，已断开")
+                    break
+                session.frames.mark()
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+            self.config.sessions.close(session)
+            self.viewers -= 1
+            self._remove_viewer(viewer.width)
+            if not writer.is_closing():
+                writer.write(encode_frame(OP_CLOSE, b''))
+
+    async def _websocket_receive(self, reader, writer, viewer):
+        """读取浏览器发来的确认与视口消息，直到连接关闭"""
+        try:
+            while True:
+                opcode, payload = await read_message(reader)
+                if opcode == OP_CLOSE:
+                    break
+                if opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+                    continue
+                if opcode != OP_TEXT:
+                    continue
+                try:
+                    message = json.loads(payload)
+                except ValueError:
+                    continue
+                await self._handle_websocket_message(viewer, message)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            viewer.closed = True
+            viewer.acked.set()  # 唤醒等待确认的发送循环
+
+    async def _handle_websocket_message(self, viewer, message):
+        kind = message.get('type')
+        if kind == 'ack' and isinstance(message.get('seq'), int):
+            seq = message['seq']
+            # 确认是累积的：浏览器本地丢弃的帧随后一帧的确认一起确认
+            while viewer.inflight and viewer.inflight[0] <= seq:
+                viewer.inflight.popleft()
+            viewer.acked.set()
+            timestamp = message.get('t')
+            if isinstance(timestamp, (int, float)) and timestamp > 0:
+                self.ws_latency.record(max(0.0, time.monotonic() - timestamp / 1000))
+            decode_ms = message.get('decode_ms')
+            if isinstance(decode_ms, (int, float)):
+                self.ws_decode.record(decode_ms / 1000)
+        elif kind == 'viewport' and isinstance(message.get('width'), (int, float)):
+            width = self.frame_bus.renditions.rung_for_viewport(message['width'])
+            if width != viewer.width:
+                self._remove_viewer(viewer.width)
+                viewer.width = width
+                await self._add_viewer(width)
+
+    @property
+    def websocket_stats(self):
+        """WebSocket观看者的端到端延迟、浏览器解码耗时与跳帧数"""
+        return {
+            'latency': self.ws_latency.stats,
+            'decode': self.ws_decode.stats,
+            'skipped': self.ws_skipped,
+        }
+
+    async def _next_part(self, width, seq):
+        """等待比seq更新、且包含该档位的一帧；超时返回(seq, None)以便检查运行状态"""
+        def ready():
+            return not self.running or (self._frame_seq != seq and width in self._parts)
+
+        async with self._frame_ready:
+            try:
+                await asyncio.wait_for(self._frame_ready.wait_for(ready), timeout=1.0)
+            except asyncio.TimeoutError:
+                return seq, None
+            if not self.running:
+                return seq, None
+            return self._frame_seq, self._parts[width]
+
+    def stop(self):
+        """停止服务器（可从任意线程调用）"""
+        self.running = False
+        if self.loop is not None and self._stopped is not None:
+            try:
+                self.loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass  # 事件循环已结束
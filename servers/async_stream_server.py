@@ -0,0 +1,327 @@
+# servers/async_stream_server.py
+"""asyncio版双协议流媒体服务器
+
+协议与DualprotocolStreamServer完全相同（握手、控制消息、UDP分包/FEC/重传、自适应码率、多分辨率），
+但TCP接入、UDP注册和发送都在单个事件循环中完成：
+每个TCP客户端只占一个协程和一个有界发送队列（满了丢弃最旧的每帧消息，控制消息不丢弃），
+写缓冲长时间排不空的慢速客户端会被断开，不会拖慢其他客户端。
+线程数固定（事件循环 + 帧总线 + 少量编码线程），不随客户端数增长
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .stream_server import DualprotocolStreamServer
+from .control_protocol import MessageReader, encode_message, parse_udp_register
+from .udp_batch import BatchSender
+from utils.sessions import KIND_STREAM
+from utils.backpressure import flow_control_from_config, send_backlog
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDropOldestQueue:
+    """事件循环内使用的有界队列，满了丢弃最旧的项
+
+    put_priority放入的项(一次性的控制消息)不计入容量、不会被丢弃，且先于普通项取出
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = deque()
+        self._priority = deque()
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        """放入一项，返回被丢弃的旧项（没有则为None）"""
+        dropped = None
+        if len(self._items) >= self.maxsize:
+            dropped = self._items.popleft()
+            self.dropped += 1
+        self._items.append(item)
+        self._event.set()
+        return dropped
+
+    def put_priority(self, item):
+        """放入不可丢弃的一项"""
+        self._priority.append(item)
+        self._event.set()
+
+    async def get(self):
+        while not self._items and not self._priority:
+            self._event.clear()
+            await self._event.wait()
+        if self._priority:
+            return self._priority.popleft()
+        return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items) + len(self._priority)
+
+
+class AsyncClient:
+    """一个TCP客户端：写端、有界发送队列与发送协程
+
+    作为会话的connection代替socket，close()可从任意线程调用
+    """
+
+    def __init__(self, address, writer, loop, queue_size):
+        self.address = address
+        self.writer = writer
+        self.queue = AsyncDropOldestQueue(queue_size)
+        self.task = None
+        self._loop = loop
+
+    def send(self, data):
+        """非阻塞发送可丢弃的每帧消息：放入发送队列，满了丢弃最旧的（仅在事件循环内调用）"""
+        self.queue.put_nowait(data)
+
+    def send_control(self, data):
+        """非阻塞发送一次性的控制消息：不会被每帧消息挤掉（仅在事件循环内调用）"""
+        self.queue.put_priority(data)
+
+    @property
+    def backlog(self):
+        """已写出但对端尚未确认的字节数：事件循环写缓冲 + 内核发送缓冲"""
+        transport = self.writer.transport
+        return transport.get_write_buffer_size() + (send_backlog(transport.get_extra_info('socket')) or 0)
+
+    def close(self):
+        try:
+            self._loop.call_soon_threadsafe(self._close)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    def _close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class _UdpRegistrationProtocol(asyncio.DatagramProtocol):
+    """接收UDP客户端注册/心跳"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        session_id = parse_udp_register(data)
+        if session_id is not None:
+            self.server.handle_udp_client(addr, session_id)
+
+    def error_received(self, exc):
+        if self.server.running:
+            logger.error(f"UDP接收错误: {exc}")
+
+
+class AsyncStreamServer(DualprotocolStreamServer):
+    """单事件循环的双协议流媒体服务器"""
+
+    def __init__(self, config, capture_instance, frame_bus=None):
+        super().__init__(config, capture_instance, frame_bus)
+        self.client_queue_size = getattr(config, 'client_queue_size', 4)
+        self.slow_client_timeout = getattr(config, 'slow_client_timeout', 5.0)
+        self.write_buffer_limit = 64 * 1024  # 写缓冲超过该值时drain()开始等待
+        self.slow_clients = 0  # 因接收过慢被断开的客户端数
+        self.loop = None
+        self.udp_queue = None
+        self._stopped = None
+        # 取帧、编码等阻塞操作放到固定大小的线程池，不阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="async-stream")
+
+    def start_servers(self):
+        """启动服务器，阻塞到停止"""
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.running = True
+        self.udp_queue = AsyncDropOldestQueue(3)
+        self.send_stats.queue = self.udp_queue
+
+        server = await asyncio.start_server(self._handle_client, host='', port=self.config.stream_port,
+                                            reuse_address=True)
+        logger.info(f"TCP流媒体服务器(asyncio)启动在端口: {self.config.stream_port}")
+        udp_port = self.config.stream_port + 1  # UDP使用相邻端口
+        transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _UdpRegistrationProtocol(self), local_addr=('0.0.0.0', udp_port))
+        self.udp_socket = transport  # DatagramTransport.sendto与socket接口一致，重传等逻辑直接复用
+        # 批量发送直接使用底层套接字；非阻塞套接字缓冲区满时不等待，丢弃剩余数据报
+        self.udp_sender = BatchSender(transport, fileno=transport.get_extra_info('socket').fileno(),
+                                      wait_writable=0)
+        logger.info(f"UDP流媒体服务器(asyncio)启动在端口: {udp_port}，批量发送: {self.udp_sender.mode}")
+        self.setup_multicast(transport.get_extra_info('socket'))
+
+        tasks = [asyncio.create_task(self._frame_loop()), asyncio.create_task(self._udp_send_loop()),
+                 asyncio.create_task(self._expiry_loop())]
+        try:
+            await self._stopped.wait()
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            server.close()
+            for session in self.sessions.sessions(KIND_STREAM):
+                self.remove_session(session)
+                if session.connection is not None:
+                    session.connection._close()
+            transport.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info("asyncio流媒体服务器已停止")
+
+    async def _handle_client(self, reader, writer):
+        """处理TCP客户端：握手后读取控制消息，发送由独立协程完成"""
+        address = writer.get_extra_info('peername')
+        logger.info(f"开始处理TCP客户端 {address}")
+        try:
+            # 握手协议
+            writer.write(b"STREAM_OK")
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(1024), timeout=30)
+            if not response.startswith(b"READY"):
+                writer.close()
+                return
+        except Exception as e:
+            logger.error(f"TCP客户端 {address} 连接初始化失败: {e}")
+            writer.close()
+            return
+
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_limit)
+        client = AsyncClient(address, writer, self.loop, self.client_queue_size)
+        client.task = asyncio.create_task(self._client_writer(client))
+        session = self.sessions.open(KIND_STREAM, address, client)
+        session.flow = flow_control_from_config(self.config)
+
+        # 读取客户端控制消息，直到连接断开（READY之后可能已粘连了消息）
+        message_reader = MessageReader()
+        data = response[len(b"READY"):]
+        try:
+            while self.running:
+                for message in message_reader.feed(data):
+                    self.sessions.touch(session)
+                    self.handle_control_message(session, message)
+                data = await reader.read(4096)
+                if not data:
+                    break  # 客户端已断开
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            if self.running:
+                logger.error(f"TCP客户端 {address} 控制消息处理失败: {e}")
+        finally:
+            self.remove_session(session)
+            client._close()
+
+    async def _client_writer(self, client):
+        """逐条发送客户端队列中的消息；写缓冲超时排不空即判定为慢速客户端并断开"""
+        try:
+            while True:
+                data = await client.queue.get()
+                client.writer.write(data)
+                try:
+                    await asyncio.wait_for(client.writer.drain(), timeout=self.slow_client_timeout)
+                except asyncio.TimeoutError:
+                    self.slow_clients += 1
+                    logger.warning(f"TCP客户端 {client.address} 接收过慢，已断开")
+                    break
+        except (ConnectionError, OSError):
+            self.send_errors.inc(transport='tcp')
+        finally:
+            if not client.writer.is_closing():
+                client.writer.close()
+
+    async def _frame_loop(self):
+        """准备阶段：从帧总线取帧，编码在线程池中进行，结果分发到各客户端队列"""
+        subscription = self.frame_bus.subscribe()
+        try:
+            while self.running and self.config.is_running:
+                encoded = await self.loop.run_in_executor(self._executor, subscription.get, 0.5)
+                if encoded is None:
+                    continue
+                self.record_frame_age(encoded)
+
+                start = time.perf_counter()
+                groups, delta = await self.loop.run_in_executor(
+                    self._executor, self.prepare_udp_frame, encoded, time.monotonic())
+                self.prepare_stats.record(time.perf_counter() - start)
+
+                # TCP控制信息：放入每个客户端自己的队列，慢速客户端只丢自己的旧消息
+                data = encode_message(self.build_tcp_message(encoded.data, encoded.repeat))
+                for session in self.sessions.connections():
+                    if session.flow is None or session.flow.admit(session.connection.backlog):
+                        session.connection.send(data)
+                if groups:
+                    dropped = self.udp_queue.put_nowait((groups, delta))
+                    if dropped is not None and dropped[1]:
+                        self.request_keyframe()  # 丢弃了增量帧，下一帧改发关键帧
+        finally:
+            subscription.close()
+            self._stopped.set()
+
+    async def _udp_send_loop(self):
+        """发送阶段：UDP分包后按令牌桶节奏异步发送"""
+        while True:
+            groups, _ = await self.udp_queue.get()
+            start = time.perf_counter()
+            try:
+                await self._send_udp_groups(groups)
+            except Exception as e:
+                # 单帧发送失败不能让发送协程退出，否则之后所有UDP客户端都收不到画面
+                logger.error(f"UDP发送阶段失败: {e}")
+                continue
+            self.send_stats.record(time.perf_counter() - start)
+
+    async def _send_udp_groups(self, groups):
+        """分包一帧的各个版本并发送给对应的客户端"""
+        batches = await self.loop.run_in_executor(self._executor, self.packetize_renditions, groups)
+        for rendition, batch, clients in batches:
+            for addr in clients:
+                self._client_rendition[addr] = rendition
+            first = 0
+            while first < batch.count:
+                stop, nbytes = self.next_send_chunk(batch, first, len(clients))
+                if self.config.udp_pacing:
+                    delay = self.pacer.reserve(nbytes)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                # 等待期间可能有客户端离开
+                addresses = [addr for addr in clients
+                             if addr == self.multicast_address or self.sessions.udp_active(addr)]
+                for addr, error in self.udp_sender.send(batch, first, stop, addresses).items():
+                    self.send_errors.inc(transport='udp')
+                    logger.error(f"UDP发送到 {addr} 失败: {error}")
+                    self.remove_udp_client(addr)
+                first = stop
+            self.mark_frames_sent([addr for addr in clients
+                                   if addr == self.multicast_address or self.sessions.udp_active(addr)])
+
+    async def _expiry_loop(self):
+        """睡到最早可能到期的会话，移除心跳超时的客户端"""
+        while True:
+            delay = self.sessions.next_expiry()
+            await asyncio.sleep(self.sessions.timeout if delay is None else min(delay, self.sessions.timeout) + 0.01)
+            self.expire_sessions()
+
+    def send_control(self, session, message):
+        """向单个客户端发送控制消息（会话ID、组播、关键帧/码率响应不可丢弃，仅在事件循环内调用）"""
+        session.connection.send_control(encode_message(message))
+
+    def close_session(self, session):
+        """移除会话并关闭其TCP连接（可从任意线程调用）"""
+        self.remove_session(session)
+        if session.connection is not None:
+            session.connection.close()
+
+    def stop(self):
+        """停止服务器（可从任意线程调用）"""
+        self.running = False
+        self.frame_bus.clock.stop()
+        if self.loop is not None and self._stopped is not None:
+            try:
+                self.loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass  # 事件循环已结束
@@ -0,0 +1,120 @@
+# servers/control_protocol.py
+"""TCP控制通道消息格式
+
+握手(STREAM_OK / READY)完成后，双向消息统一为 长度(4字节大端) + UTF-8 JSON：
+  客户端 → 服务器
+    {"type": "hello", "udp_port": 50000}                 声明本端UDP端口
+    {"type": "nack", "frame_id": 12, "packets": [3, 4]}  请求重传丢失的包
+    {"type": "keyframe"}                                 请求关键帧
+    {"type": "report", "loss": 0.01, "jitter_ms": 2.5, "delay_ms": 40.0}  接收报告
+    {"type": "viewport", "width": 390}                   显示宽度，服务端据此选择分辨率档位
+    {"type": "multicast", "joined": true}                已加入组播组(false为无法接收组播，改回单播)
+  服务器 → 客户端
+    {"type": "session", "id": "9f2c...", "heartbeat": 2.0}  收到hello后下发会话ID与心跳间隔
+    {"type": "multicast", "group": "239.255.42.99", "port": 5004}  启用组播时，收到hello后下发
+    {"type": "frame_info", "frame_size": ..., "timestamp": ..., "frame_count": ...}
+    {"type": "keepalive"}
+
+UDP注册/心跳：客户端从其UDP套接字向服务器UDP端口发送 UDP_CLIENT_REGISTER[:会话ID]，
+连接后立即发送一次，收到会话ID后每heartbeat秒发送一次。服务器只在收到客户端消息(任意控制消息
+或UDP心跳)时刷新会话，超时未收到的会话被移除；带会话ID的心跳同时把会话绑定到实际的UDP源地址
+"""
+import json
+import struct
+
+MESSAGE_HEADER = struct.Struct('!I')
+MAX_MESSAGE_SIZE = 64 * 1024
+UDP_REGISTER = b"UDP_CLIENT_REGISTER"
+
+
+def encode_message(message):
+    body = json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return MESSAGE_HEADER.pack(len(body)) + body
+
+
+def send_message(sock, message):
+    sock.sendall(encode_message(message))
+
+
+def udp_register_message(session_id=None):
+    """UDP注册/心跳数据报"""
+    return UDP_REGISTER + b":" + session_id.encode('ascii') if session_id else UDP_REGISTER
+
+
+def parse_udp_register(data):
+    """解析UDP注册/心跳数据报，返回会话ID(没有则为空字符串)；不是注册数据报时返回None"""
+    if not data.startswith(UDP_REGISTER):
+        return None
+    rest = data[len(UDP_REGISTER):]
+    if not rest:
+        return ""
+    if rest[:1] != b":":
+        return None
+    return rest[1:65].decode('ascii', 'ignore')
+
+
+class NonBlockingWriter:
+    """控制连接的非阻塞写端（同一连接的非阻塞副本，读取仍在原socket上阻塞进行）
+
+    写缓冲已满时保留没写出的部分，下次写入前先补发，消息边界不会被打乱
+    """
+
+    def __init__(self, sock):
+        self._sock = sock.dup()
+        self._sock.setblocking(False)
+        self._pending = b''
+
+    @property
+    def pending(self):
+        """尚未写出的字节数"""
+        return len(self._pending)
+
+    def flush(self):
+        """尽量写出剩余部分，返回是否已全部写出"""
+        while self._pending:
+            try:
+                sent = self._sock.send(self._pending)
+            except BlockingIOError:
+                return False
+            self._pending = self._pending[sent:]
+        return True
+
+    def send(self, data):
+        """写入一段数据，写不完的部分排队（不丢弃，用于控制消息）"""
+        self._pending += data
+        self.flush()
+
+    def try_send(self, data):
+        """之前的数据已写完时写入data并返回True，否则不写入并返回False(用于可丢弃的帧信息)"""
+        if not self.flush():
+            return False
+        self.send(data)
+        return True
+
+    def close(self):
+        self._sock.close()
+
+
+class MessageReader:
+    """从TCP字节流中切分出完整的控制消息"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """追加收到的数据，返回已完整的消息列表"""
+        self._buffer += data
+        messages = []
+        while len(self._buffer) >= MESSAGE_HEADER.size:
+            (length,) = MESSAGE_HEADER.unpack_from(self._buffer, 0)
+            if length > MAX_MESSAGE_SIZE:
+                raise ValueError(f"控制消息过大: {length} 字节")
+            end = MESSAGE_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            body = bytes(self._buffer[MESSAGE_HEADER.size:end])
+            del self._buffer[:end]
+            message = json.loads(body.decode('utf-8'))
+            if isinstance(message, dict) and 'type' in message:
+                messages.append(message)
+        return messages
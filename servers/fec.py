@@ -0,0 +1,66 @@
+# servers/fec.py
+"""XOR奇偶校验前向纠错(FEC)
+
+一帧的n个数据包按 index % group_count 交错分成group_count组，每组生成一个校验包。
+校验包内容为组内各包 [长度(2字节) + 数据(补零到组内最大长度)] 的逐字节异或，
+因此每组可在无需重传的情况下恢复任意1个丢失的包；交错分组使连续的突发丢包
+落在不同组中，最多可恢复group_count个丢包
+"""
+import struct
+import numpy as np
+
+LENGTH_PREFIX = struct.Struct('<H')
+
+
+def parity_group_count(packet_count, ratio):
+    """按冗余比例计算校验组数（0表示不启用FEC）"""
+    if ratio <= 0:
+        return 0
+    return min(packet_count, max(1, round(packet_count * ratio)))
+
+
+def _stack(payloads):
+    """把 [长度 + 数据] 补零后堆叠成二维数组"""
+    width = LENGTH_PREFIX.size + max(len(p) for p in payloads)
+    rows = np.zeros((len(payloads), width), dtype=np.uint8)
+    for row, payload in zip(rows, payloads):
+        LENGTH_PREFIX.pack_into(row, 0, len(payload))
+        row[LENGTH_PREFIX.size:LENGTH_PREFIX.size + len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+    return rows
+
+
+def encode_parity(payloads, group_count):
+    """为数据包负载生成group_count个校验包负载"""
+    parity = []
+    for group in range(group_count):
+        rows = _stack(payloads[group::group_count])
+        parity.append(np.bitwise_xor.reduce(rows, axis=0).tobytes())
+    return parity
+
+
+def recover(chunks, parity, count, group_count):
+    """尝试用校验包补齐丢失的数据包
+
+    chunks: {索引: 负载}，会被原地补齐；parity: {组号: 校验负载}
+    返回恢复的包数
+    """
+    if not group_count:
+        return 0
+    recovered = 0
+    missing = [i for i in range(count) if i not in chunks]
+    for index in missing:
+        group = index % group_count
+        if group not in parity:
+            continue
+        members = range(group, count, group_count)
+        others = [chunks[i] for i in members if i != index and i in chunks]
+        if len(others) != len(members) - 1:
+            continue  # 同组丢了不止一个包，无法恢复
+        block = np.frombuffer(parity[group], dtype=np.uint8).copy()
+        if others:
+            rows = _stack(others)
+            block[:rows.shape[1]] ^= np.bitwise_xor.reduce(rows, axis=0)
+        length = LENGTH_PREFIX.unpack_from(block, 0)[0]
+        chunks[index] = block[LENGTH_PREFIX.size:LENGTH_PREFIX.size + length].tobytes()
+        recovered += 1
+    return recovered
@@ -0,0 +1,48 @@
+# servers/multicast.py
+"""UDP组播投递
+
+同一局域网的大量观看者(教室投屏等)时，服务端每个包只向组播组发送一次，
+发送开销和上行带宽不再随观看人数线性增长。流程：
+  1. 客户端TCP握手并发送hello后，服务端下发 {"type": "multicast", "group": ..., "port": ...}
+  2. 客户端加入组播组，成功后回复 {"type": "multicast", "joined": true}，服务端不再单播给它
+  3. 客户端加入失败，或加入后长时间收不到组播包(交换机/AP不转发组播)时回复 joined=false，
+     服务端恢复单播
+NACK重传仍走单播。Linux下可用回环接口测试(interface="127.0.0.1")
+"""
+import socket
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def multicast_address(config):
+    """配置的组播地址 (组, 端口)，未启用组播时返回None"""
+    if not getattr(config, 'multicast_enabled', False):
+        return None
+    port = getattr(config, 'multicast_port', 0) or config.stream_port + 2
+    return config.multicast_group, port
+
+
+def configure_sender(sock, ttl=1, loopback=True, interface=None):
+    """设置发送端套接字的组播TTL、本机回环与出口网卡"""
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if loopback else 0)
+    if interface:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+
+def open_receiver(group, port, interface=None):
+    """创建加入组播组的接收套接字；同一台机器上的多个客户端可共用端口"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((group, port))  # 只接收该组的包(Linux/macOS)
+        except OSError:
+            sock.bind(('', port))  # Windows不能绑定组播地址
+        membership = socket.inet_aton(group) + socket.inet_aton(interface or '0.0.0.0')
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    except OSError:
+        sock.close()
+        raise
+    return sock
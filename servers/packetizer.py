@@ -0,0 +1,174 @@
+# servers/packetizer.py
+"""UDP分包与发送节奏控制
+
+每个UDP包都带有版本化包头：
+    version(B) ptype(B) flags(H) frame_id(I) index(H) count(H) timestamp_ms(I)
+包大小按MTU配置（默认1200字节），避免IP分片：
+任何一个分片丢失都会让整个大数据报作废。数据包的flags为该帧的FEC校验组数。
+packetize_batch()不拼接包头和负载：包头用pack_into写入复用的缓冲区，负载直接引用帧数据，
+由udp_batch.BatchSender以分散/聚集方式批量发送
+"""
+import time
+import struct
+import numpy as np
+from utils.preprocess import BufferPool
+from .fec import parity_group_count, encode_parity
+
+PROTOCOL_VERSION = 2
+PACKET_HEADER = struct.Struct('<BBHIHHI')
+
+# 包类型
+PTYPE_DATA = 0
+PTYPE_PARITY = 1  # FEC校验包：flags=校验组数, index=组号, count=数据包数
+
+
+def timestamp_ms():
+    """32位毫秒时间戳（回绕），用于客户端计算时延和抖动"""
+    return int(time.time() * 1000) & 0xFFFFFFFF
+
+
+def parse_header(packet):
+    """解析包头，返回 (ptype, flags, frame_id, index, count, timestamp_ms)；版本不符返回None"""
+    if len(packet) < PACKET_HEADER.size:
+        return None
+    version, ptype, flags, frame_id, index, count, ts = PACKET_HEADER.unpack_from(packet, 0)
+    if version != PROTOCOL_VERSION:
+        return None
+    return ptype, flags, frame_id, index, count, ts
+
+
+def _address(buffer):
+    """缓冲区首字节的内存地址（不拷贝）"""
+    return np.frombuffer(buffer, dtype=np.uint8).ctypes.data if len(buffer) else 0
+
+
+class PacketBatch:
+    """一帧的全部UDP包（数据包在前，FEC校验包在后），不拼接、不拷贝
+
+    包头连续存放在headers缓冲区中(第i个包头在 i * PACKET_HEADER.size)，
+    负载是帧数据及校验数据的切片；header_addrs/payload_addrs/payload_lens
+    为各包的内存地址与长度，供sendmmsg直接构造iovec
+    """
+
+    def __init__(self, headers, count, data_count, chunk_size, buffers, payload_addrs, payload_lens):
+        self.headers = headers            # 包头缓冲区(缓冲池中的数组，本批次持有期间不会被复用)
+        self.count = count                # 包总数
+        self.data_count = data_count      # 数据包数
+        self.chunk_size = chunk_size      # 数据包负载大小
+        self._buffers = buffers           # [帧数据, 各校验包负载]（负载引用它们，保持存活）
+        self._header_view = memoryview(headers)
+        self._views = [memoryview(buffer) for buffer in buffers]
+        base = headers.ctypes.data
+        self.header_addrs = base + np.arange(count, dtype=np.uint64) * PACKET_HEADER.size
+        self.payload_addrs = payload_addrs
+        self.payload_lens = payload_lens
+
+    def __len__(self):
+        return self.count
+
+    def parts(self, index):
+        """第index个包的 (包头, 负载) memoryview，用于sendmsg分散/聚集发送"""
+        start = index * PACKET_HEADER.size
+        if index < self.data_count:
+            view, offset = self._views[0], index * self.chunk_size
+            payload = view[offset:offset + self.chunk_size]  # 最后一个包切片自动截断
+        else:
+            payload = self._views[index - self.data_count + 1]
+        return self._header_view[start:start + PACKET_HEADER.size], payload
+
+    def packet(self, index):
+        """第index个包的完整字节（拷贝，用于重传与不支持分散发送的平台）"""
+        header, payload = self.parts(index)
+        return header.tobytes() + payload
+
+    @property
+    def nbytes(self):
+        return self.count * PACKET_HEADER.size + int(self.payload_lens.sum())
+
+
+class Packetizer:
+    """把一帧数据切成MTU大小的UDP包"""
+
+    def __init__(self, mtu=1200, fec_ratio=0.0):
+        if mtu <= PACKET_HEADER.size + 2:
+            raise ValueError(f"MTU过小: {mtu}")
+        self.mtu = mtu
+        # 预留FEC长度前缀的2字节，保证校验包也不超过MTU
+        self.payload_size = mtu - PACKET_HEADER.size - 2
+        self.fec_ratio = fec_ratio  # 校验包数 / 数据包数
+        self._header_pool = BufferPool()  # 包头缓冲区，按2的幂容量复用
+
+    def packetize(self, payload, frame_id, ptype=PTYPE_DATA):
+        """返回该帧的全部UDP包（数据包在前，FEC校验包在后），每个包为拼接好的bytes"""
+        batch = self.packetize_batch(payload, frame_id, ptype)
+        return [batch.packet(i) for i in range(batch.count)]
+
+    def packetize_batch(self, payload, frame_id, ptype=PTYPE_DATA):
+        """零拷贝分包，返回PacketBatch"""
+        size = self.payload_size
+        count = max(1, -(-len(payload) // size))
+        if count > 0xFFFF:
+            raise ValueError(f"帧过大，无法分包: {len(payload)} 字节")
+        groups = parity_group_count(count, self.fec_ratio)
+        total = count + groups
+        ts = timestamp_ms()
+
+        capacity = 1 << max(6, (total - 1).bit_length())
+        headers = self._header_pool.acquire((capacity * PACKET_HEADER.size,))
+        pack_into = PACKET_HEADER.pack_into
+        for i in range(count):
+            pack_into(headers, i * PACKET_HEADER.size, PROTOCOL_VERSION, ptype, groups, frame_id, i, count, ts)
+
+        offsets = np.arange(count, dtype=np.uint64) * size
+        lengths = np.full(total, size, dtype=np.uint64)
+        lengths[count - 1] = len(payload) - (count - 1) * size
+        buffers = [payload]
+        addrs = [_address(payload) + offsets]
+        if groups:
+            view = memoryview(payload)
+            chunks = [view[i * size:(i + 1) * size] for i in range(count)]
+            for g, parity in enumerate(encode_parity(chunks, groups)):
+                pack_into(headers, (count + g) * PACKET_HEADER.size,
+                          PROTOCOL_VERSION, PTYPE_PARITY, groups, frame_id, g, count, ts)
+                buffers.append(parity)
+                lengths[count + g] = len(parity)
+                addrs.append(np.array([_address(parity)], dtype=np.uint64))
+        return PacketBatch(headers, total, count, size, buffers, np.concatenate(addrs), lengths)
+
+
+class TokenBucketPacer:
+    """令牌桶发送节奏控制
+
+    以rate字节/秒补充令牌，桶容量burst字节；
+    令牌不足时休眠，把一帧的包均匀摊到帧间隔内，而不是一次性突发
+    """
+
+    def __init__(self, rate=4 * 1024 * 1024, burst=16 * 1200, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._last = clock()
+        self.wait_time = 0.0  # 累计等待时间
+
+    def set_rate(self, rate):
+        self.rate = max(1.0, rate)
+
+    def consume(self, nbytes):
+        """取出nbytes令牌，不足时阻塞等待"""
+        delay = self.reserve(nbytes)
+        if delay > 0:
+            self._sleep(delay)
+
+    def reserve(self, nbytes):
+        """取出nbytes令牌，返回发送前需等待的秒数（不休眠，供异步发送使用）"""
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= nbytes
+        if self._tokens >= 0:
+            return 0.0
+        delay = -self._tokens / self.rate
+        self.wait_time += delay
+        return delay
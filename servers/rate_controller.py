@@ -0,0 +1,231 @@
+# servers/rate_controller.py
+"""接收端驱动的自适应码率(ABR)控制
+
+客户端定期通过控制通道上报丢包率、抖动和帧到达时延，
+控制器据此在“码率阶梯”上移动：每一级是 (JPEG质量, 输出缩放, 帧率) 的组合，
+越往后越省带宽。拥塞时一次后退多级（快速回退），
+链路持续良好probe_interval秒才前进一级（缓慢上探），
+上探到某级后立即拥塞时，该级的上探等待时间加倍，避免在带宽上限附近反复震荡；
+同时保证估算码率不超过目标码率
+"""
+import time
+import logging
+import threading
+from utils.sessions import format_address
+
+logger = logging.getLogger(__name__)
+
+
+class RateDecision:
+    """一级码率阶梯"""
+    __slots__ = ('quality', 'scale', 'fps')
+
+    def __init__(self, quality, scale, fps):
+        self.quality = quality
+        self.scale = scale
+        self.fps = fps
+
+    def as_dict(self):
+        return {'quality': self.quality, 'scale': self.scale, 'fps': self.fps}
+
+    def __repr__(self):
+        return f"RateDecision(quality={self.quality}, scale={self.scale}, fps={self.fps})"
+
+
+def build_ladder(max_quality, max_fps, min_quality=30, min_fps=5):
+    """由最佳到最省构建码率阶梯：先降质量，再降分辨率，最后降帧率"""
+    ladder = []
+    quality = max_quality
+    while quality > min_quality:
+        ladder.append(RateDecision(quality, 1.0, max_fps))
+        quality -= 10
+    for scale in (1.0, 0.75, 0.5):
+        ladder.append(RateDecision(min_quality, scale, max_fps))
+    fps = max_fps
+    while fps // 2 >= min_fps:
+        fps //= 2
+        ladder.append(RateDecision(min_quality, 0.5, fps))
+    return ladder
+
+
+class _ClientState:
+    __slots__ = ('level', 'good_since', 'hold_until', 'probed_at', 'failures', 'report')
+
+    def __init__(self, now):
+        self.level = 0
+        self.good_since = now
+        self.hold_until = 0.0
+        self.probed_at = None  # 最近一次上探的时间
+        self.failures = {}  # 级别 -> (上探失败次数, 最近失败时间)
+        self.report = None
+
+
+class AdaptiveBitrateController:
+    """自适应码率控制器（每个客户端独立决策，可按组取最保守值）"""
+
+    def __init__(self, config, clock=time.monotonic):
+        self.config = config
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._ladder = None
+        self._ladder_key = None
+        self.loss_threshold = 0.02      # 丢包率超过即视为拥塞
+        self.delay_threshold = 150.0    # 帧时延(ms)
+        self.jitter_threshold = 30.0    # 抖动(ms)
+        self.backoff_levels = 2         # 拥塞时一次后退的级数
+        self.probe_interval = 3.0       # 持续良好多久后上探一级
+        self.hold_time = 2.0            # 回退后多久内不上探
+        self.max_probe_backoff = 8      # 上探失败后等待时间的最大倍数
+        self.failure_memory = 60.0      # 上探失败记录的保留时间(秒)
+        self._bytes_per_frame = {}      # 阶梯级别 -> 平均帧大小(EWMA)
+        self.backoffs = 0
+        self.probes = 0
+
+    def _current_ladder(self):
+        """当前配置下的码率阶梯（质量/帧率滑块变化时重建，调用方持有self._lock）
+
+        重建后阶梯可能变短：各客户端的级别截到最后一级，
+        按旧级别记录的帧大小不再对应同一组参数，全部丢弃重新统计
+        """
+        key = (self.config.quality, self.config.fps)
+        if key != self._ladder_key:
+            self._ladder = build_ladder(self.config.quality, self.config.fps,
+                                        min_quality=min(self.config.quality, self.config.min_quality))
+            self._ladder_key = key
+            last = len(self._ladder) - 1
+            for state in self._clients.values():
+                state.level = min(state.level, last)
+                state.failures = {level: failure for level, failure in state.failures.items() if level <= last}
+            self._bytes_per_frame.clear()
+        return self._ladder
+
+    def rungs(self):
+        """当前码率阶梯的副本（从最高画质到最省带宽）"""
+        with self._lock:
+            return list(self._current_ladder())
+
+    def base_decision(self):
+        """阶梯第一级，即未启用自适应码率时使用的决策"""
+        with self._lock:
+            return self._current_ladder()[0]
+
+    def on_report(self, client_id, report):
+        """处理客户端接收报告，返回该客户端的新决策"""
+        now = self._clock()
+        with self._lock:
+            ladder = self._current_ladder()
+            state = self._clients.get(client_id)
+            if state is None:
+                state = self._clients[client_id] = _ClientState(now)
+            state.report = report
+
+            congested = (report.get('loss', 0.0) > self.loss_threshold
+                         or report.get('delay_ms', 0.0) > self.delay_threshold
+                         or report.get('jitter_ms', 0.0) > self.jitter_threshold)
+            previous = state.level
+            if congested:
+                if state.probed_at is not None and now - state.probed_at <= self.hold_time + self.probe_interval:
+                    # 刚上探到的级别承受不住，记一次失败
+                    count = state.failures.get(state.level, (0, now))[0]
+                    state.failures[state.level] = (count + 1, now)
+                state.probed_at = None
+                # 至少后退backoff_levels级；丢包严重时继续后退到估算码率低于实际送达码率的级别
+                delivered = self._estimated_bitrate(state.level) * (1 - report.get('loss', 0.0))
+                state.level = min(len(ladder) - 1, state.level + self.backoff_levels)
+                while state.level < len(ladder) - 1 and self._estimated_bitrate(state.level) > delivered * 0.85:
+                    state.level += 1
+                state.good_since = now
+                state.hold_until = now + self.hold_time
+                if state.level != previous:
+                    self.backoffs += 1
+            elif (state.level > 0 and now >= state.hold_until
+                  and now - state.good_since >= self._probe_wait(state, state.level - 1, now)):
+                state.level -= 1
+                state.good_since = now
+                state.probed_at = now
+                self.probes += 1
+
+            # 目标码率约束：估算码率超标时继续后退
+            while state.level < len(ladder) - 1 and self._estimated_bitrate(state.level) > self.config.target_bitrate:
+                state.level += 1
+
+            if state.level != previous:
+                logger.info(f"客户端 {client_id} 码率调整: {ladder[previous]} -> {ladder[state.level]}")
+            return ladder[state.level]
+
+    def _probe_wait(self, state, level, now):
+        """上探到level前需持续良好的时间：该级近期每失败一次等待加倍"""
+        count, when = state.failures.get(level, (0, now))
+        if now - when > self.failure_memory:
+            del state.failures[level]
+            count = 0
+        return self.probe_interval * min(self.max_probe_backoff, 2 ** count)
+
+    def observe_frame(self, nbytes, decision):
+        """记录某一级别实际编码出的帧大小，用于估算码率"""
+        with self._lock:
+            ladder = self._current_ladder()
+            for level, rung in enumerate(ladder):
+                if rung is decision:
+                    average = self._bytes_per_frame.get(level)
+                    self._bytes_per_frame[level] = nbytes if average is None else average * 0.9 + nbytes * 0.1
+                    return
+
+    def _estimated_bitrate(self, level):
+        average = self._bytes_per_frame.get(level)
+        if average is None:
+            return 0.0
+        return average * 8 * self._ladder[level].fps
+
+    def remove_client(self, client_id):
+        with self._lock:
+            self._clients.pop(client_id, None)
+
+    def decision(self, client_id):
+        with self._lock:
+            ladder = self._current_ladder()
+            state = self._clients.get(client_id)
+            return ladder[min(state.level, len(ladder) - 1) if state else 0]
+
+    def group_decision(self, client_ids=None):
+        """一组客户端共用一次编码时，取其中最保守的级别"""
+        with self._lock:
+            ladder = self._current_ladder()
+            levels = [state.level for cid, state in self._clients.items()
+                      if client_ids is None or cid in client_ids]
+            return ladder[min(max(levels), len(ladder) - 1) if levels else 0]
+
+    def metrics(self):
+        """导出当前决策与计数，供状态显示/监控使用"""
+        with self._lock:
+            ladder = self._current_ladder()
+            return {
+                'backoffs': self.backoffs,
+                'probes': self.probes,
+                'clients': {
+                    str(cid): dict(ladder[state.level].as_dict(), level=state.level,
+                                   report=state.report)
+                    for cid, state in self._clients.items()
+                },
+            }
+
+    def register_metrics(self, metrics):
+        """在指标表中登记各客户端的码率决策与回退/上探次数(抓取时读取)"""
+        def per_client(field):
+            def read():
+                with self._lock:
+                    ladder = self._current_ladder()
+                    return {format_address(cid): state.level if field == 'level' else getattr(ladder[state.level], field)
+                            for cid, state in self._clients.items()}
+            return read
+
+        for field, documentation in (('level', '各客户端所在的码率阶梯级别(0为最高画质)'),
+                                     ('quality', '各客户端当前的JPEG质量'),
+                                     ('scale', '各客户端当前的输出缩放比例'),
+                                     ('fps', '各客户端当前的目标帧率')):
+            metrics.collect(f'screenshare_abr_{field}', documentation, per_client(field), labelnames=('client',))
+        metrics.collect('screenshare_abr_backoffs_total', '拥塞导致的码率回退次数',
+                        lambda: self.backoffs, type='counter')
+        metrics.collect('screenshare_abr_probes_total', '链路良好时的码率上探次数',
+                        lambda: self.probes, type='counter')
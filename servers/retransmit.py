@@ -0,0 +1,54 @@
+# servers/retransmit.py
+import time
+import threading
+from collections import OrderedDict
+
+
+class RetransmitCache:
+    """有界的重传缓存
+
+    保存最近发出的数据包，收到NACK时在截止时间内重发；
+    超过截止时间的包直接放弃，避免迟到的数据反而增加时延。
+    同一帧ID的不同分辨率版本用rendition区分
+    """
+
+    def __init__(self, max_packets=4096, deadline=0.2, clock=time.monotonic):
+        self.max_packets = max_packets
+        self.deadline = deadline
+        self._clock = clock
+        self._packets = OrderedDict()  # (rendition, frame_id, index) -> (packet, 发送时间)
+        self._lock = threading.Lock()
+        self.retransmitted = 0
+        self.expired = 0  # 超过截止时间被放弃的请求
+        self.missing = 0  # 已被淘汰或从未缓存的请求
+
+    def store(self, frame_id, index, packet, rendition=None):
+        with self._lock:
+            key = (rendition, frame_id, index)
+            self._packets[key] = (packet, self._clock())
+            self._packets.move_to_end(key)
+            while len(self._packets) > self.max_packets:
+                self._packets.popitem(last=False)
+
+    def lookup(self, frame_id, index, rendition=None):
+        """返回可重传的包；不存在或已过截止时间返回None"""
+        with self._lock:
+            entry = self._packets.get((rendition, frame_id, index))
+            if entry is None:
+                self.missing += 1
+                return None
+            packet, sent_at = entry
+            if self._clock() - sent_at > self.deadline:
+                self.expired += 1
+                return None
+            self.retransmitted += 1
+            return packet
+
+    @property
+    def stats(self):
+        return {
+            'cached': len(self._packets),
+            'retransmitted': self.retransmitted,
+            'expired': self.expired,
+            'missing': self.missing,
+        }
@@ -1,12 +1,20 @@
 import socket
 import time
-import cv2
-import numpy as np
 import threading
 import logging
-import struct
-from queue import Queue
-import zlib
+from utils.frame_bus import FrameBus
+from utils.pipeline import DropOldestQueue, StageStats
+from .tile_codec import TileEncoder
+from .video_codec import VideoEncoder
+from utils.encoders import EncoderUnavailable
+from .packetizer import Packetizer, TokenBucketPacer, PACKET_HEADER
+from .udp_batch import BatchSender
+from .control_protocol import MessageReader, NonBlockingWriter, send_message, encode_message, parse_udp_register
+from .multicast import multicast_address, configure_sender
+from .retransmit import RetransmitCache
+from .rate_controller import AdaptiveBitrateController
+from utils.sessions import KIND_STREAM
+from utils.backpressure import flow_control_from_config, send_backlog, send_capacity
 
 logger = logging.getLogger(__name__)
 
@@ -15,15 +23,76 @@ class DualprotocolStreamServer:
        UDP承担主要视频传输任务，TCP仅提供辅助控制功能
     """
     
-    def __init__(self, config, capture_instance):
+    def __init__(self, config, capture_instance, frame_bus=None):
         self.config = config
         self.capture_instance = capture_instance
+        self.frame_bus = frame_bus or FrameBus(config, capture_instance)  # 与网页端共享的帧总线
         self.tcp_socket = None
         self.udp_socket = None
-        self.clients_tcp = {}  # TCP客户端
-        self.clients_udp = {}  # UDP客户端
-        self.frame_queue = Queue(maxsize=5)  # 限制队列大小防内存溢出
+        # 客户端会话(TCP控制连接与UDP端点、视口、组播状态)，与网页服务器共用
+        self.sessions = config.sessions
+        self.sessions.timeout = getattr(config, 'session_timeout', self.sessions.timeout)
+        # 发送阶段的输入队列：准备(编码/分包前处理)与网络发送在不同线程并行，发送跟不上时丢弃最旧的帧
+        self.frame_queue = DropOldestQueue(maxsize=3, on_drop=self._on_send_drop)
+        metrics = config.metrics
+        self.prepare_stats = StageStats('prepare', histogram=metrics.histogram(
+            'screenshare_prepare_seconds', 'UDP帧准备(按档位编码、图块/视频编码)的耗时，秒'))
+        self.send_stats = StageStats('send', self.frame_queue, histogram=metrics.histogram(
+            'screenshare_send_seconds', '发送一帧(TCP帧信息+UDP分包发送，含节奏控制等待)的耗时，秒'))
+        self.frame_age = metrics.histogram('screenshare_frame_age_seconds', '帧从捕获到进入发送准备的时间，秒')
+        self.send_errors = metrics.counter('screenshare_send_errors_total', '发送失败次数', ('transport',))
         self.running = True
+        # 图块增量模式的编码器（stream_mode == "tile" 时使用）
+        self.tile_encoder = TileEncoder(
+            tile_size=getattr(config, 'tile_size', 64),
+            keyframe_interval=getattr(config, 'keyframe_interval', 5.0),
+            encoder=self.frame_bus.encoder)
+        # 视频编码模式的编码器（stream_mode == "video" 时使用，PyAV不可用时回退到完整JPEG帧）
+        self.video_encoder = None
+        if getattr(config, 'stream_mode', 'full') == "video":
+            try:
+                self.video_encoder = VideoEncoder(
+                    codec=getattr(config, 'video_codec', 'h264'),
+                    gop=getattr(config, 'video_gop', 60),
+                    bitrate=getattr(config, 'video_bitrate', 4_000_000),
+                    fps=max(1, config.fps))
+            except EncoderUnavailable as e:
+                logger.warning(f"视频编码不可用({e})，改为发送完整JPEG帧")
+        # MTU分包与发送节奏控制
+        self.packetizer = Packetizer(getattr(config, 'udp_mtu', 1200),
+                                     fec_ratio=getattr(config, 'fec_ratio', 0.0))
+        self.pacer = TokenBucketPacer(burst=8 * self.packetizer.mtu)
+        self.udp_sender = None  # 批量发送器，UDP套接字创建后设置
+        self.udp_frames_sent = 0
+        # NACK选择性重传
+        self.retransmit_cache = RetransmitCache(
+            max_packets=getattr(config, 'retransmit_cache_size', 4096),
+            deadline=getattr(config, 'retransmit_deadline', 0.2))
+        self.client_reports = {}  # TCP客户端地址 -> 最近一次接收报告
+        # 接收端驱动的自适应码率：所有UDP客户端共用一次编码，取最保守的决策
+        self.rate_controller = AdaptiveBitrateController(config)
+        self._last_udp_send = 0.0
+        # 多分辨率版本：客户端上报视口后按档位分组，每组共享一次缩放编码
+        self._client_rendition = {}  # UDP地址 -> 最近发送给它的档位（NACK重传按档位查找）
+        # 组播投递(可选)：已加入组播组的客户端不再单播，每个包只向组播组发送一次
+        self.multicast_address = multicast_address(config)
+        self._tcp_send_lock = threading.Lock()  # 发送线程与控制消息处理线程共用TCP连接
+        self._register_metrics(metrics)
+        
+    def _register_metrics(self, metrics):
+        """抓取时读取的发送统计：UDP包数、发送队列深度与丢帧"""
+        metrics.collect('screenshare_udp_packets_sent_total', '发出的UDP数据报数(每个客户端各计一次)',
+                        lambda: self.udp_sender.messages if self.udp_sender else 0, type='counter')
+        metrics.collect('screenshare_udp_packets_dropped_total', '发送缓冲区满而丢弃的UDP数据报数',
+                        lambda: self.udp_sender.dropped if self.udp_sender else 0, type='counter')
+        metrics.collect('screenshare_udp_frames_sent_total', '发出的UDP视频帧数',
+                        lambda: self.udp_frames_sent, type='counter')
+        metrics.collect('screenshare_queue_depth', '流水线各阶段输入队列中等待的帧数',
+                        lambda: {'send': len(self.send_stats.queue)}, labelnames=('queue',), source='stream_server')
+        metrics.collect('screenshare_frames_dropped_total', '各环节丢弃的帧数',
+                        lambda: {'send_queue': self.send_stats.queue.dropped},
+                        type='counter', labelnames=('stage',), source='stream_server')
+        self.rate_controller.register_metrics(metrics)
         
     def handle_tcp_client(self, client_socket, address):
         """处理TCP客户端连接"""
@@ -33,7 +102,7 @@ class DualprotocolStreamServer:
             # 握手协议
             client_socket.send(b"STREAM_OK")
             response = client_socket.recv(1024)
-            if response != b"READY":
+            if not response.startswith(b"READY"):
                 client_socket.close()
                 return
         except Exception as e:
@@ -44,62 +113,293 @@ class DualprotocolStreamServer:
                 pass
             return
         
-        # 添加到TCP客户端列表
-        self.clients_tcp[client_socket] = address
+        # 建立会话
+        session = self.sessions.open(KIND_STREAM, address, client_socket)
+        session.flow = flow_control_from_config(self.config)
+        if session.flow is not None:
+            session.writer = NonBlockingWriter(client_socket)  # 发送线程不在慢速客户端上阻塞
         
-        # 保持连接直到断开
+        # 读取客户端控制消息，直到连接断开（READY之后可能已粘连了消息）
+        reader = MessageReader()
+        data = response[len(b"READY"):]
+        client_socket.settimeout(30)
         while self.running:
             try:
-                # 简单心跳包，防止连接断开
-                time.sleep(30)
-            except:
+                for message in reader.feed(data):
+                    self.sessions.touch(session)
+                    self.handle_control_message(session, message)
+                data = client_socket.recv(4096)
+            except socket.timeout:
+                data = b""
+                continue
+            except Exception as e:
+                if self.running:
+                    logger.error(f"TCP客户端 {address} 控制消息处理失败: {e}")
                 break
+            if not data:
+                break  # 客户端已断开
         
         # 清理客户端
-        if client_socket in self.clients_tcp:
-            del self.clients_tcp[client_socket]
+        self.remove_session(session)
         try:
             client_socket.close()
         except:
             pass
     
-    def handle_udp_client(self, address):
-        """处理UDP客户端"""
-        logger.info(f"添加UDP客户端 {address}")
-        self.clients_udp[address] = time.time()
+    def remove_session(self, session):
+        """移除客户端会话及其控制通道/UDP状态（可重复调用）"""
+        self.sessions.close(session)
+        if session.writer is not None:
+            session.writer.close()
+        self.client_reports.pop(session.address, None)
+        self.rate_controller.remove_client(session.address)
+        self._client_rendition.pop(session.udp_address, None)
+    
+    def close_session(self, session):
+        """主动断开客户端（心跳超时/TCP发送失败）：移除会话并关闭其TCP连接，连接处理线程随之退出"""
+        self.remove_session(session)
+        connection = session.connection
+        if connection is None:
+            return
+        try:
+            connection.shutdown(socket.SHUT_RDWR)  # 唤醒阻塞在recv上的处理线程
+        except OSError:
+            pass
+        try:
+            connection.close()
+        except OSError:
+            pass
+    
+    def expire_sessions(self):
+        """移除心跳超时的流媒体客户端（只处理到期的会话，不扫描全部客户端）"""
+        for session in self.sessions.expire():
+            logger.info(f"客户端 {session.address} 超过 {self.sessions.timeout:.0f} 秒无心跳，已移除")
+            self.close_session(session)
+    
+    def handle_control_message(self, session, message):
+        """处理客户端通过TCP控制通道发来的消息"""
+        address = session.address
+        msg_type = message.get('type')
+        if msg_type == 'hello':
+            self.sessions.bind_udp(session, (address[0], int(message['udp_port'])))
+            self.send_control(session, {'type': 'session', 'id': session.session_id,
+                                        'heartbeat': getattr(self.config, 'heartbeat_interval', 2.0)})
+            if self.multicast_address:
+                group, port = self.multicast_address
+                self.send_control(session, {'type': 'multicast', 'group': group, 'port': port})
+        elif msg_type == 'multicast':
+            self.on_multicast_membership(session, bool(message.get('joined')))
+        elif msg_type == 'nack':
+            self.retransmit(session, int(message['frame_id']), message.get('packets', []))
+        elif msg_type == 'keyframe':
+            logger.info(f"客户端 {address} 请求关键帧")
+            self.request_keyframe()
+        elif msg_type == 'report':
+            self.client_reports[address] = message
+            self.rate_controller.on_report(address, message)
+            if self.video_encoder is not None and message.get('loss', 0) > getattr(self.config, 'video_idr_loss', 0.05):
+                self.request_keyframe()  # 丢包较多时参考帧很可能已损坏，插入关键帧尽快恢复
+        elif msg_type == 'viewport':
+            width = self.frame_bus.renditions.rung_for_viewport(int(message.get('width', 0)))
+            session.viewport = width
+            logger.info(f"客户端 {address} 视口宽度 {message.get('width')}，分辨率档位 {width or '原始'}")
+        else:
+            logger.warning(f"未知控制消息 {msg_type} 来自 {address}")
+    
+    def send_control(self, session, message):
+        """向单个客户端发送控制消息"""
+        try:
+            with self._tcp_send_lock:
+                if session.writer is not None:
+                    session.writer.send(encode_message(message))  # 控制消息不丢弃，写不完的部分排队
+                else:
+                    send_message(session.connection, message)
+        except OSError as e:
+            self.send_errors.inc(transport='tcp')
+            logger.error(f"控制消息发送给 {session.address} 失败: {e}")
+    
+    def on_multicast_membership(self, session, joined):
+        """客户端加入组播组成功后停止单播；加入失败或收不到组播时恢复单播"""
+        if session.udp_address is None or not self.multicast_address:
+            return
+        session.multicast = joined
+        if joined:
+            logger.info(f"客户端 {session.address} 已加入组播组 {self.multicast_address[0]}:{self.multicast_address[1]}")
+        else:
+            logger.info(f"客户端 {session.address} 无法接收组播，改为单播")
+        self.request_keyframe()  # 切换接收路径时可能丢帧
+    
+    @property
+    def multicast_members(self):
+        """已确认加入组播组的客户端UDP地址"""
+        return {session.udp_address for session in self.sessions.udp_sessions() if session.multicast}
     
-    def send_udp_frame(self, frame_data, frame_id):
-        """通过UDP发送视频帧"""
-        if not self.udp_socket:
+    def retransmit(self, session, frame_id, indexes):
+        """重传NACK中请求的包，超过截止时间的包不再重发"""
+        endpoint = session.udp_address
+        if endpoint is None or not self.udp_socket:
             return
-            
-        # 分片发送大帧（UDP最大包大小限制）
-        max_chunk_size = 65507 - 16  # 留出头部空间
-        total_chunks = (len(frame_data) + max_chunk_size - 1) // max_chunk_size
+        # 组播成员收到的是组播版本，重传仍单播给客户端自己
+        rendition = self._client_rendition.get(self.multicast_address if session.multicast else endpoint)
+        for index in indexes:
+            cached = self.retransmit_cache.lookup(frame_id, int(index), rendition)
+            if cached is None:
+                continue
+            batch, packet_index = cached
+            try:
+                # 重传在控制消息线程中进行，不共用发送线程的批量发送器
+                self.udp_socket.sendto(batch.packet(packet_index), endpoint)
+            except Exception as e:
+                self.send_errors.inc(transport='udp')
+                logger.error(f"重传到 {endpoint} 失败: {e}")
+                return
+    
+    def handle_udp_client(self, address, session_id=None):
+        """处理UDP注册/心跳：刷新会话，UDP端点新确认可达时开始向其发送"""
+        session, activated = self.sessions.on_datagram(address, session_id)
+        if activated:
+            logger.info(f"添加UDP客户端 {address}")
+            # 新客户端没有参考画面，下一帧发送关键帧
+            self.request_keyframe()
+    
+    def request_keyframe(self):
+        """图块增量/视频编码的下一帧改发关键帧"""
+        self.tile_encoder.request_keyframe()
+        if self.video_encoder is not None:
+            self.video_encoder.request_keyframe()
+    
+    def send_udp_frame(self, frame_data):
+        """通过UDP把同一帧数据发送给所有客户端"""
+        self.send_udp_renditions([(None, frame_data, self.udp_destinations())])
+    
+    def send_udp_renditions(self, groups):
+        """通过UDP发送视频帧的各个分辨率版本
+
+        groups为 [(档位, 帧数据, 客户端地址列表)]，各版本共用同一个帧ID。
+        按MTU分包（避免IP分片），可选附加FEC校验包，并用令牌桶把一帧的包摊到帧间隔内发送；
+        UDP帧ID按实际发出的帧连续编号，客户端据此发现整帧丢失并按序交付。
+        每个令牌桶额度内的 包 × 客户端 通过批量发送器一次提交(Linux下为一次sendmmsg)
+        """
+        if not self.udp_socket or not self.udp_sender:
+            return
+        batches = self.packetize_renditions(groups)
         
-        for i in range(total_chunks):
-            start = i * max_chunk_size
-            end = min(start + max_chunk_size, len(frame_data))
-            chunk = frame_data[start:end]
-            
-            # 构建UDP包头：帧ID + 片段索引 + 总片段数 + 数据
-            header = struct.pack('<III', frame_id, i, total_chunks)
-            packet = header + chunk
-            
-            # 发送给所有UDP客户端
-            remove_clients = []
-            for addr in list(self.clients_udp.keys()):
-                try:
-                    self.udp_socket.sendto(packet, addr)
-                    self.clients_udp[addr] = time.time()  # 更新最后活动时间
-                except Exception as e:
-                    logger.error(f"UDP发送到 {addr} 失败: {e}")
-                    remove_clients.append(addr)
-            
-            # 清理失效客户端
-            for addr in remove_clients:
-                if addr in self.clients_udp:
-                    del self.clients_udp[addr]
+        remove_clients = {}
+        for rendition, batch, clients in batches:
+            for addr in clients:
+                self._client_rendition[addr] = rendition
+            start = 0
+            while start < batch.count and self.running:
+                stop, nbytes = self.next_send_chunk(batch, start, len(clients))
+                if self.config.udp_pacing:
+                    self.pacer.consume(nbytes)
+                # 发送给该档位的所有UDP客户端
+                remove_clients.update(self.udp_sender.send(
+                    batch, start, stop, [addr for addr in clients if addr not in remove_clients]))
+                start = stop
+            self.mark_frames_sent([addr for addr in clients if addr not in remove_clients])
+        
+        if not self.running:
+            return  # 服务器已停止，套接字已关闭
+        # 清理失效客户端
+        for addr, error in remove_clients.items():
+            self.send_errors.inc(transport='udp')
+            logger.error(f"UDP发送到 {addr} 失败: {error}")
+            self.remove_udp_client(addr)
+    
+    def mark_frames_sent(self, addresses):
+        """一帧已完整发给这些UDP地址：计入各客户端帧率(组播地址计入全部组播成员)"""
+        for addr in addresses:
+            if addr == self.multicast_address:
+                for session in self.sessions.udp_sessions():
+                    if session.multicast:
+                        session.frames.mark()
+                continue
+            session = self.sessions.by_udp(addr)
+            if session is not None:
+                session.frames.mark()
+    
+    def record_frame_age(self, encoded):
+        """记录帧从捕获到进入发送准备的时间：只反映捕获/编码流水线的积压，不含网络传输"""
+        age = time.monotonic() - encoded.timestamp
+        self.frame_age.observe(age)
+        if age > max(0.1, 2.0 / max(1, self.config.fps)):
+            logger.warning(f"帧从捕获到发送准备耗时过长: {age:.3f}s，捕获/编码跟不上目标帧率")
+        self.config.last_frame_time = time.time()
+    
+    def next_send_chunk(self, batch, start, client_count):
+        """从第start个包起，取不超过令牌桶容量的一段包，返回 (结束下标, 字节数 × 客户端数)
+
+        未开启节奏控制时一次取完整帧
+        """
+        if self.config.udp_pacing:
+            per_packet = self.packetizer.mtu * max(1, client_count)
+            stop = min(batch.count, start + max(1, int(self.pacer.burst // per_packet)))
+        else:
+            stop = batch.count
+        nbytes = int(batch.payload_lens[start:stop].sum()) + PACKET_HEADER.size * (stop - start)
+        return stop, nbytes * client_count
+    
+    def packetize_renditions(self, groups):
+        """为一帧的各版本分配帧ID、分包并缓存重传数据，按需设置节奏控制速率
+
+        返回 [(档位, PacketBatch, 客户端地址列表)]，没有需要发送的客户端时返回空列表
+        """
+        groups = [group for group in groups if group[2]]
+        if not groups:
+            return []
+        
+        frame_id = self.udp_frames_sent % 65536  # 防止溢出
+        self.udp_frames_sent += 1
+        self.packetizer.fec_ratio = self.config.fec_ratio  # 支持运行时调整冗余度
+        batches = []
+        for rendition, frame_data, clients in groups:
+            batch = self.packetizer.packetize_batch(frame_data, frame_id)
+            # 缓存数据包以备NACK重传（FEC校验包排在数据包之后，不缓存）
+            for index in range(batch.data_count):
+                self.retransmit_cache.store(frame_id, index, (batch, index), rendition)
+            batches.append((rendition, batch, clients))
+        if self.config.udp_pacing:
+            # 本帧的所有版本需在 帧间隔×pacing_ratio 内发完
+            frame_bytes = sum(batch.nbytes * len(clients) for _, batch, clients in batches)
+            budget = self.config.pacing_ratio / max(1, self.config.fps)
+            self.pacer.set_rate(frame_bytes / budget)
+        return batches
+    
+    def remove_udp_client(self, addr):
+        """UDP发送失败：停止向该地址发送；只用UDP注册的客户端整个会话移除"""
+        self._client_rendition.pop(addr, None)
+        session = self.sessions.by_udp(addr)
+        if session is None:
+            return
+        if session.connection is None:
+            self.remove_session(session)
+        else:
+            self.sessions.unbind_udp(session)  # 保留TCP控制通道，客户端下次心跳时恢复
+    
+    def group_udp_clients(self):
+        """按分辨率档位把UDP客户端分组 {档位宽度: [地址]}，未上报视口的客户端为原始分辨率(None)
+
+        组播成员共用一路原始分辨率的组播，在该组中以组播地址代替
+        """
+        groups = {}
+        multicast = False
+        for session in self.sessions.udp_sessions():
+            if session.multicast:
+                multicast = True
+                continue
+            width = session.viewport
+            if session.flow is not None and session.flow.level:
+                # downgrade策略：控制通道拥塞的客户端所在链路较慢，降低其UDP分辨率档位
+                width = self.frame_bus.renditions.lower_rung(width, session.flow.level)
+            groups.setdefault(width, []).append(session.udp_address)
+        if multicast:
+            groups.setdefault(None, []).append(self.multicast_address)
+        return groups
+    
+    def udp_destinations(self):
+        """同一帧数据的发送目标：单播客户端地址，有组播成员时再加上组播地址"""
+        return [addr for addrs in self.group_udp_clients().values() for addr in addrs]
     
     def start_servers(self):
         """启动TCP和UDP服务器"""
@@ -116,7 +416,9 @@ class DualprotocolStreamServer:
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_socket.settimeout(0.1)  # 短超时
         self.udp_socket.bind(('', udp_port))
-        logger.info(f"UDP流媒体服务器启动在端口: {udp_port}")
+        self.udp_sender = BatchSender(self.udp_socket)
+        logger.info(f"UDP流媒体服务器启动在端口: {udp_port}，批量发送: {self.udp_sender.mode}")
+        self.setup_multicast(self.udp_socket)
         
         # 接受TCP连接的线程
         def tcp_accept_thread():
@@ -137,19 +439,21 @@ class DualprotocolStreamServer:
                         logger.error(f"TCP接受连接错误: {e}")
                     break
         
-        # 接收UDP客户端注册的线程
+        # 接收UDP客户端注册/心跳的线程，同时移除心跳超时的会话
         def udp_accept_thread():
             while self.running:
                 try:
                     data, addr = self.udp_socket.recvfrom(1024)
-                    if data == b"UDP_CLIENT_REGISTER":
-                        self.handle_udp_client(addr)
+                    session_id = parse_udp_register(data)
+                    if session_id is not None:
+                        self.handle_udp_client(addr, session_id)
                 except socket.timeout:
-                    continue
+                    pass
                 except Exception as e:
                     if self.running:
                         logger.error(f"UDP接收错误: {e}")
                     break
+                self.expire_sessions()
         
         # 启动接受线程
         threading.Thread(target=tcp_accept_thread, daemon=True).start()
@@ -159,110 +463,187 @@ class DualprotocolStreamServer:
         self.main_stream_loop()
     
     def main_stream_loop(self):
-        """主串流循环"""
-        last_time = 0
-        frame_id = 0
-        self.config.frame_count = 0
-        self.config.start_time = time.time()
-        
-        while self.running and self.config.is_running:
-            current_time = time.time()
-            if current_time - last_time < 1.0 / self.config.fps:
-                time.sleep(0.005)  # 更精细的睡眠
+        """主串流循环（准备阶段）：从共享帧总线取帧，按模式/档位编码后交给发送线程"""
+        self.frame_queue = DropOldestQueue(maxsize=3, on_drop=self._on_send_drop)
+        self.send_stats.queue = self.frame_queue
+        sender = threading.Thread(target=self._send_loop, args=(self.frame_queue,), daemon=True)
+        sender.start()
+        try:
+            self._prepare_loop()
+        finally:
+            self.frame_queue.close()
+            sender.join(timeout=2.0)
+    
+    def _prepare_loop(self):
+        with self.frame_bus.subscribe() as subscription:
+            while self.running and self.config.is_running:
+                encoded = subscription.get(timeout=0.5)
+                if encoded is None:
+                    continue
+                frame_bytes = encoded.data
+                self.record_frame_age(encoded)
+                
+                with self.prepare_stats.timer():
+                    groups, delta = self.prepare_udp_frame(encoded, time.monotonic())
+                # TCP(可靠传输，适合控制命令；静态画面的重发帧只发保活)与UDP(视频数据)交给发送线程
+                self.frame_queue.put((frame_bytes, encoded.repeat, groups, delta))
+    
+    def prepare_udp_frame(self, encoded, now):
+        """准备UDP帧（now为time.monotonic()），返回 ([(档位, 帧数据, 客户端地址列表)], 是否增量帧)；本帧不发送UDP时列表为空
+
+        增量帧(图块增量/视频编码)依赖之前的帧，丢失后需要关键帧恢复
+        """
+        decision = self.get_rate_decision()
+        if not self.sessions.udp_sessions() or now - self._last_udp_send < 0.9 / decision.fps:
+            return [], False  # 没有UDP客户端，或自适应码率降低了帧率，跳过本帧
+        if self.video_encoder is not None and encoded.frame is not None:
+            # 视频编码模式：帧间压缩，画面未变化且无需关键帧时不发送（原始分辨率，不缩放）
+            if encoded.repeat and not self.video_encoder.keyframe_pending:
+                return [], True
+            result = self.video_encoder.encode(encoded.frame, self.get_video_bitrate(decision))
+            if result is None:
+                return [], True
+            self._last_udp_send = now
+            self.rate_controller.observe_frame(len(result[1]), decision)
+            return [(None, result[1], self.udp_destinations())], True
+        if self.config.stream_mode == "tile" and encoded.frame is not None:
+            # 图块增量模式：只发送变化的图块，画面未变化时不发送（图块需原始分辨率，不缩放）
+            if encoded.repeat and not self.tile_encoder.keyframe_pending:
+                return [], True
+            result = self.tile_encoder.encode(encoded.frame, decision.quality)
+            if result is None:
+                return [], True
+            self._last_udp_send = now
+            return [(None, result[1], self.udp_destinations())], True
+        # 完整帧模式：每个分辨率档位各编码一次
+        self._last_udp_send = now
+        groups = [(width, self.encode_for_udp(encoded, decision, width), addrs)
+                  for width, addrs in self.group_udp_clients().items()]
+        if groups:
+            self.rate_controller.observe_frame(max(len(group[1]) for group in groups), decision)
+        return groups, False
+    
+    def _send_loop(self, queue):
+        """发送阶段：TCP控制信息与UDP分包发送（含节奏控制的等待）"""
+        while True:
+            item = queue.get(timeout=0.5)
+            if item is None:
+                if queue.closed:
+                    break
                 continue
-            last_time = current_time
-            
-            # 捕获帧
-            frame, win = self.capture_instance.capture_window_content()
-            if frame is None:
-                # 生成错误提示帧
-                img = np.zeros((360, 640, 3), dtype=np.uint8)
-                cv2.putText(img, "⚠️ 未检测到目标窗口", (80, 150), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
-                cv2.putText(img, f"标题: '{self.config.window_title}'", (120, 200), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 200), 1)
-                _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 60])
-            else:
-                # 自适应压缩质量 - 根据网络状况调整
-                quality = self.get_adaptive_quality()
-                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-            
-            frame_bytes = buffer.tobytes()
-            
-            # 添加帧统计信息
-            if hasattr(self.config, 'last_frame_time'):
-                network_delay = current_time - self.config.last_frame_time
-                if network_delay > 0.1:  # 网络延迟过高
-                    logger.warning(f"检测到网络延迟: {network_delay:.3f}s")
-            
-            self.config.last_frame_time = current_time
-            self.config.frame_count += 1
-            
-            # TCP传输（可靠传输，适合控制命令）
-            self.send_tcp_frame(frame_bytes)
-            
-            # UDP传输（低延迟，适合视频数据）
-            self.send_udp_frame(frame_bytes, frame_id)
-            
-            frame_id = (frame_id + 1) % 65536  # 防止溢出
-            
-            # 清理长时间无响应的UDP客户端
-            current_time = time.time()
-            inactive_threshold = 60  # 60秒无活动则移除
-            inactive_clients = [
-                addr for addr, last_time in self.clients_udp.items()
-                if current_time - last_time > inactive_threshold
-            ]
-            for addr in inactive_clients:
-                logger.info(f"移除无响应UDP客户端: {addr}")
-                del self.clients_udp[addr]
+            frame_bytes, keepalive, groups, _ = item
+            try:
+                with self.send_stats.timer():
+                    self.send_tcp_frame(frame_bytes, keepalive=keepalive)
+                    if groups:
+                        self.send_udp_renditions(groups)
+            except Exception as e:
+                # 单帧发送失败不能让发送线程退出，否则之后所有客户端都收不到画面
+                logger.error(f"发送阶段失败: {e}")
+                continue
+    
+    def _on_send_drop(self, item):
+        """发送队列丢弃了未发出的帧：增量帧丢失后客户端画面会缺块或花屏，下一帧改发关键帧"""
+        if item[3] and item[2]:
+            self.request_keyframe()
+    
+    @property
+    def pipeline_stats(self):
+        """流水线各阶段(捕获/编码/准备/发送)的耗时与队列深度"""
+        stats = dict(self.frame_bus.pipeline_stats)
+        stats['prepare'] = self.prepare_stats.stats
+        stats['send'] = self.send_stats.stats
+        return stats
+    
+    def get_rate_decision(self):
+        """UDP客户端当前的码率决策（质量/缩放/帧率）"""
+        if not self.config.abr_enabled:
+            return self.rate_controller.base_decision()
+        return self.rate_controller.group_decision()
     
     def get_adaptive_quality(self):
-        """根据网络状况自适应调整压缩质量"""
-        if hasattr(self.config, 'network_quality'):
-            # 简化的网络质量评估
-            if self.config.network_quality < 0.5:
-                return 40  # 低质量
-            elif self.config.network_quality < 0.8:
-                return 60  # 中等质量
-            else:
-                return 80  # 高质量
-        return self.config.quality
-    
-    def send_tcp_frame(self, frame_bytes):
-        """通过TCP发送关键信息"""
+        """根据客户端接收报告自适应调整压缩质量"""
+        return self.get_rate_decision().quality
+    
+    def get_video_bitrate(self, decision):
+        """视频编码码率：按自适应码率的质量档位等比例缩放video_bitrate"""
+        bitrate = getattr(self.config, 'video_bitrate', 4_000_000)
+        return int(bitrate * min(1.0, decision.quality / max(1, self.config.quality)) * decision.scale ** 2)
+    
+    def encode_for_udp(self, encoded, decision, width=None):
+        """按分辨率档位和码率决策准备UDP帧，经多分辨率缓存编码（参数与总线一致时直接复用）"""
+        if encoded.frame is not None and decision.scale != 1.0:
+            width = int((width or encoded.frame.shape[1]) * decision.scale)
+        return self.frame_bus.renditions.get(encoded, width, decision.quality)
+    
+    def build_tcp_message(self, frame_bytes, keepalive=False):
+        """每帧通过TCP控制通道发送的消息"""
+        if keepalive:
+            return {'type': 'keepalive'}
+        # 实际视频数据仍通过UDP发送，TCP只发送控制信息
+        return {
+            'type': 'frame_info',
+            'frame_size': len(frame_bytes),
+            'timestamp': time.time(),
+            'frame_count': self.config.frame_count
+        }
+    
+    def send_tcp_frame(self, frame_bytes, keepalive=False):
+        """通过TCP发送关键信息
+
+        发送缓冲已积压的客户端按背压策略跳过本帧，不在发送线程中阻塞等待它，
+        其他客户端(及随后的UDP发送)不受最慢的客户端影响
+        """
         # TCP用于发送控制信息和关键帧确认
+        message = self.build_tcp_message(frame_bytes, keepalive)
+        data = encode_message(message)
         remove_clients = []
-        for client_socket, address in list(self.clients_tcp.items()):
+        for session in self.sessions.connections():
+            flow = session.flow
+            connection = session.connection
             try:
-                # 发送较小的关键信息包
-                info_packet = {
-                    'frame_size': len(frame_bytes),
-                    'timestamp': time.time(),
-                    'frame_count': self.config.frame_count
-                }
-                # 实际视频数据仍通过UDP发送，TCP只发送控制信息
-                client_socket.send(b"FRAME_INFO")  # 通知有新帧
+                with self._tcp_send_lock:
+                    if flow is None:
+                        send_message(connection, message)
+                        continue
+                    # 上一条消息还没写完(写缓冲已满)或内核缓冲积压：按策略丢弃本帧信息
+                    blocked = not session.writer.flush()
+                    if flow.admit(send_backlog(connection), send_capacity(connection), blocked):
+                        session.writer.try_send(data)
             except Exception as e:
-                logger.error(f"TCP发送给 {address} 失败: {e}")
-                remove_clients.append(client_socket)
+                if not self.running:
+                    return  # 服务器已停止，客户端连接已关闭
+                self.send_errors.inc(transport='tcp')
+                logger.error(f"TCP发送给 {session.address} 失败: {e}")
+                remove_clients.append(session)
         
         # 清理断开的TCP客户端
-        for client_socket in remove_clients:
-            if client_socket in self.clients_tcp:
-                del self.clients_tcp[client_socket]
-            try:
-                client_socket.close()
-            except:
-                pass
+        for session in remove_clients:
+            self.close_session(session)
+    
+    def setup_multicast(self, sock):
+        """启用组播时设置UDP发送套接字的TTL、回环与出口网卡"""
+        if not self.multicast_address:
+            return
+        try:
+            configure_sender(sock, ttl=self.config.multicast_ttl, loopback=self.config.multicast_loopback,
+                             interface=self.config.multicast_interface or None)
+            logger.info(f"UDP组播已启用: {self.multicast_address[0]}:{self.multicast_address[1]} "
+                        f"TTL {self.config.multicast_ttl}")
+        except OSError as e:
+            logger.error(f"组播设置失败({e})，仅使用单播")
+            self.multicast_address = None
     
     def stop(self):
         """停止服务器"""
         self.running = False
+        self.frame_bus.clock.stop()  # 唤醒等待节拍的捕获线程
         if self.tcp_socket:
             self.tcp_socket.close()
         if self.udp_socket:
             self.udp_socket.close()
+        for session in self.sessions.sessions(KIND_STREAM):
+            self.close_session(session)
 
 # 当前优化：
 """
@@ -271,14 +652,14 @@ class DualprotocolStreamServer:
    - UDP: 低延迟，适合实时视频数据
 
 2. 网络优化技术：
-   - 自适应压缩质量
+   - 接收端驱动的自适应码率（质量/分辨率/帧率）
    - 帧分片传输
-   - 客户端状态管理
+   - 客户端会话管理（会话ID关联TCP/UDP端点，心跳超时用最小堆移除）
    - 内存缓冲区控制
 
 3. 性能提升措施：
    - 更精细的时间控制
-   - 网络延迟监测
+   - 帧龄监测(捕获到发送准备的流水线延迟，/metrics直方图)
    - 无效客户端清理
-   - 并发处理优化
+   - 并发处理优化（捕获/编码/准备/发送流水线）
 """
\ No newline at end of file
@@ -0,0 +1,138 @@
+# servers/tile_codec.py
+"""图块增量编码
+
+把画面切成固定大小的图块，只编码发生变化的图块。一帧增量数据的格式：
+    帧头  : magic(4s) frame_id(I) flags(B) width(H) height(H) tile_size(H) tile_count(H)
+    图块  : tile_x(H) tile_y(H) length(I) + 图像数据(默认JPEG，与帧编码器一致)，重复tile_count次
+tile_x/tile_y为图块的列/行索引。flags带FLAG_KEYFRAME时包含全部图块
+"""
+import time
+import struct
+import logging
+import cv2
+import numpy as np
+from utils.change_detector import ChangeDetector
+from utils.encoders import OpenCVJpegEncoder
+
+logger = logging.getLogger(__name__)
+
+TILE_MAGIC = b'YCT1'
+FRAME_HEADER = struct.Struct('<4sIBHHHH')
+TILE_HEADER = struct.Struct('<HHI')
+FLAG_KEYFRAME = 0x01
+
+
+def is_tile_frame(payload):
+    """判断payload是否为图块增量帧（否则为完整JPEG）"""
+    return payload[:4] == TILE_MAGIC
+
+
+class TileEncoder:
+    """图块增量编码器（服务端）"""
+
+    def __init__(self, tile_size=64, keyframe_interval=5.0, threshold=8, encoder=None):
+        self.tile_size = tile_size
+        self.encoder = encoder or OpenCVJpegEncoder()
+        self.keyframe_interval = keyframe_interval
+        self._detector = ChangeDetector(block_size=tile_size, sample_step=2, threshold=threshold)
+        self._force_keyframe = True
+        self._last_keyframe = 0.0
+        self._frame_id = 0  # 增量帧连续编号，客户端据此发现丢帧
+        self.keyframes = 0
+        self.tiles_sent = 0
+        self.tiles_total = 0
+
+    def request_keyframe(self):
+        """下一帧发送完整关键帧（新客户端加入或客户端请求时调用）"""
+        self._force_keyframe = True
+
+    @property
+    def keyframe_pending(self):
+        return self._force_keyframe
+
+    def encode(self, frame, quality):
+        """编码一帧，返回 (帧ID, 增量帧字节)；没有任何图块变化时返回None"""
+        h, w = frame.shape[:2]
+        now = time.monotonic()
+        keyframe = self._force_keyframe or now - self._last_keyframe >= self.keyframe_interval
+        if keyframe:
+            # 关键帧发送全部图块，参考帧整体替换
+            self._detector.reset()
+        # 参考帧只写入本帧发送的图块，未发送的图块继续与客户端画布上的内容比较
+        changed, mask = self._detector.detect(frame)
+        if keyframe:
+            self._force_keyframe = False
+            self._last_keyframe = now
+            self.keyframes += 1
+        elif not changed:
+            return None
+
+        size = self.tile_size
+        parts = []
+        for tile_y, tile_x in zip(*np.nonzero(mask)):
+            tile = frame[tile_y * size:(tile_y + 1) * size, tile_x * size:(tile_x + 1) * size]
+            data = self.encoder.encode(tile, quality)
+            parts.append(TILE_HEADER.pack(int(tile_x), int(tile_y), len(data)))
+            parts.append(data)
+
+        tile_count = len(parts) // 2
+        self.tiles_sent += tile_count
+        self.tiles_total += mask.size
+        frame_id = self._frame_id
+        self._frame_id = (self._frame_id + 1) % 65536
+        header = FRAME_HEADER.pack(TILE_MAGIC, frame_id, FLAG_KEYFRAME if keyframe else 0,
+                                   w, h, size, tile_count)
+        return frame_id, header + b''.join(parts)
+
+    @property
+    def stats(self):
+        return {
+            'keyframes': self.keyframes,
+            'tiles_sent': self.tiles_sent,
+            'tile_ratio': self.tiles_sent / self.tiles_total if self.tiles_total else 0.0,
+        }
+
+
+class TileDecoder:
+    """图块增量解码器（客户端），在画布上重建画面"""
+
+    def __init__(self):
+        self.canvas = None
+        self.frames = 0
+        self._next_frame_id = None
+
+    def apply(self, payload):
+        """应用一帧增量数据
+
+        返回 (画布, 是否需要关键帧)；尚未收到关键帧或中间有增量帧丢失时需要关键帧
+        """
+        magic, frame_id, flags, w, h, size, tile_count = FRAME_HEADER.unpack_from(payload, 0)
+        keyframe = bool(flags & FLAG_KEYFRAME)
+        if not keyframe:
+            if self.canvas is None or self.canvas.shape[:2] != (h, w):
+                return self.canvas, True
+            if frame_id != self._next_frame_id:
+                # 丢失的增量帧无法补回，继续叠加但请求关键帧纠正
+                self._next_frame_id = None
+        elif self.canvas is None or self.canvas.shape[:2] != (h, w):
+            self.canvas = np.zeros((h, w, 3), dtype=np.uint8)
+        need_keyframe = not keyframe and self._next_frame_id is None
+
+        offset = FRAME_HEADER.size
+        for _ in range(tile_count):
+            tile_x, tile_y, length = TILE_HEADER.unpack_from(payload, offset)
+            offset += TILE_HEADER.size
+            data = np.frombuffer(payload, dtype=np.uint8, count=length, offset=offset)
+            offset += length
+            tile = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if tile is None:
+                logger.warning(f"图块解码失败: ({tile_x}, {tile_y})")
+                continue
+            y0, x0 = tile_y * size, tile_x * size
+            th, tw = tile.shape[:2]
+            self.canvas[y0:y0 + th, x0:x0 + tw] = tile
+
+        self.frames += 1
+        if not need_keyframe:
+            self._next_frame_id = (frame_id + 1) % 65536
+        return self.canvas, need_keyframe
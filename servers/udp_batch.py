@@ -0,0 +1,179 @@
+# servers/udp_batch.py
+"""UDP批量发送
+
+把一帧的 包 × 客户端 批量提交给内核，按平台选择：
+  sendmmsg  Linux，一次系统调用发送多达max_batch个数据报，iovec直接指向包头缓冲区和帧数据
+  sendmsg   其他Unix，每个数据报一次调用，但包头与负载分散/聚集发送，不拼接
+  sendto    Windows等，每个包拼接一次，再发给各客户端
+"""
+import sys
+import errno
+import select
+import socket
+import struct
+import ctypes
+import logging
+import numpy as np
+from .packetizer import PACKET_HEADER
+
+logger = logging.getLogger(__name__)
+
+
+class _IoVec(ctypes.Structure):
+    # 指针字段用c_size_t声明，便于用numpy结构化数组整列填写
+    _fields_ = [('iov_base', ctypes.c_size_t), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_size_t),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.c_size_t),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_size_t),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+_MMSG_DTYPE = np.dtype(_MMsgHdr)
+_IOVEC_SIZE = ctypes.sizeof(_IoVec)
+
+
+def _load_sendmmsg():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+def sendmmsg_available():
+    return _sendmmsg is not None
+
+
+class BatchSender:
+    """把PacketBatch中的一段包发送给一组地址（包为主序：每个包依次发给所有地址）
+
+    sock可以是socket或asyncio的DatagramTransport；后者需另外传入fileno才能使用sendmmsg。
+    发送缓冲区已满时最多等待wait_writable秒，仍不可写则丢弃本次剩余的数据报(UDP尽力而为)
+    """
+
+    def __init__(self, sock, fileno=None, max_batch=1024, wait_writable=0.1, mode=None):
+        self.sock = sock
+        self.fileno = fileno if fileno is not None else (sock.fileno() if hasattr(sock, 'fileno') else None)
+        self.max_batch = max_batch  # 每次sendmmsg的最大数据报数(内核上限UIO_MAXIOV=1024)
+        self.wait_writable = wait_writable
+        if mode is None:
+            if _sendmmsg is not None and self.fileno is not None:
+                mode = 'sendmmsg'
+            elif hasattr(sock, 'sendmsg'):
+                mode = 'sendmsg'
+            else:
+                mode = 'sendto'
+        self.mode = mode
+        self._sockaddrs = {}  # (ip, port) -> sockaddr_in缓冲区
+        self._msgs = np.zeros(0, dtype=_MMSG_DTYPE)  # 复用的mmsghdr数组
+        self._iov = np.zeros(0, dtype=np.uint64)     # 复用的iovec数组(每个包2个)
+        self.calls = 0     # 发送系统调用次数
+        self.messages = 0  # 发出的数据报数
+        self.dropped = 0   # 发送缓冲区满而丢弃的数据报数
+
+    def send(self, batch, start, stop, addresses):
+        """发送batch[start:stop]给addresses，返回 {发送失败的地址: 异常}"""
+        if start >= stop or not addresses:
+            return {}
+        if self.mode == 'sendmmsg':
+            return self._send_mmsg(batch, start, stop, addresses)
+        failed = {}
+        for index in range(start, stop):
+            packet = batch.parts(index) if self.mode == 'sendmsg' else batch.packet(index)
+            for addr in addresses:
+                if addr in failed:
+                    continue
+                try:
+                    if self.mode == 'sendmsg':
+                        self.sock.sendmsg(packet, (), 0, addr)
+                    else:
+                        self.sock.sendto(packet, addr)
+                    self.messages += 1
+                except OSError as e:
+                    failed[addr] = e
+                self.calls += 1
+        return failed
+
+    def _sockaddr(self, addr):
+        sockaddr = self._sockaddrs.get(addr)
+        if sockaddr is None:
+            raw = (struct.pack('=H', socket.AF_INET) + struct.pack('!H', addr[1]) +
+                   socket.inet_aton(addr[0]) + bytes(8))
+            sockaddr = self._sockaddrs[addr] = ctypes.create_string_buffer(raw, len(raw))
+        return sockaddr
+
+    def _prepare(self, batch, start, stop, addresses):
+        """填写iovec与mmsghdr数组（numpy整列赋值），返回数据报数"""
+        packets = stop - start
+        total = packets * len(addresses)
+        if len(self._msgs) < total:
+            self._msgs = np.zeros(max(total, 2 * len(self._msgs)), dtype=_MMSG_DTYPE)
+        if len(self._iov) < packets * 4:
+            self._iov = np.zeros(max(packets * 4, 2 * len(self._iov)), dtype=np.uint64)
+
+        iov = self._iov[:packets * 4].reshape(packets, 4)
+        iov[:, 0] = batch.header_addrs[start:stop]
+        iov[:, 1] = PACKET_HEADER.size
+        iov[:, 2] = batch.payload_addrs[start:stop]
+        iov[:, 3] = batch.payload_lens[start:stop]
+
+        names = np.array([ctypes.addressof(self._sockaddr(addr)) for addr in addresses], dtype=np.uint64)
+        hdr = self._msgs['msg_hdr'][:total]
+        hdr['msg_name'] = np.tile(names, packets)
+        hdr['msg_namelen'] = 16
+        hdr['msg_iov'] = self._iov.ctypes.data + np.repeat(
+            np.arange(packets, dtype=np.uint64) * (2 * _IOVEC_SIZE), len(addresses))
+        hdr['msg_iovlen'] = 2
+        return total
+
+    def _send_mmsg(self, batch, start, stop, addresses):
+        total = self._prepare(batch, start, stop, addresses)
+        addr_count = len(addresses)
+        failed = {}
+        base = self._msgs.ctypes.data
+        sent = 0
+        while sent < total:
+            count = min(self.max_batch, total - sent)
+            result = _sendmmsg(self.fileno, base + sent * _MMSG_DTYPE.itemsize, count, 0)
+            self.calls += 1
+            if result > 0:
+                sent += result
+                self.messages += result
+                continue
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                if self.wait_writable and select.select([], [self.fileno], [], self.wait_writable)[1]:
+                    continue
+                self.dropped += total - sent
+                break
+            # 失败的是第sent个数据报：记录其地址，跳过它继续发送
+            addr = addresses[sent % addr_count]
+            failed.setdefault(addr, OSError(err, f"sendmmsg: {errno.errorcode.get(err, err)}"))
+            sent += 1
+        return failed
+
+    @property
+    def stats(self):
+        return {'mode': self.mode, 'calls': self.calls, 'messages': self.messages, 'dropped': self.dropped}
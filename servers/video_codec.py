@@ -0,0 +1,195 @@
+# servers/video_codec.py
+"""视频(帧间)编码：H.264 / VP8，依赖PyAV(可选)
+
+连续画面只发送与参考帧的差异，码率远低于逐帧JPEG。一帧视频数据的格式：
+    帧头  : magic(4s) frame_id(I) flags(B) codec(B) width(H) height(H)
+    数据  : 编码器输出的一帧压缩数据(H.264为Annex-B字节流)
+flags带FLAG_KEYFRAME时为关键帧(IDR)，客户端加入、请求关键帧或报告丢包时按需插入。
+编码使用低延迟参数：不使用B帧、无前瞻缓冲，每输入一帧立即输出一帧
+"""
+import time
+import struct
+import logging
+from fractions import Fraction
+
+try:
+    import av
+except ImportError:  # 可选依赖
+    av = None
+
+from utils.encoders import EncoderUnavailable
+
+logger = logging.getLogger(__name__)
+
+VIDEO_MAGIC = b'YCV1'
+FRAME_HEADER = struct.Struct('<4sIBBHH')
+FLAG_KEYFRAME = 0x01
+
+# 名称 -> (帧头中的编号, 编码器, 解码器, 低延迟参数)
+CODECS = {
+    'h264': (1, 'libx264', 'h264', {'preset': 'ultrafast', 'tune': 'zerolatency'}),
+    'vp8': (2, 'libvpx', 'vp8', {'deadline': 'realtime', 'cpu-used': '8', 'lag-in-frames': '0',
+                                 'error-resilient': '1'}),
+}
+_CODEC_NAMES = {codec_id: name for name, (codec_id, _, _, _) in CODECS.items()}
+
+
+def is_video_frame(payload):
+    """判断payload是否为视频编码帧"""
+    return payload[:4] == VIDEO_MAGIC
+
+
+def video_available(codec='h264'):
+    """PyAV及对应编码器是否可用"""
+    if av is None or codec not in CODECS:
+        return False
+    try:
+        av.codec.Codec(CODECS[codec][1], 'w')
+        return True
+    except Exception:
+        return False
+
+
+def _keyframe_type():
+    picture_type = getattr(av.video.frame, 'PictureType', None)
+    return picture_type.I if picture_type is not None else 'I'
+
+
+class VideoEncoder:
+    """帧间视频编码器（服务端）"""
+
+    def __init__(self, codec='h264', gop=60, bitrate=4_000_000, fps=30, min_keyframe_interval=0.5):
+        if not video_available(codec):
+            raise EncoderUnavailable(f"PyAV或{codec}编码器不可用")
+        self.codec = codec
+        self.gop = gop  # 关键帧间隔(帧)
+        self.bitrate = bitrate
+        self.fps = fps
+        self.min_keyframe_interval = min_keyframe_interval  # 按需关键帧的最小间隔(秒)，避免多个客户端同时请求时连续发送
+        self._context = None
+        self._size = None
+        self._pts = 0
+        self._frame_id = 0
+        self._force_keyframe = True
+        self._last_keyframe = 0.0
+        self.keyframes = 0
+        self.frames = 0
+        self.bytes_out = 0
+
+    def request_keyframe(self):
+        """下一帧(不早于min_keyframe_interval)编码为关键帧"""
+        self._force_keyframe = True
+
+    @property
+    def keyframe_pending(self):
+        return self._force_keyframe
+
+    def _open(self, width, height, bitrate):
+        codec_id, encoder_name, _, options = CODECS[self.codec]
+        context = av.CodecContext.create(encoder_name, 'w')
+        context.width = width
+        context.height = height
+        context.pix_fmt = 'yuv420p'
+        context.time_base = Fraction(1, self.fps)
+        context.framerate = Fraction(self.fps, 1)
+        context.bit_rate = bitrate
+        context.gop_size = self.gop
+        context.max_b_frames = 0
+        context.options = dict(options)
+        self._context = context
+        self._size = (width, height)
+        self.bitrate = bitrate
+        self._pts = 0
+        self._force_keyframe = True  # 新的编码器从关键帧开始
+        logger.info(f"视频编码器 {encoder_name} {width}x{height} {bitrate // 1000}kbps GOP {self.gop}")
+
+    def encode(self, frame, bitrate=None):
+        """编码一帧BGR画面，返回 (帧ID, 视频帧字节)；编码器暂未输出时返回None
+
+        分辨率或码率改变时重建编码器(从关键帧重新开始)
+        """
+        h, w = frame.shape[:2]
+        width, height = w & ~1, h & ~1  # yuv420p要求宽高为偶数
+        bitrate = bitrate or self.bitrate
+        if self._context is None or self._size != (width, height) or bitrate != self.bitrate:
+            self._open(width, height, bitrate)
+        if (width, height) != (w, h):
+            frame = frame[:height, :width]
+
+        video_frame = av.VideoFrame.from_ndarray(frame, format='bgr24')
+        video_frame.pts = self._pts
+        self._pts += 1
+        now = time.monotonic()
+        if self._force_keyframe and now - self._last_keyframe >= self.min_keyframe_interval:
+            video_frame.pict_type = _keyframe_type()
+            self._force_keyframe = False
+
+        packets = self._context.encode(video_frame)
+        if not packets:
+            return None
+        data = b''.join(bytes(packet) for packet in packets)
+        keyframe = any(packet.is_keyframe for packet in packets)
+        if keyframe:
+            self._last_keyframe = now
+            self.keyframes += 1
+        self.frames += 1
+        self.bytes_out += len(data)
+
+        frame_id = self._frame_id
+        self._frame_id = (self._frame_id + 1) & 0xFFFFFFFF
+        header = FRAME_HEADER.pack(VIDEO_MAGIC, frame_id, FLAG_KEYFRAME if keyframe else 0,
+                                   CODECS[self.codec][0], width, height)
+        return frame_id, header + data
+
+    @property
+    def stats(self):
+        return {
+            'codec': self.codec,
+            'frames': self.frames,
+            'keyframes': self.keyframes,
+            'avg_frame_bytes': self.bytes_out / self.frames if self.frames else 0.0,
+        }
+
+
+class VideoDecoder:
+    """视频解码器（客户端）"""
+
+    def __init__(self):
+        if av is None:
+            raise EncoderUnavailable("未安装PyAV，无法解码视频帧")
+        self._context = None
+        self._codec_id = None
+        self._next_frame_id = None
+        self.frames = 0
+
+    def apply(self, payload):
+        """解码一帧视频数据
+
+        返回 (BGR画面或None, 是否需要关键帧)；
+        中间有帧丢失时参考帧已损坏，丢弃后续增量帧直到收到关键帧
+        """
+        magic, frame_id, flags, codec_id, width, height = FRAME_HEADER.unpack_from(payload, 0)
+        keyframe = bool(flags & FLAG_KEYFRAME)
+        if keyframe:
+            if self._context is None or codec_id != self._codec_id:
+                name = _CODEC_NAMES.get(codec_id)
+                if name is None:
+                    logger.warning(f"未知的视频编码: {codec_id}")
+                    return None, False
+                self._context = av.CodecContext.create(CODECS[name][2], 'r')
+                self._codec_id = codec_id
+        elif self._context is None or frame_id != self._next_frame_id:
+            self._next_frame_id = None
+            return None, True
+
+        try:
+            frames = self._context.decode(av.Packet(payload[FRAME_HEADER.size:]))
+        except Exception as e:
+            logger.warning(f"视频帧解码失败: {e}")
+            self._next_frame_id = None
+            return None, True
+        self._next_frame_id = (frame_id + 1) & 0xFFFFFFFF
+        if not frames:
+            return None, False
+        self.frames += 1
+        return frames[-1].to_ndarray(format='bgr24'), False
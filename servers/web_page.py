@@ -0,0 +1,362 @@
+# servers/web_page.py
+"""网页端共用的页面模板与MJPEG分段格式
+
+Flask版(TCPServer)与asyncio版(AsyncHTTPServer)两种HTTP后端共用，保证页面与流格式一致
+"""
+import time
+from jinja2 import Environment
+
+MJPEG_BOUNDARY = 'frame'
+MJPEG_CONTENT_TYPE = f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}'
+
+INDEX_TEMPLATE = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
+    <title>云窗---云上之窗，让世界仰望你的美</title>
+    <style>
+        * { margin:0; padding:0; box-sizing:border-box; }
+        body { 
+            background:#0f0f1b; 
+            color:#e0e0ff; 
+            font-family:system-ui,-apple-system,Segoe UI,Roboto,sans-serif; 
+            padding:12px; 
+            max-width:100%;
+            margin:0 auto;
+        }
+        header { text-align:center; padding:15px 0; }
+        h1 { font-size:1.9em; margin:8px 0; color:#4da6ff; text-shadow:0 0 10px rgba(77,166,255,0.5); }
+        .container { 
+            background:#1a1a2e; 
+            border-radius:16px; 
+            overflow:hidden; 
+            box-shadow:0 10px 30px rgba(0,0,0,0.7);
+            position:relative;
+            max-width:100vw;
+            margin:0 auto;
+        }
+        #video-container {
+            position:relative;
+            width:100%;
+            overflow:hidden;
+            /* 默认适配模式 */
+            max-width:100%;
+            margin:0 auto;
+        }
+        #video { 
+            width:100%; 
+            display:block; 
+            background:#000; 
+            object-fit: contain; /* 保持宽高比 */
+            max-width:100%;
+            max-height:80vh;
+            margin:0 auto;
+        }
+        /* 拉伸模式 */
+        .stretch #video {
+            object-fit: fill;
+            width:100%;
+            height: 80vh;
+        }
+        /* 填充模式 */
+        .fill #video {
+            object-fit: cover;
+            width:100%;
+            height: 80vh;
+        }
+        .tip { 
+            background:#252540; 
+            padding:12px; 
+            border-radius:10px; 
+            margin:15px 0; 
+            font-size:0.95em; 
+            line-height:1.5;
+            text-align: center;
+        }
+        .status { 
+            text-align:center; 
+            padding:8px; 
+            color:#aaa; 
+            font-size:0.9em; 
+            background:#252540;
+            border-radius:8px;
+            margin-bottom:10px;
+        }
+        .controls {
+            display:flex;
+            justify-content: center;
+            gap:10px;
+            padding:10px;
+            flex-wrap:wrap;
+        }
+        .control-btn {
+            background:#313244;
+            color:white;
+            border:none;
+            padding:8px 15px;
+            border-radius:20px;
+            cursor:pointer;
+            font-size:0.9em;
+        }
+        .control-btn.active {
+            background:#4da6ff;
+            color:white;
+        }
+        .footer { 
+            text-align:center; 
+            margin-top:10px; 
+            color:#666; 
+            font-size:0.85em; 
+            padding:10px 0;
+        }
+        @media (max-width: 768px) {
+            body { padding:8px; }
+            h1 { font-size:1.6em; }
+            .container { border-radius:12px; }
+        }
+        @media (prefers-color-scheme: light) {
+            body { background:#f5f7ff; color:#222; }
+            .container { background:#ffffff; box-shadow:0 5px 20px rgba(0,0,0,0.1); }
+            .tip { background:#f0f4ff; }
+            .status { background:#e8eeff; }
+        }
+        
+        /* 流客户端指示器 */
+        .stream-indicator {
+            position: absolute;
+            top: 10px;
+            right: 10px;
+            background: #4da6ff;
+            color: white;
+            padding: 5px 10px;
+            border-radius: 15px;
+            font-size: 0.8em;
+            z-index: 10;
+        }
+    </style>
+</head>
+<body>
+    <header>
+        <h1>📱 云窗-屏幕中转</h1>
+        <div class="status">• 计算机和手机需在同一WiFi下 • 点击画面可全屏显示\n采用TCP+UDP双协议传输</div>
+    </header>
+    
+    <div class="container">
+        <div id="video-container">
+            <div class="stream-indicator">流端口: {{ stream_port }}</div>
+            <img id="video" alt="屏幕流">
+        </div>
+        
+        <div class="controls">
+            <button class="control-btn active" onclick="setAdaptMode('contain')">适应屏幕</button>
+            <button class="control-btn" onclick="setAdaptMode('fill')">填充屏幕</button>
+            <button class="control-btn" onclick="setAdaptMode('cover')">覆盖屏幕</button>
+        </div>
+    </div>
+    
+    <div class="tip">
+        🔒 安全: 仅限局域网使用 | 延迟约{% if websocket_enabled %}0.1{% else %}0.8{% endif %}秒 | 
+        当前共享: <b>{{ window_title }}</b> | 尺寸: <span id="resolution">加载中...</span>
+        {% if win_api_available %}
+        <br><span style="color: #a6e3a1;">✅ 已启用Windows API后台捕获</span>
+        {% else %}
+        <br><span style="color: #f38ba8;">⚠️ 缺少pywin32，后台捕获受限，联系开发者</span>
+        {% endif %}
+    </div>
+    
+    <div class="footer">
+        Python {{ server_name }} • TCP: {{ ip }}:{{ tcp_port }} | 流: {{ ip }}:{{ stream_port }} • {{ time }}
+    </div>
+
+    <script>
+        let video = document.getElementById('video');
+        const container = document.getElementById('video-container');
+        const resolutionSpan = document.getElementById('resolution');
+        
+        // 视口物理像素宽度，服务端据此选择分辨率档位
+        function viewportWidth() {
+            return Math.round(container.clientWidth * (window.devicePixelRatio || 1));
+        }
+        
+        function feedUrl() {
+            return "{{ video_feed_url }}?w=" + viewportWidth() + '&t=' + new Date().getTime();
+        }
+        
+        // WebSocket传输：二进制帧解码到canvas并逐帧确认，服务端据此跳过浏览器跟不上的帧
+        const useWebSocket = {{ 'true' if websocket_enabled else 'false' }} && 'WebSocket' in window && 'createImageBitmap' in window;
+        const FRAME_HEADER_SIZE = 13;  // 类型(1) + 帧序号(4) + 捕获时间戳(8)
+        let socket = null;
+        
+        function sendViewport() {
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                socket.send(JSON.stringify({ type: 'viewport', width: viewportWidth() }));
+            }
+        }
+        
+        function connectWebSocket() {
+            const scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+            const ws = new WebSocket(scheme + location.host + '/ws?w=' + viewportWidth());
+            ws.binaryType = 'arraybuffer';
+            socket = ws;
+            const context = video.getContext('2d');
+            let pending = null;
+            let drawing = false;
+            
+            // 只绘制最新一帧：解码期间到达的旧帧直接被覆盖，随下一次确认一并确认
+            async function drawLatest() {
+                drawing = true;
+                while (pending) {
+                    const buffer = pending;
+                    pending = null;
+                    const header = new DataView(buffer, 0, FRAME_HEADER_SIZE);
+                    const seq = header.getUint32(1);
+                    const timestamp = header.getFloat64(5);
+                    const start = performance.now();
+                    try {
+                        // 不指定类型：createImageBitmap按内容识别JPEG/WebP/PNG
+                        const blob = new Blob([new Uint8Array(buffer, FRAME_HEADER_SIZE)]);
+                        const bitmap = await createImageBitmap(blob);
+                        if (video.width !== bitmap.width || video.height !== bitmap.height) {
+                            video.width = bitmap.width;
+                            video.height = bitmap.height;
+                            resolutionSpan.textContent = bitmap.width + '×' + bitmap.height;
+                        }
+                        context.drawImage(bitmap, 0, 0);
+                        bitmap.close();
+                    } catch (e) {
+                        console.log('帧解码失败:', e);
+                    }
+                    if (ws.readyState === WebSocket.OPEN) {
+                        ws.send(JSON.stringify({ type: 'ack', seq: seq, t: timestamp, decode_ms: performance.now() - start }));
+                    }
+                }
+                drawing = false;
+            }
+            
+            ws.onmessage = (event) => {
+                if (!(event.data instanceof ArrayBuffer)) return;
+                pending = event.data;
+                if (!drawing) drawLatest();
+            };
+            ws.onclose = () => setTimeout(connectWebSocket, 2000);
+        }
+        
+        if (useWebSocket) {
+            const canvas = document.createElement('canvas');
+            canvas.id = 'video';
+            video.replaceWith(canvas);
+            video = canvas;
+            connectWebSocket();
+        } else {
+            video.src = feedUrl();
+        }
+        
+        // 默认适应模式
+        video.style.objectFit = 'contain';
+        
+        // 设置适配模式
+        function setAdaptMode(mode) {
+            const buttons = document.querySelectorAll('.control-btn');
+            buttons.forEach(btn => btn.classList.remove('active'));
+            event.target.classList.add('active');
+            
+            switch(mode) {
+                case 'contain':
+                    video.style.objectFit = 'contain';
+                    video.style.width = '100%';
+                    video.style.height = 'auto';
+                    break;
+                case 'fill':
+                    video.style.objectFit = 'fill';
+                    video.style.width = '100%';
+                    video.style.height = '80vh';
+                    break;
+                case 'cover':
+                    video.style.objectFit = 'cover';
+                    video.style.width = '100%';
+                    video.style.height = '80vh';
+                    break;
+            }
+        }
+        
+        // 监听视频元数据加载事件
+        video.addEventListener('loadedmetadata', function() {
+            resolutionSpan.textContent = this.videoWidth + '×' + this.videoHeight;
+        });
+        
+        // 监听视频尺寸变化
+        video.addEventListener('resize', function() {
+            resolutionSpan.textContent = this.videoWidth + '×' + this.videoHeight;
+        });
+        
+        // 错误处理(MJPEG)
+        video.onerror = () => {
+            setTimeout(() => { 
+                video.src = feedUrl(); 
+            }, 2000);
+        };
+        
+        // 点击进入全屏
+        video.addEventListener('click', () => {
+            if (video.requestFullscreen) video.requestFullscreen();
+            else if (video.webkitRequestFullscreen) video.webkitRequestFullscreen();
+            else if (video.msRequestFullscreen) video.msRequestFullscreen();
+        });
+        
+        // 防止页面缩放
+        document.addEventListener('touchmove', e => {
+            if (e.scale !== 1) e.preventDefault();
+        }, { passive: false });
+        
+        // 检测设备方向
+        window.addEventListener('orientationchange', function() {
+            setTimeout(function() {
+                // 重新计算容器尺寸
+                const viewport = document.querySelector('meta[name=viewport]');
+                viewport.setAttribute('content', 'width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no');
+                // 视口宽度变化后重新选择分辨率档位
+                if (useWebSocket) sendViewport();
+                else video.src = feedUrl();
+            }, 300);
+        }, false);
+        
+        // 定期检查连接状态
+        setInterval(() => {
+            fetch('/check_connection', { method: 'post' })
+                .catch(e => console.log('连接检查失败:', e));
+        }, 5000);
+    </script>
+</body>
+</html>
+'''
+
+# 与Flask的render_template_string一致：字符串模板默认开启自动转义
+_environment = Environment(autoescape=True)
+_template = None
+
+
+def mjpeg_part(data, content_type='image/jpeg'):
+    """把一帧图像包装成multipart/x-mixed-replace的一个分段(content_type随编码格式)"""
+    return (b'--' + MJPEG_BOUNDARY.encode() + b'\r\nContent-Type: ' + content_type.encode() + b'\r\n\r\n'
+            + data + b'\r\n')
+
+
+def render_index(config, capture_instance, video_feed_url='/video_feed', server_name='Flask',
+                 websocket_enabled=False):
+    """渲染首页HTML；websocket_enabled时页面优先使用/ws传输，否则使用MJPEG"""
+    global _template
+    if _template is None:
+        _template = _environment.from_string(INDEX_TEMPLATE)
+    return _template.render(
+        window_title=config.window_title,
+        ip=config.local_ip,
+        tcp_port=config.tcp_port,
+        stream_port=config.stream_port,
+        time=time.strftime('%H:%M'),
+        win_api_available=capture_instance.win_api_available,
+        video_feed_url=video_feed_url,
+        server_name=server_name,
+        websocket_enabled=websocket_enabled,
+    )
@@ -0,0 +1,107 @@
+# servers/websocket.py
+"""浏览器观看者的WebSocket传输(RFC 6455最小实现)
+
+握手与帧格式只实现本项目需要的部分：服务器 → 浏览器发送二进制帧消息，浏览器 → 服务器发送JSON文本消息。
+  服务器 → 浏览器(二进制)
+    FRAME_HEADER(类型1字节, 帧序号4字节, 捕获时间戳8字节) + 图像数据(JPEG/WebP/PNG，随帧编码器)
+  浏览器 → 服务器(文本JSON)
+    {"type": "ack", "seq": 12, "t": 1234.5, "decode_ms": 3.2}  已显示到seq(含)为止的帧，t原样回传帧时间戳
+    {"type": "viewport", "width": 390}                         显示宽度，服务端据此选择分辨率档位
+"""
+import base64
+import hashlib
+import os
+import struct
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# 二进制帧消息头：类型、帧序号、捕获时间戳(服务器time.monotonic()毫秒)
+FRAME_HEADER = struct.Struct('!BId')
+MSG_FRAME = 1
+
+MAX_MESSAGE_SIZE = 64 * 1024  # 浏览器只发送很短的JSON消息
+
+
+def accept_key(key):
+    """根据Sec-WebSocket-Key计算Sec-WebSocket-Accept"""
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def handshake_response(key):
+    return (
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n"
+    ).encode('latin-1')
+
+
+def encode_frame(opcode, payload, mask=False):
+    """编码一个完整(FIN)的WebSocket帧；服务器发送不加掩码，客户端必须加掩码"""
+    length = len(payload)
+    first = 0x80 | opcode
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack('!BB', first, mask_bit | length)
+    elif length < 65536:
+        header = struct.pack('!BBH', first, mask_bit | 126, length)
+    else:
+        header = struct.pack('!BBQ', first, mask_bit | 127, length)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + _apply_mask(payload, key)
+
+
+def encode_video_frame(seq, timestamp, data):
+    """编码一帧画面为二进制WebSocket消息，同一帧同一档位的所有观看者共用"""
+    return encode_frame(OP_BINARY, FRAME_HEADER.pack(MSG_FRAME, seq & 0xFFFFFFFF, timestamp * 1000) + data)
+
+
+def _apply_mask(payload, key):
+    if not payload:
+        return payload
+    length = len(payload)
+    repeated = (key * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(length, 'big')
+
+
+async def read_message(reader, max_size=MAX_MESSAGE_SIZE):
+    """从asyncio.StreamReader读取一条完整消息，返回(opcode, payload)
+
+    控制帧(close/ping/pong)可能插在分片消息中间，单独返回
+    """
+    opcode = None
+    chunks = []
+    size = 0
+    while True:
+        first, second = await reader.readexactly(2)
+        fin = first & 0x80
+        frame_opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        size += length
+        if size > max_size:
+            raise ValueError(f"WebSocket消息过大: {size}字节")
+        key = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if key is not None:
+            payload = _apply_mask(payload, key)
+        if frame_opcode >= OP_CLOSE:
+            return frame_opcode, payload
+        if frame_opcode != OP_CONTINUATION:
+            opcode = frame_opcode
+        chunks.append(payload)
+        if fin:
+            return opcode, b''.join(chunks)
@@ -0,0 +1,61 @@
+# tests/test_buffer_pool.py
+"""缓冲池复用的回归测试：仍被持有的帧(及其视图)不会被复用覆盖"""
+import gc
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.preprocess import BufferPool, FramePreprocessor
+from servers.packetizer import Packetizer, PACKET_HEADER
+
+
+def test_held_buffer_is_not_reused():
+    pool = BufferPool()
+    held = pool.acquire((4, 4, 3))
+    held[:] = 7
+    for value in (1, 2):
+        other = pool.acquire((4, 4, 3))
+        assert not np.shares_memory(held, other)
+        other[:] = value
+    assert (held == 7).all()
+
+
+def test_views_keep_buffer_leased():
+    pool = BufferPool()
+    frame = pool.acquire((8, 8, 3))
+    frame[:] = 9
+    tile = frame[2:6, 2:6]  # 图块编码等只持有切片
+    del frame
+    gc.collect()
+    other = pool.acquire((8, 8, 3))
+    other[:] = 0
+    assert (tile == 9).all()
+
+
+def test_released_buffer_is_reused():
+    pool = BufferPool()
+    pool.acquire((16, 16, 3))  # 返回值立即丢弃
+    gc.collect()
+    pool.acquire((16, 16, 3))
+    assert pool.allocations == 1 and pool.reuses == 1
+
+
+def test_preprocessor_snapshot_survives_later_frames():
+    preprocessor = FramePreprocessor()
+    first = preprocessor.process(np.full((32, 48, 4), 50, dtype=np.uint8))
+    for value in (100, 150):
+        preprocessor.process(np.full((32, 48, 4), value, dtype=np.uint8))
+    assert (first == 50).all()
+
+
+def test_packet_headers_of_held_batch_are_not_overwritten():
+    packetizer = Packetizer(mtu=1200)
+    held = packetizer.packetize_batch(b'a' * 5000, frame_id=1)
+    expected = [held.packet(i) for i in range(held.count)]
+    for frame_id in (2, 3):
+        packetizer.packetize_batch(b'b' * 5000, frame_id=frame_id)
+    assert [held.packet(i) for i in range(held.count)] == expected
+    assert PACKET_HEADER.unpack_from(held.packet(0))[3] == 1
@@ -0,0 +1,76 @@
+# tests/test_rate_controller.py
+"""码率阶梯重建(质量/帧率滑块变化)后客户端级别的回归测试"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from servers.rate_controller import AdaptiveBitrateController
+
+
+class _Config:
+    def __init__(self, quality=80, fps=30):
+        self.quality = quality
+        self.fps = fps
+        self.min_quality = 30
+        self.target_bitrate = 10 ** 9
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _controller_at_last_rung():
+    config = _Config(quality=80, fps=30)
+    clock = _Clock()
+    controller = AdaptiveBitrateController(config, clock=clock)
+    congested = {'loss': 0.5}
+    while True:
+        decision = controller.on_report('client', congested)
+        controller.observe_frame(50_000, decision)
+        clock.now += 1.0
+        if controller._clients['client'].level == len(controller.rungs()) - 1:
+            return config, controller, clock
+
+
+def test_shrinking_ladder_clamps_client_levels():
+    config, controller, clock = _controller_at_last_rung()
+    long_length = len(controller.rungs())
+
+    config.quality = 40  # GUI质量滑块调低：阶梯变短
+    assert len(controller.rungs()) < long_length
+    last = controller.rungs()[-1]
+    assert controller.group_decision() is last
+    assert controller.decision('client') is last
+    assert controller.on_report('client', {'loss': 0.0}) in controller.rungs()
+    assert controller.metrics()['clients']['client']['level'] < len(controller.rungs())
+
+
+def test_fps_change_discards_frame_size_estimates():
+    config, controller, clock = _controller_at_last_rung()
+    assert controller._bytes_per_frame
+
+    config.fps = 10  # 帧率滑块运行中生效：阶梯按新帧率重建
+    controller.group_decision()
+    assert controller._bytes_per_frame == {}
+    clock.now += 10.0
+    assert controller.on_report('client', {'loss': 0.0}) in controller.rungs()
+
+
+def test_metrics_are_exported_per_client():
+    from utils.metrics import MetricsRegistry
+    config, controller, clock = _controller_at_last_rung()
+    controller.remove_client('client')
+    controller.on_report(('10.0.0.2', 5000), {'loss': 0.5})
+    metrics = MetricsRegistry()
+    controller.register_metrics(metrics)
+    text = metrics.render()
+    decision = controller.decision(('10.0.0.2', 5000))
+    assert f'screenshare_abr_quality{{client="10.0.0.2:5000"}} {decision.quality}' in text
+    assert 'screenshare_abr_level{client="10.0.0.2:5000"}' in text
+    assert f'screenshare_abr_backoffs_total {controller.backoffs}' in text
+    assert controller.base_decision() is controller.rungs()[0]
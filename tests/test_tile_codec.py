@@ -0,0 +1,47 @@
+# tests/test_tile_codec.py
+"""图块增量编码的回归测试：缓慢渐变的图块不会因相邻图块频繁变化而永远不被发送"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from servers.tile_codec import TileEncoder, TileDecoder, FRAME_HEADER, TILE_HEADER
+
+
+def _sent_tiles(payload):
+    tile_count = FRAME_HEADER.unpack_from(payload, 0)[-1]
+    offset = FRAME_HEADER.size
+    tiles = set()
+    for _ in range(tile_count):
+        tile_x, tile_y, length = TILE_HEADER.unpack_from(payload, offset)
+        offset += TILE_HEADER.size + length
+        tiles.add((tile_x, tile_y))
+    return tiles
+
+
+def test_fading_tile_next_to_blinking_tile_is_sent():
+    encoder = TileEncoder(tile_size=64, keyframe_interval=3600, threshold=8)
+    decoder = TileDecoder()
+    frame = np.zeros((64, 128, 3), dtype=np.uint8)
+    frame[:, :64] = 100
+    decoder.apply(encoder.encode(frame, 90)[1])
+
+    fading_sent = 0
+    for i in range(1, 21):
+        frame = frame.copy()
+        frame[:, :64] = 100 + 4 * i       # 左侧图块每帧只变亮4，低于阈值
+        frame[:, 64:] = 255 if i % 2 else 0  # 右侧图块每帧闪烁
+        result = encoder.encode(frame, 90)
+        assert result is not None
+        tiles = _sent_tiles(result[1])
+        assert (1, 0) in tiles
+        if (0, 0) in tiles:
+            fading_sent += 1
+        canvas, need_keyframe = decoder.apply(result[1])
+        assert not need_keyframe
+        # 客户端画布与实际画面的差距不超过检测阈值(另加JPEG误差)
+        assert abs(int(canvas[:, :64].mean()) - (100 + 4 * i)) <= 8 + 4
+
+    assert fading_sent >= 5
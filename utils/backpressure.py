@@ -0,0 +1,134 @@
+# utils/backpressure.py
+import sys
+import time
+import socket
+import struct
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # Windows
+    fcntl = termios = None
+
+POLICY_LATEST = 'latest-only'  # 拥塞时丢弃本帧，缓冲排空后发送当时最新的一帧
+POLICY_SKIP = 'skip'           # 拥塞时每发送一帧跳过随后的N帧(固定降帧率)
+POLICY_DOWNGRADE = 'downgrade'  # 拥塞时丢弃本帧并降低一档分辨率，持续畅通后升回
+POLICIES = (POLICY_LATEST, POLICY_SKIP, POLICY_DOWNGRADE)
+
+_SO_NWRITE = 0x1024  # macOS: 发送缓冲中未发出的字节数
+
+
+def send_capacity(sock):
+    """套接字发送缓冲区大小(字节)，无法读取时返回None"""
+    try:
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    except (OSError, AttributeError):
+        return None
+
+
+def send_backlog(sock):
+    """套接字发送缓冲中已写入但尚未被对端确认的字节数；无法读取时(Windows或套接字已关闭)返回None"""
+    if sock is None:
+        return None
+    try:
+        if termios is not None and hasattr(termios, 'TIOCOUTQ') and sys.platform.startswith('linux'):
+            # Linux的SIOCOUTQ与TIOCOUTQ同值：未确认 + 未发送的字节
+            return struct.unpack('i', fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b'\0' * 4))[0]
+        if sys.platform == 'darwin':
+            return sock.getsockopt(socket.SOL_SOCKET, _SO_NWRITE)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ClientFlowControl:
+    """单个客户端的发送背压：每帧发送前按发送缓冲占用判断是否拥塞，按策略决定发送或丢弃
+
+    缓冲占用超过limit字节视为拥塞，写入的数据不会在内核缓冲中越积越多，
+    慢速客户端收到的总是较新的帧，也不会阻塞给其他客户端发送的线程。
+    无法读取缓冲占用的平台按上一次写入的耗时判断：超过write_timeout秒视为拥塞
+    """
+
+    def __init__(self, policy=POLICY_LATEST, limit=256 * 1024, skip=2, recover=2.0,
+                 write_timeout=0.05, max_level=3):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的背压策略: {policy}")
+        self.policy = policy
+        self.limit = limit
+        self.skip = skip                  # skip策略下拥塞时每发送一帧跳过的帧数
+        self.recover = recover            # downgrade策略下持续畅通多少秒后升回一档
+        self.write_timeout = write_timeout
+        self.max_level = max_level
+        self.level = 0                    # downgrade策略下当前降低的档位数
+        self.sent = 0
+        self.dropped = 0
+        self.backlog = 0                  # 最近一次读取的发送缓冲占用(字节)
+        self._write_time = 0.0
+        self._to_skip = 0
+        self._clear_since = None
+        self._last_downgrade = 0.0
+
+    def congested(self, backlog=None, capacity=None, blocked=False):
+        """capacity为发送缓冲区大小：写满之前阻塞写入就会等待，上限不超过其一半；
+        blocked为上一次非阻塞写入尚未写完
+        """
+        if blocked:
+            return True
+        if backlog is None:
+            return self._write_time > self.write_timeout
+        self.backlog = backlog
+        limit = self.limit if not capacity else min(self.limit, capacity // 2)
+        return backlog > limit
+
+    def admit(self, backlog=None, capacity=None, blocked=False):
+        """本帧是否发送给该客户端；不发送时计入丢帧"""
+        now = time.monotonic()
+        congested = self.congested(backlog, capacity, blocked)
+        if self.policy == POLICY_SKIP:
+            if self._to_skip > 0 and congested:
+                self._to_skip -= 1
+                return self._drop()
+            # 超过上限两倍时即使轮到也不发送，避免固定降帧率仍跟不上
+            if blocked or (backlog is not None and backlog > 2 * self.limit):
+                return self._drop()
+            self._to_skip = self.skip if congested else 0
+        elif congested:
+            self._clear_since = None
+            # 降档后要等缓冲排空才能看到效果，连续拥塞时不逐帧降到底
+            if (self.policy == POLICY_DOWNGRADE and self.level < self.max_level
+                    and now - self._last_downgrade >= self.recover / 4):
+                self.level += 1
+                self._last_downgrade = now
+            return self._drop()
+        elif self.policy == POLICY_DOWNGRADE and self.level:
+            if self._clear_since is None:
+                self._clear_since = now
+            elif now - self._clear_since >= self.recover:
+                self.level -= 1
+                self._clear_since = now
+        self.sent += 1
+        return True
+
+    def record_write(self, seconds):
+        """记录一次写入的耗时（阻塞写入时即写入完成所需的时间）"""
+        self._write_time = seconds
+
+    def _drop(self):
+        self.dropped += 1
+        return False
+
+    @property
+    def stats(self):
+        return {'policy': self.policy, 'sent': self.sent, 'dropped': self.dropped,
+                'level': self.level, 'backlog': self.backlog}
+
+
+def flow_control_from_config(config):
+    """按配置创建客户端背压控制，backpressure_policy为None时返回None(不限制，阻塞写入)"""
+    policy = getattr(config, 'backpressure_policy', POLICY_LATEST)
+    if not policy:
+        return None
+    return ClientFlowControl(
+        policy=policy,
+        limit=getattr(config, 'backpressure_limit', 256 * 1024),
+        skip=getattr(config, 'backpressure_skip', 2))
@@ -0,0 +1,191 @@
+# utils/capture_backends.py
+import logging
+import threading
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameRing:
+    """预分配的帧缓冲环
+
+    每次取出下一块缓冲区，尺寸变化时才重新分配；
+    返回的数组会在size次取用后被复用，需要长期保存的调用方应自行copy
+    """
+
+    def __init__(self, size=3):
+        self.size = size
+        self._buffers = []
+        self._shape = None
+        self._index = 0
+        self.allocations = 0  # 累计分配次数
+
+    def next(self, shape, dtype=np.uint8):
+        if shape != self._shape:
+            self._buffers = [np.empty(shape, dtype=dtype) for _ in range(self.size)]
+            self._shape = shape
+            self._index = 0
+            self.allocations += self.size
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % self.size
+        return buffer
+
+
+class HwndCaptureSession:
+    """针对单个窗口句柄的长生命周期GDI捕获会话
+
+    窗口DC、兼容DC和位图在整个会话中保持不变，仅在窗口尺寸变化时重建；
+    像素通过GetBitmapBits直接写入预分配的numpy缓冲区，
+    再用一次cvtColor(BGRX→BGR)写入输出环，每帧不再产生新的分配
+    """
+
+    def __init__(self, hwnd, ring_size=3):
+        self.hwnd = hwnd
+        self._size = None
+        self._hwnd_dc = None
+        self._mfc_dc = None
+        self._save_dc = None
+        self._bitmap = None
+        self._raw = None  # (h, w, 4) BGRX原始像素
+        self._ring = FrameRing(ring_size)
+        self.rebuilds = 0
+
+    def _ensure_context(self, w, h):
+        """窗口尺寸变化时重建GDI对象与缓冲区"""
+        if self._size == (w, h):
+            return
+        import win32gui
+        import win32ui
+
+        self._release_context()
+        self._hwnd_dc = win32gui.GetWindowDC(self.hwnd)
+        self._mfc_dc = win32ui.CreateDCFromHandle(self._hwnd_dc)
+        self._save_dc = self._mfc_dc.CreateCompatibleDC()
+        self._bitmap = win32ui.CreateBitmap()
+        self._bitmap.CreateCompatibleBitmap(self._mfc_dc, w, h)
+        self._save_dc.SelectObject(self._bitmap)
+        self._raw = np.empty((h, w, 4), dtype=np.uint8)
+        self._size = (w, h)
+        self.rebuilds += 1
+
+    def capture(self):
+        """捕获一帧，返回BGR数组；窗口过小或拷贝失败返回None"""
+        raw = self.grab()
+        if raw is None:
+            return None
+        h, w = raw.shape[:2]
+        frame = self._ring.next((h, w, 3))
+        cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR, dst=frame)
+        return frame
+
+    def grab(self):
+        """捕获一帧，返回BGRX原始像素（会话内复用的缓冲区，下一帧会被覆盖）；失败返回None"""
+        import win32gui
+        import win32con
+        from ctypes import windll, c_void_p
+
+        rect = win32gui.GetWindowRect(self.hwnd)
+        w, h = rect[2] - rect[0], rect[3] - rect[1]
+        if w <= 10 or h <= 10:
+            return None
+
+        self._ensure_context(w, h)
+        self._save_dc.BitBlt((0, 0), (w, h), self._mfc_dc, (0, 0), win32con.SRCCOPY)
+
+        # 直接拷贝到预分配缓冲区（32位位图每行天然4字节对齐）
+        nbytes = self._raw.nbytes
+        copied = windll.gdi32.GetBitmapBits(self._bitmap.GetHandle(), nbytes,
+                                            c_void_p(self._raw.ctypes.data))
+        if copied != nbytes:
+            logger.warning(f"GetBitmapBits拷贝不完整: {copied}/{nbytes}")
+            return None
+        return self._raw
+
+    def _release_context(self):
+        try:
+            import win32gui
+            if self._bitmap is not None:
+                win32gui.DeleteObject(self._bitmap.GetHandle())
+            if self._save_dc is not None:
+                self._save_dc.DeleteDC()
+            if self._mfc_dc is not None:
+                self._mfc_dc.DeleteDC()
+            if self._hwnd_dc is not None:
+                win32gui.ReleaseDC(self.hwnd, self._hwnd_dc)
+        except Exception as e:
+            logger.error(f"释放GDI对象失败: {e}")
+        self._hwnd_dc = self._mfc_dc = self._save_dc = self._bitmap = None
+        self._size = None
+
+    def release(self):
+        """释放会话持有的全部GDI资源"""
+        self._release_context()
+        self._raw = None
+
+
+class RegularCaptureBackend:
+    """持久化的常规(mss)屏幕捕获后端
+
+    整个串流会话复用同一个mss实例，帧写入预分配的缓冲环；
+    加锁保证可在捕获线程中安全使用。grab_source可替换为合成数据源，
+    便于在无显示环境下做基准测试
+    """
+
+    def __init__(self, grab_source=None, ring_size=3):
+        self._grab_source = grab_source
+        self._lock = threading.Lock()
+        self._sct = None
+        self._owner = None  # 创建mss实例的线程（Windows下mss的DC与线程绑定）
+        self._ring = FrameRing(ring_size)
+        self.frames = 0
+
+    @property
+    def allocations(self):
+        return self._ring.allocations
+
+    def _grab(self, monitor):
+        if self._grab_source is not None:
+            return self._grab_source(monitor)
+        owner = threading.get_ident()
+        if self._sct is None or self._owner != owner:
+            self._close_sct()
+            import mss
+            self._sct = mss.mss()
+            self._owner = owner
+        # np.asarray直接引用截图的原始缓冲区，不做拷贝
+        return np.asarray(self._sct.grab(monitor))
+
+    def grab(self, monitor):
+        """按monitor区域捕获一帧，返回未转换的原始像素(mss为BGRA)，颜色转换交给预处理阶段"""
+        with self._lock:
+            raw = self._grab(monitor)
+            self.frames += 1
+            return raw
+
+    def capture(self, monitor):
+        """按monitor区域捕获一帧，返回BGR数组（会被后续帧复用）"""
+        with self._lock:
+            raw = self._grab(monitor)
+            h, w = raw.shape[:2]
+            frame = self._ring.next((h, w, 3))
+            if raw.shape[2] == 4:
+                cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR, dst=frame)
+            else:
+                np.copyto(frame, raw)
+            self.frames += 1
+            return frame
+
+    def _close_sct(self):
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            except Exception as e:
+                logger.error(f"关闭mss实例失败: {e}")
+        self._sct = None
+        self._owner = None
+
+    def close(self):
+        """释放mss句柄"""
+        with self._lock:
+            self._close_sct()
@@ -0,0 +1,75 @@
+# utils/change_detector.py
+import numpy as np
+
+
+class ChangeDetector:
+    """分块画面变化检测
+
+    对画面按sample_step抽样后与参考帧逐块比较(向量化numpy)，
+    任一块的最大差值超过threshold即视为该块有变化。
+    参考帧按块更新：只有写入的块才替换参考，其余块继续与上次写入时比较，
+    缓慢渐变的块累计超过阈值后仍能被发现，不会被相邻块的变化吞掉
+    """
+
+    def __init__(self, block_size=32, sample_step=2, threshold=8):
+        if block_size % sample_step:
+            raise ValueError("block_size必须是sample_step的整数倍")
+        self.block_size = block_size
+        self.sample_step = sample_step
+        self.threshold = threshold
+        self._previous = None
+        self.frames = 0
+        self.unchanged = 0
+
+    def detect(self, frame, update_mask=None):
+        """返回 (是否变化, 脏块掩码)；掩码形状为 (行块数, 列块数)
+
+        update_mask为写入参考帧的块(如图块编码实际发送的图块)，默认写入检测到变化的块
+        """
+        h, w = frame.shape[:2]
+        rows = -(-h // self.block_size)
+        cols = -(-w // self.block_size)
+        sampled = frame[::self.sample_step, ::self.sample_step].astype(np.int16)
+        previous = self._previous
+        self.frames += 1
+
+        if previous is None or previous.shape != sampled.shape:
+            self._previous = sampled
+            return True, np.ones((rows, cols), dtype=bool)
+
+        diff = np.abs(sampled - previous)
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+
+        # 补齐到整块后按块取最大值
+        cell = self.block_size // self.sample_step
+        pad_h = rows * cell - diff.shape[0]
+        pad_w = cols * cell - diff.shape[1]
+        if pad_h or pad_w:
+            diff = np.pad(diff, ((0, pad_h), (0, pad_w)))
+        block_max = diff.reshape(rows, cell, cols, cell).max(axis=(1, 3))
+        mask = block_max > self.threshold
+
+        changed = bool(mask.any())
+        if not changed:
+            self.unchanged += 1
+        self._update(sampled, mask if update_mask is None else update_mask, cell)
+        return changed, mask
+
+    def _update(self, sampled, block_mask, cell):
+        """把block_mask中的块从sampled复制到参考帧"""
+        if not block_mask.any():
+            return
+        pixel_mask = np.repeat(np.repeat(block_mask, cell, axis=0), cell, axis=1)
+        pixel_mask = pixel_mask[:sampled.shape[0], :sampled.shape[1]]
+        if sampled.ndim == 3:
+            pixel_mask = pixel_mask[..., None]
+        np.copyto(self._previous, sampled, where=pixel_mask)
+
+    def reset(self):
+        """丢弃参考帧，下一帧视为全部变化"""
+        self._previous = None
+
+    @property
+    def skip_ratio(self):
+        return self.unchanged / self.frames if self.frames else 0.0
@@ -0,0 +1,59 @@
+# utils/content_classifier.py
+import numpy as np
+
+TEXT = 'text'    # 文字：平坦背景上的锐利笔画
+UI = 'ui'        # 界面：大面积纯色块
+PHOTO = 'photo'  # 照片/视频：颜色多、几乎没有平坦区域
+
+
+class ContentClassifier:
+    """按颜色数与边缘密度判断画面(或图块)的内容类型
+
+    在降采样的像素上做全向量化统计：
+      颜色数    每通道保留高5位后的不同颜色数
+      平坦比例  与右侧像素完全相同的像素比例(界面/文字的背景是纯色，照片几乎没有)
+      边缘密度  与右侧像素亮度差很大的像素比例(文字笔画)
+    文字和界面适合无损编码，照片适合JPEG
+    """
+
+    def __init__(self, max_colors=256, flat_threshold=0.5, edge_threshold=0.02, max_samples=16384):
+        self.max_colors = max_colors
+        self.flat_threshold = flat_threshold
+        self.edge_threshold = edge_threshold
+        self.max_samples = max_samples  # 采样像素数上限，整帧按步长降采样
+
+    def _sample(self, image):
+        h, w = image.shape[:2]
+        step = max(1, int((h * w / self.max_samples) ** 0.5))
+        return image[::step, ::step]
+
+    @staticmethod
+    def _neighbour_diff(sample):
+        luma = sample.astype(np.int16).sum(axis=2)
+        return np.abs(np.diff(luma, axis=1))
+
+    @staticmethod
+    def _color_count(sample):
+        quantized = (sample >> 3).astype(np.int32)
+        packed = np.sort(((quantized[..., 0] << 10) | (quantized[..., 1] << 5) | quantized[..., 2]).ravel())
+        return int(np.count_nonzero(np.diff(packed))) + 1
+
+    def measure(self, image):
+        """返回 (颜色数, 平坦比例, 边缘密度)"""
+        sample = self._sample(image)
+        colors = self._color_count(sample)
+        if sample.shape[1] < 2:
+            return colors, 1.0, 0.0
+        diff = self._neighbour_diff(sample)
+        return colors, float(np.mean(diff == 0)), float(np.mean(diff > 96))
+
+    def classify(self, image):
+        """返回 TEXT / UI / PHOTO"""
+        sample = self._sample(image)
+        if sample.shape[1] < 2:
+            return UI
+        diff = self._neighbour_diff(sample)
+        # 先用平坦比例排除照片，多数照片区域不必再统计颜色
+        if np.mean(diff == 0) < self.flat_threshold or self._color_count(sample) > self.max_colors:
+            return PHOTO
+        return TEXT if np.mean(diff > 96) >= self.edge_threshold else UI
@@ -0,0 +1,240 @@
+# utils/encoders.py
+"""可插拔的帧编码器
+
+所有编码器接口相同：encode(frame, quality) -> bytes，frame为BGR画面。
+  cv2        OpenCV内置libjpeg，可设色度抽样、Huffman优化、渐进式
+  turbojpeg  PyTurboJPEG(需安装libjpeg-turbo)，支持快速DCT
+  webp       OpenCV内置libwebp，文字窗口同等质量下体积更小，可选无损
+  png        无损，适合纯文字/界面窗口，quality参数无效
+  auto       按内容逐帧(图块模式下逐图块)选择：文字/界面无损编码，照片类JPEG
+通过config.encoder选择，config.encoder_options传入各自的参数；
+不可用时(如未安装PyTurboJPEG)自动回退到cv2
+"""
+import logging
+import threading
+import cv2
+from .content_classifier import ContentClassifier, PHOTO
+
+logger = logging.getLogger(__name__)
+
+try:
+    import turbojpeg
+except ImportError:  # 可选依赖
+    turbojpeg = None
+
+
+class EncoderUnavailable(RuntimeError):
+    """编码器依赖的库不可用"""
+
+
+class FrameEncoder:
+    """编码器基类"""
+    name = None
+    mime_type = 'image/jpeg'
+    lossless = False
+
+    def encode(self, frame, quality):
+        raise NotImplementedError
+
+    @property
+    def options(self):
+        """当前参数（用于日志和基准测试输出）"""
+        return {}
+
+    def __repr__(self):
+        options = ', '.join(f"{key}={value}" for key, value in self.options.items())
+        return f"{self.name}({options})"
+
+
+class OpenCVJpegEncoder(FrameEncoder):
+    """cv2.imencode JPEG编码"""
+    name = 'cv2'
+    SUBSAMPLING = {
+        '444': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+        '422': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+        '420': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+        '440': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_440,
+        '411': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_411,
+    }
+
+    def __init__(self, subsampling='420', optimize=False, progressive=False, fast_dct=False):
+        if subsampling not in self.SUBSAMPLING:
+            raise ValueError(f"不支持的色度抽样: {subsampling}")
+        self.subsampling = subsampling
+        self.optimize = optimize
+        self.progressive = progressive
+        # OpenCV没有开放DCT算法选择，fast_dct只为与turbojpeg参数一致而接受
+        self._params = []
+        if subsampling != '420':  # 420为libjpeg默认值
+            self._params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, self.SUBSAMPLING[subsampling]]
+        if optimize:
+            self._params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        if progressive:
+            self._params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+
+    def encode(self, frame, quality):
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality] + self._params)
+        if not ok:
+            raise ValueError("JPEG编码失败")
+        return buffer.tobytes()
+
+    @property
+    def options(self):
+        return {'subsampling': self.subsampling, 'optimize': self.optimize, 'progressive': self.progressive}
+
+
+class TurboJpegEncoder(FrameEncoder):
+    """PyTurboJPEG(libjpeg-turbo)编码，快速DCT比cv2默认的整数DCT更快，画质略低"""
+    name = 'turbojpeg'
+
+    def __init__(self, subsampling='420', optimize=False, progressive=False, fast_dct=True):
+        if turbojpeg is None:
+            raise EncoderUnavailable("未安装PyTurboJPEG")
+        try:
+            self._jpeg = turbojpeg.TurboJPEG()
+        except (OSError, RuntimeError) as e:
+            raise EncoderUnavailable(f"找不到libjpeg-turbo: {e}")
+        subsamples = {
+            '444': turbojpeg.TJSAMP_444,
+            '422': turbojpeg.TJSAMP_422,
+            '420': turbojpeg.TJSAMP_420,
+            '440': turbojpeg.TJSAMP_440,
+            '411': turbojpeg.TJSAMP_411,
+        }
+        if subsampling not in subsamples:
+            raise ValueError(f"不支持的色度抽样: {subsampling}")
+        self.subsampling = subsampling
+        self.progressive = progressive
+        self.fast_dct = fast_dct
+        # PyTurboJPEG没有单独的Huffman优化开关，渐进式编码总是使用优化表，optimize被忽略
+        self._subsample = subsamples[subsampling]
+        self._flags = 0
+        if fast_dct:
+            self._flags |= turbojpeg.TJFLAG_FASTDCT
+        if progressive:
+            self._flags |= turbojpeg.TJFLAG_PROGRESSIVE
+
+    def encode(self, frame, quality):
+        return self._jpeg.encode(frame, quality=quality, pixel_format=turbojpeg.TJPF_BGR,
+                                 jpeg_subsample=self._subsample, flags=self._flags)
+
+    @property
+    def options(self):
+        return {'subsampling': self.subsampling, 'progressive': self.progressive, 'fast_dct': self.fast_dct}
+
+
+class WebPEncoder(FrameEncoder):
+    """WebP编码(OpenCV内置libwebp)；lossless时忽略quality"""
+    name = 'webp'
+    mime_type = 'image/webp'
+
+    def __init__(self, lossless=False):
+        self.lossless = lossless
+
+    def encode(self, frame, quality):
+        # IMWRITE_WEBP_QUALITY大于100时为无损
+        ok, buffer = cv2.imencode('.webp', frame, [cv2.IMWRITE_WEBP_QUALITY, 101 if self.lossless else quality])
+        if not ok:
+            raise ValueError("WebP编码失败")
+        return buffer.tobytes()
+
+    @property
+    def options(self):
+        return {'lossless': self.lossless}
+
+
+class PNGEncoder(FrameEncoder):
+    """PNG无损编码；compression为zlib级别(0-9)，越大越慢越小"""
+    name = 'png'
+    mime_type = 'image/png'
+    lossless = True
+
+    def __init__(self, compression=1):
+        self.compression = compression
+
+    def encode(self, frame, quality):
+        ok, buffer = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, self.compression])
+        if not ok:
+            raise ValueError("PNG编码失败")
+        return buffer.tobytes()
+
+    @property
+    def options(self):
+        return {'compression': self.compression}
+
+
+class AdaptiveEncoder(FrameEncoder):
+    """内容自适应编码：文字/界面区域无损(WebP无损或PNG)，照片/视频区域JPEG
+
+    聊天窗口等以文字为主的画面颜色少、背景平坦，无损编码既清晰又比JPEG更小；
+    照片类画面无损编码体积会成倍增加，仍用JPEG。
+    无损编码比JPEG慢一个数量级，超过max_lossless_pixels的大画面仍用JPEG(图块模式下每块都很小，不受影响)；
+    自适应码率把质量降到min_lossless_quality以下时也改用JPEG，降质量才能真正降低码率
+    """
+    name = 'auto'
+    mime_type = None  # 随内容变化，见image_mime_type()
+
+    def __init__(self, lossless='webp', lossy='cv2', max_colors=256, flat_threshold=0.5,
+                 max_lossless_pixels=1280 * 800, min_lossless_quality=50, **lossy_options):
+        if lossless == 'webp':
+            self._lossless = WebPEncoder(lossless=True)
+        elif lossless == 'png':
+            self._lossless = PNGEncoder()
+        else:
+            raise ValueError(f"不支持的无损编码: {lossless}")
+        self._lossy = create_encoder(lossy, **lossy_options)
+        self.classifier = ContentClassifier(max_colors=max_colors, flat_threshold=flat_threshold)
+        self.max_lossless_pixels = max_lossless_pixels
+        self.min_lossless_quality = min_lossless_quality
+        self._lock = threading.Lock()
+        self.counts = {}  # 各内容类型的编码次数
+
+    def encode(self, frame, quality):
+        h, w = frame.shape[:2]
+        if h * w > self.max_lossless_pixels or quality < self.min_lossless_quality:
+            kind = PHOTO  # 不考虑无损编码，省去分类
+        else:
+            kind = self.classifier.classify(frame)
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+        encoder = self._lossy if kind == PHOTO else self._lossless
+        return encoder.encode(frame, quality)
+
+    @property
+    def options(self):
+        return {'lossless': self._lossless.name, 'lossy': self._lossy.name}
+
+
+ENCODERS = {
+    'cv2': OpenCVJpegEncoder,
+    'turbojpeg': TurboJpegEncoder,
+    'webp': WebPEncoder,
+    'png': PNGEncoder,
+    'auto': AdaptiveEncoder,
+}
+
+
+def image_mime_type(data):
+    """根据文件头判断编码结果的MIME类型"""
+    if data[:4] == b'\x89PNG':
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def create_encoder(name='cv2', **options):
+    """按名称创建编码器，名称未知、依赖不可用或参数错误时回退到默认的cv2编码器"""
+    encoder_class = ENCODERS.get(name)
+    if encoder_class is None:
+        logger.warning(f"未知的编码器: {name}，使用cv2")
+        return OpenCVJpegEncoder()
+    try:
+        return encoder_class(**options)
+    except (EncoderUnavailable, TypeError, ValueError) as e:
+        logger.warning(f"编码器 {name} 不可用({e})，使用cv2")
+        return OpenCVJpegEncoder()
+
+
+def encoder_from_config(config):
+    return create_encoder(getattr(config, 'encoder', 'cv2'), **getattr(config, 'encoder_options', {}))
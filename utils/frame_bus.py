@@ -0,0 +1,352 @@
+# utils/frame_bus.py
+import time
+import threading
+import logging
+import cv2
+import numpy as np
+from .change_detector import ChangeDetector
+from .rendition_cache import RenditionCache
+from .pipeline import DropOldestQueue, StageStats
+from .preprocess import FramePreprocessor
+from .frame_clock import FrameClock
+from .encoders import encoder_from_config
+from .metrics import RateMeter, BYTES_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+class EncodedFrame:
+    """总线上发布的一帧：原始画面 + 编码后的字节"""
+    __slots__ = ('seq', 'data', 'timestamp', 'frame', 'window', 'repeat', 'quality', 'display')
+
+    def __init__(self, seq, data, timestamp, frame=None, window=None, repeat=False, quality=None,
+                 display=None):
+        self.seq = seq                # 总线序号，单调递增
+        self.data = data              # 编码后的字节
+        self.timestamp = timestamp    # 捕获时间(time.monotonic)
+        self.frame = frame            # 原始BGR画面快照（只读，不含调试信息，未捕获到窗口时为None）
+        self.window = window          # 对应的窗口对象
+        self.repeat = repeat          # 画面未变化时的保活重发（与上一帧内容相同）
+        self.quality = quality        # data的编码质量
+        # 编码data所用的画面（开启调试信息时含叠加文字），多分辨率版本由它缩放，与data内容一致
+        self.display = display if display is not None else frame
+
+
+class _CaptureJob:
+    """捕获阶段交给编码阶段的一帧"""
+    __slots__ = ('seq', 'frame', 'window', 'timestamp')
+
+    def __init__(self, seq, frame, window, timestamp):
+        self.seq = seq
+        self.frame = frame  # 画面快照；None表示未找到窗口，编码为提示帧
+        self.window = window
+        self.timestamp = timestamp
+
+
+class FrameSubscription:
+    """帧订阅槽位
+
+    每个订阅者只保留最新一帧（latest frame wins），
+    慢速订阅者只会丢掉自己没来得及取的旧帧，不会拖慢其他订阅者
+    """
+
+    def __init__(self, bus):
+        self._bus = bus
+        self._cond = threading.Condition()
+        self._latest = None
+        self.closed = False
+        self.received = 0  # 收到的帧数
+        self.dropped = 0   # 被新帧覆盖的帧数
+
+    def _offer(self, encoded):
+        """由总线调用：放入最新帧，覆盖尚未取走的旧帧"""
+        with self._cond:
+            if self._latest is not None:
+                self.dropped += 1
+            self._latest = encoded
+            self.received += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """等待下一帧，超时或已关闭时返回None"""
+        with self._cond:
+            if self._latest is None and not self.closed:
+                self._cond.wait(timeout)
+            encoded, self._latest = self._latest, None
+            return encoded
+
+    def close(self):
+        """取消订阅"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FrameBus:
+    """共享的捕获+编码帧总线
+
+    每个周期只捕获、编码一次，并把最新帧广播给所有订阅者，
+    N个观看者只消耗一次捕获/编码的CPU。
+    捕获与编码分为两个流水线阶段：捕获线程 → 丢旧帧的有界队列 → 编码线程池；
+    cv2编码时释放GIL，多个编码线程可并行，编码较慢时不再拖慢捕获节奏
+    """
+
+    def __init__(self, config, capture_instance):
+        self.config = config
+        self.capture_instance = capture_instance
+        self.quality_provider = None  # 可选：返回当前JPEG质量的回调
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._latest = None
+        self._seq = 0
+        self._published_seq = 0
+        self._last_publish = 0.0
+        self._publish_lock = threading.Lock()
+        self._workers = []
+
+        # 流水线各阶段统计，耗时同时记入/metrics的直方图
+        metrics = config.metrics
+        self.encode_queue = DropOldestQueue(maxsize=2)
+        self.capture_stats = StageStats('capture', histogram=metrics.histogram(
+            'screenshare_capture_seconds', '捕获一帧(含窗口查找)的耗时，秒'))
+        self.encode_stats = StageStats('encode', self.encode_queue, histogram=metrics.histogram(
+            'screenshare_encode_seconds', '编码一帧的耗时，秒'))
+        self.encoded_bytes = metrics.histogram(
+            'screenshare_encoded_bytes', '总线编码后每帧的字节数', buckets=BYTES_BUCKETS)
+        self.fps_meter = RateMeter()  # 最近1秒实际发布的新帧速率(不含静态画面的保活重发)
+        self.stale = 0  # 编码完成时已有更新的帧发布而被丢弃的帧数
+
+        # 捕获节拍：单调时钟截止时间调度，config.fps运行中修改即时生效
+        self.clock = FrameClock(lambda: self.config.fps)
+
+        # 预处理阶段：颜色转换与可选缩小一次写入缓冲池，得到各阶段共享的BGR快照
+        self.preprocessor = FramePreprocessor(
+            max_width=getattr(config, 'capture_max_width', 0) or None,
+            max_height=getattr(config, 'capture_max_height', 0) or None)
+        
+        # 画面变化检测：静态画面跳过编码
+        self.change_detector = ChangeDetector(
+            threshold=getattr(config, 'change_threshold', 8))
+        self.encoded = 0      # 实际编码的帧数
+        self.skipped = 0      # 因画面未变化跳过编码的帧数
+        self.bytes_saved = 0  # 跳过编码节省的字节数(按上一帧大小估算)
+
+        # 帧编码器(config.encoder选择)，多分辨率版本与图块编码共用
+        self.encoder = encoder_from_config(config)
+        logger.info(f"帧编码器: {self.encoder}")
+
+        # 不同视口/码率的客户端共享的多分辨率编码缓存
+        self.renditions = RenditionCache(config, encoder=self.encoder)
+        self._register_metrics(metrics)
+
+    def _register_metrics(self, metrics):
+        """抓取时读取的总线统计：帧率、跳过/丢弃的帧数与编码队列深度"""
+        metrics.collect('screenshare_fps', '最近1秒捕获编码并发布的帧率', lambda: self.fps_meter.rate)
+        metrics.collect('screenshare_frames_skipped_total', '画面未变化而跳过编码的帧数',
+                        lambda: self.skipped, type='counter')
+        metrics.collect('screenshare_queue_depth', '流水线各阶段输入队列中等待的帧数',
+                        lambda: {'encode': len(self.encode_queue)}, labelnames=('queue',), source='frame_bus')
+        metrics.collect('screenshare_frames_dropped_total', '各环节丢弃的帧数',
+                        lambda: {'encode_queue': self.encode_queue.dropped, 'stale': self.stale},
+                        type='counter', labelnames=('stage',), source='frame_bus')
+
+    @property
+    def latest(self):
+        """最近一次发布的帧"""
+        return self._latest
+
+    @property
+    def stats(self):
+        """帧总线统计：编码/跳过帧数与跳过比例"""
+        total = self.encoded + self.skipped
+        return {
+            'encoded': self.encoded,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / total if total else 0.0,
+            'bytes_saved': self.bytes_saved,
+        }
+
+    @property
+    def pipeline_stats(self):
+        """捕获/预处理/编码阶段的耗时与队列深度，以及捕获节拍的超时统计和预处理的缓冲区分配次数"""
+        return {'capture': dict(self.capture_stats.stats, **self.clock.stats),
+                'preprocess': self.preprocessor.summary,
+                'encode': self.encode_stats.stats}
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self):
+        """注册订阅者，并确保生产者线程已启动"""
+        subscription = FrameSubscription(self)
+        with self._lock:
+            self._subscribers.add(subscription)
+        # 新订阅者立即拿到最近一帧，避免等待下一个周期
+        latest = self._latest
+        if latest is not None:
+            subscription._offer(latest)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def start(self):
+        """启动捕获线程和编码线程池（已在运行则忽略）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.encode_queue = DropOldestQueue(maxsize=2)
+            self.encode_stats.queue = self.encode_queue
+            workers = max(1, getattr(self.config, 'encode_workers', 2))
+            self._workers = [
+                threading.Thread(target=self._encode_loop, args=(self.encode_queue,), daemon=True)
+                for _ in range(workers)
+            ]
+            for worker in self._workers:
+                worker.start()
+            self._thread = threading.Thread(target=self._producer_loop, daemon=True)
+            self._thread.start()
+
+    def _publish(self, encoded):
+        self._latest = encoded
+        self._last_publish = encoded.timestamp
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription._offer(encoded)
+
+    def _producer_loop(self):
+        """捕获阶段：按config.fps节奏捕获，变化的帧送入编码队列"""
+        logger.info("帧总线生产者线程启动")
+        self.config.frame_count = 0
+        self.config.start_time = time.time()
+        self.change_detector.reset()
+        self.clock.reset()
+
+        while self.config.is_running:
+            if not self.clock.wait():
+                break
+            last_time = time.monotonic()
+
+            try:
+                job = self._capture(last_time)
+            except Exception as e:
+                logger.error(f"帧总线捕获失败: {e}")
+                continue
+            if job is not None:
+                self.encode_queue.put(job)
+                continue
+            # 画面未变化：只在超过保活间隔时重发上一帧
+            with self._publish_lock:
+                previous = self._latest
+                if previous is None or last_time - self._last_publish < self.config.keepalive_interval:
+                    continue
+                self._publish(EncodedFrame(previous.seq, previous.data, last_time,
+                                           previous.frame, previous.window, repeat=True,
+                                           quality=previous.quality, display=previous.display))
+
+        self.encode_queue.close()
+        self._latest = None
+        release = getattr(self.capture_instance, 'release', None)
+        if release:
+            release()
+        logger.info("帧总线生产者线程退出")
+
+    def _encode_loop(self, queue):
+        """编码阶段：取出捕获的帧编码后发布，比已发布帧更旧的结果直接丢弃"""
+        while True:
+            job = queue.get(timeout=0.5)
+            if job is None:
+                if queue.closed:
+                    break
+                continue
+            try:
+                with self.encode_stats.timer():
+                    encoded = self._encode(job)
+            except Exception as e:
+                logger.error(f"帧总线编码失败: {e}")
+                continue
+            with self._publish_lock:
+                if encoded.seq <= self._published_seq:
+                    self.stale += 1
+                    continue
+                self._published_seq = encoded.seq
+                self._publish(encoded)
+                self.fps_meter.mark()
+
+    def _capture(self, timestamp):
+        """捕获一帧；画面与上一帧相同时返回None"""
+        with self.capture_stats.timer():
+            # 支持原始像素捕获时跳过捕获端的颜色转换，由预处理阶段完成
+            capture_raw = getattr(self.capture_instance, 'capture_window_raw', None)
+            if capture_raw is not None:
+                frame, win = capture_raw()
+            else:
+                frame, win = self.capture_instance.capture_window_content()
+        if frame is None:
+            self.change_detector.reset()
+            self._seq += 1
+            return _CaptureJob(self._seq, None, None, timestamp)
+
+        # 先于调试信息叠加做变化检测，否则FPS文字会让每帧都“变化”
+        if self.config.change_detection:
+            changed, _ = self.change_detector.detect(frame)
+            if not changed and self._latest is not None:
+                self.skipped += 1
+                self.bytes_saved += len(self._latest.data)
+                return None
+
+        self._seq += 1
+        # 捕获缓冲区会被后续帧复用，转换为不含调试信息的BGR快照供编码、预览和图块编码共用
+        snapshot = self.preprocessor.process(frame)
+        self.config.last_frame = snapshot
+        return _CaptureJob(self._seq, snapshot, win, timestamp)
+
+    def _encode(self, job):
+        """编码一帧（可在多个编码线程中并行执行）"""
+        if job.frame is None:
+            return EncodedFrame(job.seq, self._placeholder_bytes(), job.timestamp)
+
+        frame, win = job.frame, job.window
+        if self.config.show_debug:
+            frame = self.preprocessor.copy(frame)  # 快照是只读的，调试信息画在副本上
+            info = f"{win.title} | {win.width}x{win.height} | FPS:{self.fps_meter.rate:.1f}"
+            if self.config.use_win_api and self.capture_instance.win_api_available:
+                info += " | Windows API"
+            cv2.putText(frame, info, (10, 25), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.6, (0, 255, 0), 1, cv2.LINE_AA)
+
+        quality = self.quality_provider() if self.quality_provider else self.config.quality
+        data = self.encoder.encode(frame, quality)
+        self.encoded_bytes.observe(len(data))
+        with self._publish_lock:
+            self.config.frame_count += 1
+            self.encoded += 1
+        return EncodedFrame(job.seq, data, job.timestamp, job.frame, win, quality=quality, display=frame)
+
+    def _placeholder_bytes(self):
+        """未检测到目标窗口时的提示帧"""
+        img = np.zeros((360, 640, 3), dtype=np.uint8)
+        cv2.putText(img, "⚠️ 未检测到目标窗口", (80, 150),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+        cv2.putText(img, f"标题: '{self.config.window_title}'", (120, 200),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 200), 1)
+        if self.capture_instance.win_api_available:
+            cv2.putText(img, "💡 已启用后台捕获", (100, 250),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (100, 200, 100), 1)
+        else:
+            cv2.putText(img, "💡 安装pywin32以启用后台捕获", (60, 250),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (100, 200, 100), 1)
+        return self.encoder.encode(img, 70)
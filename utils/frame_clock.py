@@ -0,0 +1,78 @@
+# utils/frame_clock.py
+import time
+import threading
+
+
+class FrameClock:
+    """基于time.monotonic()的帧时钟
+
+    按固定网格计算每一帧的截止时间，精确休眠到截止时间，不受系统时间调整影响，
+    也不会因每次唤醒的延迟而累积漂移。处理超时错过的节拍直接跳过，
+    不会为了追赶而连续突发多帧。帧率每个节拍从fps_provider读取，运行中可随时修改
+    """
+
+    def __init__(self, fps_provider, clock=time.monotonic, stop_event=None):
+        self._fps_provider = fps_provider  # 返回当前目标帧率的回调
+        self._clock = clock
+        self._stop = stop_event or threading.Event()
+        self._lock = threading.Lock()
+        self._fps = None
+        self._interval = None
+        self._next = None
+        self.ticks = 0
+        self.overruns = 0        # 处理超时、错过了节拍的次数
+        self.skipped_ticks = 0   # 因超时被跳过的节拍数
+        self.max_lateness = 0.0  # 最大超时(秒)
+
+    def reset(self):
+        """下一次wait立即返回，并以该时刻为新的网格起点（同时清除停止状态）"""
+        with self._lock:
+            self._next = None
+            self._stop.clear()
+
+    def stop(self):
+        """唤醒正在等待的线程"""
+        self._stop.set()
+
+    def wait(self):
+        """休眠到下一帧截止时间；返回False表示时钟已停止"""
+        with self._lock:
+            now = self._clock()
+            fps = max(1, self._fps_provider())
+            if fps != self._fps:
+                # 帧率改变：以当前时刻为起点重建网格
+                self._fps = fps
+                self._interval = 1.0 / fps
+                if self._next is not None:
+                    self._next = now + self._interval
+            if self._next is None:
+                self._next = now
+            deadline = self._next
+            lateness = now - deadline
+            if lateness > 0:
+                missed = int(lateness / self._interval)
+                if missed:
+                    self.overruns += 1
+                    self.skipped_ticks += missed
+                    self.max_lateness = max(self.max_lateness, lateness)
+                    # 跳过错过的节拍，对齐到网格上最近的一拍
+                    deadline += missed * self._interval
+            self._next = deadline + self._interval
+            self.ticks += 1
+        delay = deadline - self._clock()
+        if delay > 0:
+            return not self._stop.wait(delay)
+        return not self._stop.is_set()
+
+    @property
+    def fps(self):
+        return self._fps
+
+    @property
+    def stats(self):
+        return {
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'skipped_ticks': self.skipped_ticks,
+            'max_lateness_ms': self.max_lateness * 1000,
+        }
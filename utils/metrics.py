@@ -0,0 +1,271 @@
+# utils/metrics.py
+import math
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Prometheus文本格式(0.0.4)，供 /metrics 在负载测试时抓取
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)  # 秒
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(8))  # 1KB ~ 16MB
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类：名称、说明、标签名，以及按标签值分开的样本"""
+
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or any(name not in labels for name in self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(样本名, 标签文本, 值)]"""
+        return []
+
+    def render(self):
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in values]
+
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """分桶直方图：记录各桶计数、总和与次数，分位数由抓取端计算"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # 标签值 -> [各桶计数(不累计，最后一项为+Inf), 总和]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, **labels):
+        """with histogram.time(): ... 记录代码块耗时(秒)"""
+        return _HistogramTimer(self, labels)
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _labels(self.labelnames, key, [('le', _number(bound))]),
+                                cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class _HistogramTimer:
+    __slots__ = ('_histogram', '_labels', '_start')
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+
+class _CollectedMetric(_Metric):
+    """抓取时才读取的指标：已有的统计量(队列深度、会话数、发送器计数)不必在热路径上重复计数
+
+    每个来源一个回调，返回一个数值，或 {标签值(元组): 数值}；多个来源的样本合并输出
+    """
+
+    def __init__(self, name, documentation, labelnames=(), type='gauge'):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self.callbacks = {}  # 来源 -> 回调
+
+    def samples(self):
+        with self._lock:
+            callbacks = list(self.callbacks.values())
+        values = {}
+        for callback in callbacks:
+            result = callback()
+            if not isinstance(result, dict):
+                result = {(): result}
+            for key, value in result.items():
+                values[key if isinstance(key, tuple) else (key,)] = value
+        return [(self.name, _labels(self.labelnames, key), value)
+                for key, value in sorted(values.items(), key=lambda item: [str(v) for v in item[0]])]
+
+
+class MetricsRegistry:
+    """进程内的指标表（线程安全），render()输出Prometheus文本格式
+
+    counter/gauge/histogram按名称取已有指标或新建，重启服务器后继续累计；
+    collect登记抓取时读取的回调，同一指标同一来源的回调被新的替换(新的服务器实例取代旧的)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已按不同的类型或标签注册")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def collect(self, name, documentation, callback, type='gauge', labelnames=(), source=None):
+        """登记抓取时调用的回调(type为gauge或counter)；source区分向同一指标提供样本的不同组件"""
+        metric = self._get_or_create(_CollectedMetric, name, documentation, labelnames, type=type)
+        with metric._lock:
+            metric.callbacks[source] = callback
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render(self):
+        """全部指标的文本格式；某个回调出错时跳过该指标，不影响其他指标"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.debug(f"读取指标 {metric.name} 失败: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+class RateMeter:
+    """最近一段时间的事件速率(如帧率)
+
+    按window秒的固定窗口滚动：窗口结束时用该窗口的计数更新速率，
+    长时间没有事件时读取到的速率随之下降，而不是停在最后一次的值。
+    mark()只在单个线程中调用时计数精确，多线程调用偶尔少计一次，只用于显示和监控
+    """
+
+    def __init__(self, window=1.0, clock=time.monotonic):
+        self.window = window
+        self._clock = clock
+        self._start = clock()
+        self._count = 0
+        self._rate = 0.0
+        self.total = 0
+
+    def mark(self, count=1):
+        now = self._clock()
+        self._count += count
+        self.total += count
+        elapsed = now - self._start
+        if elapsed >= self.window:
+            self._rate = self._count / elapsed
+            self._start = now
+            self._count = 0
+
+    @property
+    def rate(self):
+        elapsed = self._clock() - self._start
+        if elapsed >= 2 * self.window:
+            return self._count / elapsed  # 上一个窗口之后一直很少或没有事件
+        return self._rate
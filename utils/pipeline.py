@@ -0,0 +1,109 @@
+# utils/pipeline.py
+import time
+import threading
+from collections import deque
+
+
+class DropOldestQueue:
+    """有界的流水线队列：满了就丢弃最旧的项
+
+    实时画面只关心最新帧，下游处理不过来时丢旧帧，而不是让上游阻塞或积压延迟
+    """
+
+    def __init__(self, maxsize=2, on_drop=None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop  # 可选回调 on_drop(被丢弃的项)
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.closed = False
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        dropped = None
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                dropped = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+        if dropped is not None and self.on_drop:
+            self.on_drop(dropped)
+
+    def get(self, timeout=None):
+        """取出最旧的项，超时或已关闭且为空时返回None"""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    """流水线单个阶段的耗时统计（线程安全）"""
+
+    def __init__(self, name, queue=None, histogram=None):
+        self.name = name
+        self.queue = queue  # 该阶段的输入队列，用于报告队列深度
+        self.histogram = histogram  # 可选：同时记入指标表的耗时直方图(/metrics)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.average = 0.0  # 最近耗时的指数滑动平均(秒)
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total_time += seconds
+            self.max_time = max(self.max_time, seconds)
+            self.average = seconds if self.count == 1 else self.average * 0.9 + seconds * 0.1
+        if self.histogram is not None:
+            self.histogram.observe(seconds)
+
+    def timer(self):
+        """with stats.timer(): ... 记录代码块耗时"""
+        return _StageTimer(self)
+
+    @property
+    def stats(self):
+        with self._lock:
+            result = {
+                'count': self.count,
+                'avg_ms': self.average * 1000,
+                'max_ms': self.max_time * 1000,
+            }
+        if self.queue is not None:
+            result['queue_depth'] = len(self.queue)
+            result['dropped'] = self.queue.dropped
+        return result
+
+
+class _StageTimer:
+    __slots__ = ('_stats', '_start')
+
+    def __init__(self, stats):
+        self._stats = stats
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stats.record(time.perf_counter() - self._start)
+
+
+def bottleneck(stage_stats):
+    """返回平均耗时最长的阶段名与耗时(ms)"""
+    if not stage_stats:
+        return None, 0.0
+    name, stats = max(stage_stats.items(), key=lambda item: item[1]['avg_ms'])
+    return name, stats['avg_ms']
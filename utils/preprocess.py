@@ -0,0 +1,140 @@
+# utils/preprocess.py
+import weakref
+import threading
+import cv2
+import numpy as np
+from .pipeline import StageStats
+
+
+class _Lease:
+    """借出的一个缓冲区：acquire()返回的数组以它为base(经__array_interface__)，
+    numpy不会越过非数组的base，数组的切片、视图都引用到它
+    """
+    __slots__ = ('backing', '__array_interface__', '__weakref__')
+
+    def __init__(self, backing, shape, dtype):
+        self.backing = backing
+        self.__array_interface__ = {'shape': shape, 'typestr': dtype.str, 'version': 3,
+                                    'data': (backing.ctypes.data, False)}
+
+
+class BufferPool:
+    """按形状复用的numpy缓冲池（线程安全）
+
+    acquire()返回的数组建立在一个租约对象之上：
+    该数组及其切片、视图、memoryview都经由租约引用底层缓冲区，
+    它们全部被释放、租约被回收时缓冲区才归还池中，不需要显式归还。
+    是否空闲由对象生命周期(weakref.finalize)决定，不依赖解释器的引用计数数值，
+    仍被订阅者或编码线程持有的帧不会被复用覆盖
+    """
+
+    def __init__(self, dtype=np.uint8):
+        self.dtype = np.dtype(dtype)
+        self._free = {}  # 形状 -> 空闲的底层缓冲区列表
+        # 租约回收可能发生在任意线程，也可能在本线程持锁分配内存时由垃圾回收触发，用可重入锁
+        self._lock = threading.RLock()
+        self.leased = 0       # 当前借出的缓冲区数
+        self.allocations = 0  # 累计新分配的缓冲区数
+        self.reuses = 0
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                backing = free.pop()
+                self.reuses += 1
+            else:
+                # 尺寸变化后旧形状的空闲缓冲区不会再用到，直接释放
+                self._free = {shape: []}
+                backing = np.empty(int(np.prod(shape)) * self.dtype.itemsize, dtype=np.uint8)
+                self.allocations += 1
+            self.leased += 1
+        lease = _Lease(backing, shape, self.dtype)
+        weakref.finalize(lease, self._return, shape, backing)
+        return np.asarray(lease)
+
+    def _return(self, shape, backing):
+        """租约被回收：缓冲区不再被任何数组引用，放回空闲列表"""
+        with self._lock:
+            self.leased -= 1
+            self._free.setdefault(shape, []).append(backing)
+
+    def __len__(self):
+        """池管理的缓冲区数(借出 + 空闲)"""
+        with self._lock:
+            return self.leased + sum(len(free) for free in self._free.values())
+
+
+class FramePreprocessor:
+    """捕获后的预处理阶段：颜色转换与缩小合并为每帧一次写入
+
+    输入可以是捕获得到的BGRA/BGRX原始像素或BGR画面，输出写入缓冲池中的BGR(或RGB)数组，
+    作为后续变化检测之外所有阶段(编码、图块、多分辨率、预览)共享的只读画面。
+    需要缩小时先在4通道原图上缩放再转换，颜色转换只处理缩小后的像素。
+    interpolation为None时按比例选择：缩小不到一半用双线性(INTER_AREA在非整数比例下慢数倍)，
+    缩小一半以上用INTER_AREA避免文字混叠
+    """
+
+    def __init__(self, max_width=None, max_height=None, rgb=False, interpolation=None, name='preprocess'):
+        self.max_width = max_width    # 输出最大宽度，None为不限制
+        self.max_height = max_height  # 输出最大高度，None为不限制
+        self.rgb = rgb                # 输出RGB(Tk/PIL预览)而不是BGR
+        self.interpolation = interpolation
+        self.pool = BufferPool()
+        self._scratch = BufferPool()  # 4通道缩放的中间结果
+        self.stats = StageStats(name)
+
+    def output_size(self, width, height):
+        """按最大宽高等比例缩小后的(宽, 高)"""
+        scale = 1.0
+        if self.max_width and width > self.max_width:
+            scale = self.max_width / width
+        if self.max_height and height > self.max_height:
+            scale = min(scale, self.max_height / height)
+        if scale >= 1.0:
+            return width, height
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def process(self, image):
+        """返回预处理后的画面（缓冲池中的数组，调用方持有期间不会被复用）"""
+        with self.stats.timer():
+            h, w = image.shape[:2]
+            channels = image.shape[2] if image.ndim == 3 else 1
+            width, height = self.output_size(w, h)
+            if (width, height) != (w, h):
+                resized = self._scratch.acquire((height, width, channels))
+                interpolation = self.interpolation
+                if interpolation is None:
+                    interpolation = cv2.INTER_AREA if width * 2 <= w else cv2.INTER_LINEAR
+                cv2.resize(image, (width, height), dst=resized, interpolation=interpolation)
+                image = resized
+            output = self.pool.acquire((height, width, 3))
+            code = self._conversion(channels)
+            if code is None:
+                np.copyto(output, image)
+            else:
+                cv2.cvtColor(image, code, dst=output)
+            return output
+
+    def copy(self, image):
+        """把画面复制到缓冲池的新缓冲区（如在只读快照上叠加调试信息）"""
+        output = self.pool.acquire(image.shape)
+        np.copyto(output, image)
+        return output
+
+    def _conversion(self, channels):
+        if channels == 4:
+            return cv2.COLOR_BGRA2RGB if self.rgb else cv2.COLOR_BGRA2BGR
+        if channels == 1:
+            return cv2.COLOR_GRAY2RGB if self.rgb else cv2.COLOR_GRAY2BGR
+        return cv2.COLOR_BGR2RGB if self.rgb else None
+
+    @property
+    def allocations(self):
+        return self.pool.allocations + self._scratch.allocations
+
+    @property
+    def summary(self):
+        """耗时统计与缓冲区分配/复用次数"""
+        return dict(self.stats.stats, allocations=self.allocations, reuses=self.pool.reuses)
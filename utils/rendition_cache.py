@@ -0,0 +1,107 @@
+# utils/rendition_cache.py
+import threading
+import logging
+from collections import OrderedDict
+import cv2
+from .encoders import OpenCVJpegEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('ready', 'data')
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.data = None
+
+
+class RenditionCache:
+    """按(帧序号, 宽度, 质量)缓存的多分辨率编码版本
+
+    手机等小屏客户端按视口宽度选择档位，服务端缩放后编码；
+    同一帧同一档位只编码一次，由该档位的所有客户端共享。
+    多个线程同时请求同一版本时，只有第一个线程编码，其余等待结果
+    """
+
+    def __init__(self, config, max_entries=32, encoder=None):
+        self.config = config
+        self.encoder = encoder or OpenCVJpegEncoder()  # 与帧总线使用同一个编码器
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.encodes = 0
+        self.evictions = 0
+
+    def rung_for_viewport(self, width):
+        """返回不小于视口宽度的最小档位；未知视口或超过所有档位时返回None(原始分辨率)"""
+        if not width or width <= 0:
+            return None
+        for rung in sorted(self.config.rendition_widths):
+            if rung >= width:
+                return rung
+        return None
+
+    def lower_rung(self, width, steps):
+        """从档位width(None为原始分辨率)往下降steps档，最低为最小档位；用于慢速客户端降低分辨率"""
+        ladder = sorted(self.config.rendition_widths)
+        if not steps or not ladder:
+            return width
+        index = len(ladder) if width is None or width not in ladder else ladder.index(width)
+        return ladder[max(0, index - steps)]
+
+    def get(self, encoded, width=None, quality=None):
+        """返回encoded在指定宽度/质量下的编码字节，与总线编码参数相同时直接复用"""
+        quality = quality or self.config.quality
+        frame = encoded.display  # 与总线字节相同的画面（含调试信息），而不是不含叠加的快照
+        if frame is None:
+            return encoded.data  # 占位提示帧不缩放
+        if width is not None and width >= frame.shape[1]:
+            width = None
+        if width is None and quality == encoded.quality:
+            return encoded.data
+
+        key = (encoded.seq, width, quality)
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _Entry()
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self.hits += 1
+
+        if not owner:
+            entry.ready.wait()
+            if entry.data is not None:
+                return entry.data
+            return self._encode(frame, width, quality)  # 编码线程失败，自行编码
+
+        try:
+            entry.data = self._encode(frame, width, quality)
+            self.encodes += 1
+        finally:
+            if entry.data is None:
+                with self._lock:
+                    self._entries.pop(key, None)
+            entry.ready.set()
+        return entry.data
+
+    def _encode(self, frame, width, quality):
+        if width is not None:
+            h, w = frame.shape[:2]
+            height = max(1, round(h * width / w))
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        return self.encoder.encode(frame, quality)
+
+    @property
+    def stats(self):
+        return {
+            'cached': len(self._entries),
+            'encodes': self.encodes,
+            'hits': self.hits,
+            'evictions': self.evictions,
+        }
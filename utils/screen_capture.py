@@ -1,10 +1,7 @@
 # utils/screen_capture.py
-import cv2
-import numpy as np
-from PIL import Image
-import mss
 import logging
-from .window_manager import WindowManager
+from .window_manager import WindowResolver
+from .capture_backends import HwndCaptureSession, RegularCaptureBackend
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +11,15 @@ class ScreenCapture:
     def __init__(self, config):
         self.config = config
         self.win_api_available = self._check_win_api_availability()
+        # 窗口解析缓存，避免每帧枚举全部窗口
+        self.window_resolver = WindowResolver(
+            recheck_interval=getattr(config, 'window_recheck_interval', 2.0),
+            histogram=config.metrics.histogram('screenshare_window_lookup_seconds', '查找目标窗口的耗时，秒'))
+        config.metrics.collect('screenshare_window_lookups_total', '目标窗口查找次数(hit为命中缓存)',
+                               lambda: {'hit': self.window_resolver.hits, 'miss': self.window_resolver.misses},
+                               type='counter', labelnames=('result',))
+        self._hwnd_session = None  # 当前窗口句柄的GDI捕获会话
+        self._regular_backend = RegularCaptureBackend()  # 会话级mss捕获后端
         
     def _check_win_api_availability(self) -> bool:
         """检查Windows API是否可用"""
@@ -27,94 +33,80 @@ class ScreenCapture:
             return False
     
     def capture_window_content(self):
-        """智能窗口内容捕获"""
-        win = WindowManager.find_target_window(self.config.window_title)
+        """智能窗口内容捕获，返回 (BGR画面, 窗口)"""
+        return self._capture_window(raw=False)
+    
+    def capture_window_raw(self):
+        """捕获窗口的原始像素(BGRA/BGRX，缓冲区会被后续帧复用)，返回 (原始像素, 窗口)
+
+        颜色转换和缩放由帧总线的预处理阶段一次完成，省去一次整帧转换
+        """
+        return self._capture_window(raw=True)
+    
+    def _capture_window(self, raw):
+        win = self.window_resolver.resolve(self.config.window_title)
         if not win:
             return None, None
         
         if self.config.use_win_api and self.win_api_available:
             # 尝试使用Windows API
             hwnd = win._hWnd  # 获取窗口句柄
-            result = self.capture_window_hwnd(hwnd)
+            result = self.capture_window_hwnd(hwnd, raw)
             if result is not None:
                 return result, win
     
         # 回退到普通模式
-        result = self.capture_window_regular(win)
+        result = self.capture_window_regular(win, raw)
         if result is not None:
             return result, win
     
+        # 捕获失败时窗口可能已失效，下一帧强制重新查找
+        self.window_resolver.invalidate()
         return None, None
     
-    def capture_window_hwnd(self, hwnd):
-        """使用Windows API直接捕获窗口句柄内容（绕过遮挡问题）"""
+    def capture_window_hwnd(self, hwnd, raw=False):
+        """使用Windows API直接捕获窗口句柄内容（绕过遮挡问题）
+
+        复用针对该句柄的长生命周期GDI会话，返回的数组会被后续帧复用；raw为True时返回BGRX原始像素
+        """
         if not self.win_api_available:
             return None
             
         try:
-            import win32gui
-            import win32ui
-            import win32con
-            
-            # 获取窗口位置和大小
-            rect = win32gui.GetWindowRect(hwnd)
-            x, y, w, h = rect[0], rect[1], rect[2]-rect[0], rect[3]-rect[1]
-            
-            if w <= 10 or h <= 10:
-                return None
-                
-            # 创建设备上下文
-            hwndDC = win32gui.GetWindowDC(hwnd)
-            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
-            saveDC = mfcDC.CreateCompatibleDC()
-            
-            # 创建位图
-            saveBitMap = win32ui.CreateBitmap()
-            saveBitMap.CreateCompatibleBitmap(mfcDC, w, h)
-            saveDC.SelectObject(saveBitMap)
-            
-            # 从窗口复制内容
-            result = saveDC.BitBlt((0, 0), (w, h), mfcDC, (0, 0), win32con.SRCCOPY)
-            
-            # 转换为numpy数组
-            bmpinfo = saveBitMap.GetInfo()
-            bmpstr = saveBitMap.GetBitmapBits(True)
-            im = Image.frombuffer('RGB', (bmpinfo['bmWidth'], bmpinfo['bmHeight']), bmpstr, 'raw', 'BGRX', 0, 1)
-            
-            # 转换为OpenCV格式
-            img = np.array(im)
-            if len(img.shape) == 3:
-                img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-            
-            # 清理
-            win32gui.DeleteObject(saveBitMap.GetHandle())
-            saveDC.DeleteDC()
-            mfcDC.DeleteDC()
-            win32gui.ReleaseDC(hwnd, hwndDC)
-            
-            return img
+            # 目标窗口变化时释放旧会话
+            if self._hwnd_session is None or self._hwnd_session.hwnd != hwnd:
+                if self._hwnd_session is not None:
+                    self._hwnd_session.release()
+                self._hwnd_session = HwndCaptureSession(hwnd)
+            return self._hwnd_session.grab() if raw else self._hwnd_session.capture()
         except Exception as e:
             logger.error(f"Windows API捕获失败: {e}")
+            if self._hwnd_session is not None:
+                self._hwnd_session.release()
+                self._hwnd_session = None
             return None
 
-    def capture_window_regular(self, win):
-        """普通屏幕捕获模式"""
+    def capture_window_regular(self, win, raw=False):
+        """普通屏幕捕获模式（复用会话级mss实例，返回的数组会被后续帧复用）；raw为True时返回BGRA原始像素"""
         try:
-            with mss.mss() as sct:
-                monitor = {
-                    "top": int(max(0, win.top)),
-                    "left": int(max(0, win.left)),
-                    "width": int(win.width),
-                    "height": int(win.height)
-                }
-                if monitor["width"] <= 10 or monitor["height"] <= 10:
-                    return None
-                    
-                screenshot = sct.grab(monitor)
-                frame = np.array(screenshot)
-                if frame.shape[2] == 4:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-                return frame
+            monitor = {
+                "top": int(max(0, win.top)),
+                "left": int(max(0, win.left)),
+                "width": int(win.width),
+                "height": int(win.height)
+            }
+            if monitor["width"] <= 10 or monitor["height"] <= 10:
+                return None
+            if raw:
+                return self._regular_backend.grab(monitor)
+            return self._regular_backend.capture(monitor)
         except Exception as e:
             logger.error(f"常规捕获失败: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def release(self):
+        """释放捕获过程中持有的系统资源"""
+        if self._hwnd_session is not None:
+            self._hwnd_session.release()
+            self._hwnd_session = None
+        self._regular_backend.close()
\ No newline at end of file
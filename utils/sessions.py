@@ -0,0 +1,247 @@
+# utils/sessions.py
+import time
+import heapq
+import secrets
+import threading
+from .metrics import RateMeter
+
+KIND_STREAM = 'stream'  # 流媒体客户端(TCP控制通道 + UDP视频)
+KIND_WEB = 'web'        # 网页观看者(MJPEG/WebSocket)
+
+
+def format_address(address):
+    """把 (ip, port) 地址格式化为 ip:port(IPv6为[ip]:port)，用于指标标签"""
+    if isinstance(address, tuple) and len(address) >= 2:
+        host, port = address[0], address[1]
+        return f"[{host}]:{port}" if ':' in str(host) else f"{host}:{port}"
+    return str(address)
+
+
+class ClientSession:
+    """一个客户端会话：把TCP控制连接与其UDP端点关联在一起"""
+
+    def __init__(self, session_id, kind, address, connection=None, expires=True):
+        self.session_id = session_id
+        self.kind = kind
+        self.address = address        # TCP/HTTP对端地址(仅UDP注册的旧客户端为其UDP地址)
+        self.connection = connection  # TCP连接(socket或AsyncClient)，仅UDP注册的客户端为None
+        self.expires = expires        # 是否按心跳超时；网页观看者的存活由HTTP连接决定
+        self.udp_address = None       # 声明或实际收到数据报的UDP地址
+        self.udp_active = False       # 已从该UDP地址收到注册/心跳，可以向其发送视频
+        self.viewport = None          # 分辨率档位宽度，None为原始分辨率
+        self.multicast = False        # 已加入组播组(不再单播)
+        self.flow = None              # 发送背压控制(ClientFlowControl)，记录该客户端的丢帧数
+        self.writer = None            # 非阻塞写端(线程版流媒体服务器的TCP控制连接)
+        self.frames = RateMeter()     # 实际发给该客户端的视频帧(UDP帧/MJPEG分段/WebSocket帧)
+        self.created = time.monotonic()
+        self.last_seen = self.created  # 最近一次收到客户端消息的时间
+
+    def __repr__(self):
+        return f"ClientSession({self.session_id}, {self.kind}, {self.address})"
+
+
+class SessionRegistry:
+    """线程安全的客户端会话表
+
+    会话ID把TCP连接与UDP端点关联起来(NAT改变UDP源端口时按ID重新绑定)。
+    只有收到客户端的消息(控制消息、UDP心跳)才刷新存活时间，发送成功不算；
+    超时检查用最小堆：刷新只改时间戳(O(1))，到期的堆顶项若已刷新则按新时间重新入堆，
+    每次检查只处理到期的会话，不扫描全部客户端
+    """
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout  # 无心跳多久后移除(秒)
+        self._lock = threading.Lock()
+        self._sessions = {}     # 会话ID -> ClientSession
+        self._connections = {}  # TCP连接 -> ClientSession
+        self._udp = {}          # UDP地址 -> ClientSession
+        self._heap = []         # (到期时间, 会话ID)，会话关闭后留下的项到期时丢弃
+        self.opened = 0   # 累计建立的会话数
+        self.expired = 0  # 累计因心跳超时移除的会话数
+        self._closed_dropped = 0  # 已关闭会话的背压丢帧数，使累计丢帧不因会话关闭而减少
+
+    def open(self, kind, address, connection=None, expires=True):
+        """建立新会话"""
+        with self._lock:
+            session_id = secrets.token_hex(8)
+            while session_id in self._sessions:
+                session_id = secrets.token_hex(8)
+            session = ClientSession(session_id, kind, address, connection, expires)
+            self._sessions[session_id] = session
+            if connection is not None:
+                self._connections[connection] = session
+            if expires:
+                heapq.heappush(self._heap, (session.last_seen + self.timeout, session_id))
+            self.opened += 1
+            return session
+
+    def close(self, session):
+        """移除会话，返回会话是否仍在表中（重复关闭是安全的）"""
+        with self._lock:
+            if self._sessions.pop(session.session_id, None) is None:
+                return False
+            if session.flow is not None:
+                self._closed_dropped += session.flow.dropped
+            if session.connection is not None:
+                self._connections.pop(session.connection, None)
+            if session.udp_address is not None and self._udp.get(session.udp_address) is session:
+                del self._udp[session.udp_address]
+            return True
+
+    def touch(self, session):
+        """收到客户端消息，刷新存活时间"""
+        session.last_seen = time.monotonic()
+
+    def bind_udp(self, session, address, active=False):
+        """绑定会话的UDP端点；该地址上仅UDP注册、尚无TCP连接的会话并入本会话"""
+        with self._lock:
+            other = self._udp.get(address)
+            if other is not None and other is not session:
+                if other.connection is not None:
+                    return False  # 地址已属于另一个TCP客户端
+                # UDP注册先于hello到达：合并，保留已确认的UDP可达
+                active = active or other.udp_active
+                self._sessions.pop(other.session_id, None)
+            if session.udp_address is not None and self._udp.get(session.udp_address) is session:
+                del self._udp[session.udp_address]
+            session.udp_address = address
+            session.udp_active = session.udp_active or active
+            self._udp[address] = session
+            return True
+
+    def unbind_udp(self, session):
+        """停止向会话的UDP端点发送(发送失败)，TCP控制通道保留"""
+        with self._lock:
+            session.udp_active = False
+            session.multicast = False
+
+    def on_datagram(self, address, session_id=None, kind=KIND_STREAM):
+        """处理UDP注册/心跳数据报，返回 (会话, UDP是否刚变为可达)
+
+        带会话ID时按ID找到会话并绑定到实际的源地址；
+        不带ID的未知地址视为只用UDP注册的旧客户端，为其新建会话
+        """
+        session = None
+        if session_id:
+            with self._lock:
+                session = self._sessions.get(session_id)
+        if session is None:
+            with self._lock:
+                session = self._udp.get(address)
+        if session is None:
+            session = self.open(kind, address)
+        activated = not session.udp_active or session.udp_address != address
+        if activated and not self.bind_udp(session, address, active=True):
+            return session, False
+        self.touch(session)
+        return session, activated
+
+    def expire(self, now=None):
+        """移除心跳超时的会话并返回它们，由调用方清理连接与相关状态"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, session_id = heapq.heappop(self._heap)
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue  # 已关闭
+                deadline = session.last_seen + self.timeout
+                if deadline > now:
+                    heapq.heappush(self._heap, (deadline, session_id))  # 期间有心跳，顺延
+                    continue
+                expired.append(session)
+        for session in expired:
+            if self.close(session):
+                self.expired += 1
+        return expired
+
+    def next_expiry(self):
+        """距离最早一个可能到期的会话还有多少秒，没有会超时的会话时返回None"""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def by_connection(self, connection):
+        with self._lock:
+            return self._connections.get(connection)
+
+    def by_udp(self, address):
+        with self._lock:
+            return self._udp.get(address)
+
+    def udp_active(self, address):
+        """是否仍应向该UDP地址发送"""
+        with self._lock:
+            session = self._udp.get(address)
+            return session is not None and session.udp_active
+
+    def sessions(self, kind=None):
+        """当前会话的快照列表"""
+        with self._lock:
+            return [session for session in self._sessions.values() if kind is None or session.kind == kind]
+
+    def connections(self):
+        """有TCP连接的会话快照"""
+        with self._lock:
+            return list(self._connections.values())
+
+    def udp_sessions(self):
+        """UDP可达的会话快照"""
+        with self._lock:
+            return [session for session in self._udp.values() if session.udp_active]
+
+    def count(self, kind=None):
+        with self._lock:
+            if kind is None:
+                return len(self._sessions)
+            return sum(1 for session in self._sessions.values() if session.kind == kind)
+
+    def __len__(self):
+        return self.count()
+
+    def register_metrics(self, metrics):
+        """在指标表中登记会话数、各客户端帧率与背压丢帧(抓取时读取)"""
+        def per_client(value):
+            return lambda: {(session.session_id, session.kind, format_address(session.address)): value(session)
+                            for session in self.sessions()}
+
+        metrics.collect('screenshare_sessions', '当前在线的客户端会话数',
+                        lambda: {kind: self.count(kind) for kind in (KIND_STREAM, KIND_WEB)}, labelnames=('kind',))
+        metrics.collect('screenshare_sessions_expired_total', '因心跳超时移除的会话数',
+                        lambda: self.expired, type='counter')
+        metrics.collect('screenshare_client_fps', '最近1秒实际发给各客户端的帧率',
+                        per_client(lambda session: session.frames.rate), labelnames=('session', 'kind', 'address'))
+        metrics.collect('screenshare_client_frames_dropped_total', '各客户端因发送背压丢弃的帧数',
+                        per_client(lambda session: session.flow.dropped if session.flow is not None else 0),
+                        type='counter', labelnames=('session', 'kind', 'address'))
+        metrics.collect('screenshare_frames_dropped_total', '各环节丢弃的帧数',
+                        lambda: {'backpressure': self.stats['dropped']},
+                        type='counter', labelnames=('stage',), source='sessions')
+
+    def flow_stats(self):
+        """各客户端的背压统计 {会话ID: {地址, 类型, 策略, 已发送, 丢帧, 降档, 缓冲占用}}"""
+        return {session.session_id: dict(session.flow.stats, address=session.address, kind=session.kind)
+                for session in self.sessions() if session.flow is not None}
+
+    @property
+    def stats(self):
+        """当前在线数与累计数(dropped含已关闭会话的背压丢帧，只增不减)"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            closed_dropped = self._closed_dropped
+        return {
+            'total': len(sessions),
+            'stream': sum(1 for session in sessions if session.kind == KIND_STREAM),
+            'web': sum(1 for session in sessions if session.kind == KIND_WEB),
+            'udp': sum(1 for session in sessions if session.udp_active),
+            'multicast': sum(1 for session in sessions if session.multicast),
+            'dropped': closed_dropped + sum(session.flow.dropped for session in sessions if session.flow is not None),
+            'opened': self.opened,
+            'expired': self.expired,
+        }
@@ -1,25 +1,147 @@
 # utils/window_manager.py
-import pygetwindow as gw
+import time
+import threading
+
+
+class WindowBackend:
+    """窗口后端接口
+
+    把窗口枚举与几何查询从具体库中抽离出来，
+    方便在Linux上用假窗口列表测试缓存逻辑
+    """
+
+    def get_windows_with_title(self, title: str):
+        """返回标题包含title的窗口列表"""
+        raise NotImplementedError
+
+    def get_all_titles(self):
+        """返回所有窗口标题"""
+        raise NotImplementedError
+
+    def get_geometry(self, win):
+        """返回窗口 (left, top, width, height)，窗口已失效时返回None"""
+        try:
+            return (win.left, win.top, win.width, win.height)
+        except Exception:
+            return None
+
+
+class PyGetWindowBackend(WindowBackend):
+    """基于pygetwindow的默认后端"""
+
+    def __init__(self):
+        self._gw = None
+
+    @property
+    def gw(self):
+        # 延迟导入：pygetwindow在不支持的平台上导入即报错
+        if self._gw is None:
+            import pygetwindow as gw
+            self._gw = gw
+        return self._gw
+
+    def get_windows_with_title(self, title: str):
+        return self.gw.getWindowsWithTitle(title)
+
+    def get_all_titles(self):
+        return self.gw.getAllTitles()
+
+    def get_geometry(self, win):
+        hwnd = getattr(win, '_hWnd', None)
+        if hwnd is not None:
+            try:
+                from ctypes import windll
+                if not windll.user32.IsWindow(hwnd):
+                    return None
+            except (ImportError, AttributeError):
+                pass
+        return super().get_geometry(win)
+
 
 class WindowManager:
     """窗口管理类"""
-    
+
+    backend = PyGetWindowBackend()
+
     @staticmethod
-    def find_target_window(window_title: str):
+    def find_target_window(window_title: str, backend: WindowBackend = None):
         """根据标题查找目标窗口"""
         if not window_title:
             return None
-        
+        backend = backend or WindowManager.backend
+
         # 查找匹配的窗口
-        wins = gw.getWindowsWithTitle(window_title)
+        wins = backend.get_windows_with_title(window_title)
         if wins:
             return wins[0]
-        
+
         # 如果精确匹配失败，尝试模糊匹配
-        all_titles = [t for t in gw.getAllTitles() if t.strip()]
+        all_titles = [t for t in backend.get_all_titles() if t.strip()]
         for title in all_titles:
             if window_title.lower() in title.lower():
-                matches = gw.getWindowsWithTitle(title)
+                matches = backend.get_windows_with_title(title)
                 if matches:
                     return matches[0]
-        return None
\ No newline at end of file
+        return None
+
+
+class WindowResolver:
+    """带缓存的目标窗口解析器
+
+    命中缓存时只校验窗口仍然有效且几何尺寸未变，
+    仅在未命中或超过recheck_interval时才重新枚举全部窗口
+    """
+
+    def __init__(self, backend: WindowBackend = None, recheck_interval: float = 2.0,
+                 clock=time.monotonic, histogram=None):
+        self.backend = backend or WindowManager.backend
+        self.recheck_interval = recheck_interval
+        self._clock = clock
+        self.histogram = histogram  # 可选：记录每次解析耗时(秒)的直方图
+        self._lock = threading.Lock()
+        self._title = None
+        self._win = None
+        self._geometry = None
+        self._resolved_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, window_title: str):
+        """返回目标窗口，未找到返回None"""
+        if self.histogram is None:
+            return self._resolve(window_title)
+        with self.histogram.time():
+            return self._resolve(window_title)
+
+    def _resolve(self, window_title):
+        now = self._clock()
+        with self._lock:
+            if (self._win is not None and window_title == self._title
+                    and now - self._resolved_at < self.recheck_interval):
+                geometry = self.backend.get_geometry(self._win)
+                if geometry is not None and geometry == self._geometry:
+                    self.hits += 1
+                    return self._win
+
+            self.misses += 1
+            win = WindowManager.find_target_window(window_title, self.backend)
+            self._title = window_title
+            self._win = win
+            self._geometry = self.backend.get_geometry(win) if win is not None else None
+            self._resolved_at = now
+            return win
+
+    def invalidate(self):
+        """丢弃缓存，下次解析时强制重新枚举"""
+        with self._lock:
+            self._win = None
+            self._geometry = None
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }